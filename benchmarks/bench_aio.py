@@ -0,0 +1,117 @@
+"""
+Event-loop responsiveness and packet latency with ``voeventparse.aio``.
+
+Simulates an asyncio listener receiving bursts of packets (a mix of the
+fixture packets and large synthetic ones, with thousands of Params), while a
+heartbeat task measures how late the event loop is in waking it up. Compares
+calling ``loads`` + ``valid_as_v2_0`` inline with the ``aloads`` +
+``avalidate`` coroutines, and with a wider concurrency limit, reporting
+latency percentiles for both the heartbeat and the packets
+(arrival to validated). Requires Python 3.5+.
+Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_aio.py
+"""
+import asyncio
+import random
+import time
+
+import voeventparse as vp
+from voeventparse.aio import AsyncLoader
+from common import read_fixtures
+
+HEARTBEAT_INTERVAL = 0.001  # seconds
+N_BURSTS = 20
+BURST_SIZE = 50
+LARGE_FRACTION = 0.2
+
+
+def make_large_packet(n_params=5000):
+    v = vp.loads(read_fixtures()[0])
+    for i in range(n_params):
+        v.What.append(vp.Param(name='p{}'.format(i), value=i * 0.5,
+                               unit='deg', ucd='pos.eq.ra'))
+    return vp.dumps(v)
+
+
+def percentiles(times, points=(50, 90, 99, 100)):
+    times = sorted(times)
+    return ['p{}={:7.2f}ms'.format(
+        p, 1e3 * times[min(len(times) - 1, len(times) * p // 100)])
+        for p in points]
+
+
+async def heartbeat(lags, stop):
+    loop = asyncio.get_event_loop()
+    while not stop.is_set():
+        expected = loop.time() + HEARTBEAT_INTERVAL
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(max(0., loop.time() - expected))
+
+
+async def simulate(handle, packets):
+    lags, latencies = [], []
+    stop = asyncio.Event()
+    beat = asyncio.ensure_future(heartbeat(lags, stop))
+
+    async def timed_handle(raw):
+        t0 = time.perf_counter()
+        await handle(raw)
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for burst in range(N_BURSTS):
+        await asyncio.gather(*[timed_handle(raw) for raw in
+                               packets[burst * BURST_SIZE:
+                                       (burst + 1) * BURST_SIZE]])
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await beat
+    return lags, latencies, elapsed
+
+
+def main():
+    random.seed(42)
+    small = read_fixtures()
+    large = make_large_packet()
+    packets = [large if random.random() < LARGE_FRACTION
+               else random.choice(small)
+               for _ in range(N_BURSTS * BURST_SIZE)]
+    print('{} bursts of {} packets, {:.0f}% of {:.0f} kB'.format(
+        N_BURSTS, BURST_SIZE, 100 * LARGE_FRACTION, len(large) / 1e3))
+
+    async def inline(raw):
+        vp.valid_as_v2_0(vp.loads(raw))
+
+    default_loader = AsyncLoader()
+    wide_loader = AsyncLoader(max_workers=4)
+
+    def offloaded(loader):
+        async def handle(raw):
+            await loader.validate(await loader.loads(raw))
+        return handle
+
+    runs = [
+        ('inline loads + valid_as_v2_0', inline),
+        ('aloads + avalidate (max_concurrency={})'.format(
+            default_loader.max_concurrency), offloaded(default_loader)),
+        ('AsyncLoader(max_workers=4)', offloaded(wide_loader)),
+    ]
+    for label, handle in runs:
+        loop = asyncio.new_event_loop()
+        try:
+            lags, latencies, elapsed = loop.run_until_complete(
+                simulate(handle, packets))
+        finally:
+            loop.close()
+        print(label)
+        print('  heartbeat lag:  ' + ' '.join(percentiles(lags)))
+        print('  packet latency: ' + ' '.join(percentiles(latencies)))
+        print('  throughput: {:.0f} packets/s'.format(len(packets) / elapsed))
+    default_loader.shutdown()
+    wide_loader.shutdown()
+
+
+if __name__ == '__main__':
+    main()
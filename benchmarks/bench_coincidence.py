@@ -0,0 +1,150 @@
+"""
+Spatio-temporal coincidences: ``voeventparse.index.CoincidenceMatcher``.
+
+Synthesizes three interleaved streams arriving in time order at 100 events
+per second in total: a dense "optical" stream of well-localised transients,
+an "x-ray" stream with arcminute errors, and a sparse "gamma" stream with
+error radii of degrees. Some optical / x-ray events are planted near gamma
+events. For windows (``dt``) holding 1e3 to 1e5 events, times the
+per-insert cost of ``CoincidenceMatcher.add_event`` once the window is
+full, against a vectorized scan of the whole window (the matching step
+alone, without maintaining the window). Then times ``add_packets`` end to
+end on packets authored with ``Voevent()`` and loaded with ``loads``.
+Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_coincidence.py
+"""
+from __future__ import print_function
+
+import datetime
+import time
+
+import numpy
+import pytz
+
+import voeventparse as vp
+from voeventparse.index import CoincidenceMatcher, _chord_squared, \
+    _unit_vectors
+from common import best_of, report_per_call
+
+RATE = 100.  # Events per second, over all streams.
+STREAMS = [  # (name, share of events, error radius range in degrees)
+    ('voeventparse.bench/OPTICAL', 0.80, (0.0001, 0.001)),
+    ('voeventparse.bench/XRAY', 0.19, (0.01, 0.05)),
+    ('voeventparse.bench/GAMMA', 0.01, (1., 5.)),
+]
+
+
+def synthesize(rng, n):
+    """Returns ivorns, stream codes, times, ra, dec and err of n events."""
+    streams = rng.choice(len(STREAMS), n, p=[s[1] for s in STREAMS])
+    ivorns = ['ivo://{}#{}'.format(STREAMS[s][0], i)
+              for i, s in enumerate(streams.tolist())]
+    seconds = numpy.arange(n) / RATE
+    times = (numpy.datetime64('2020-01-01', 'us') +
+             (seconds * 1e6).astype('timedelta64[us]'))
+    ra = rng.uniform(0, 360, n)
+    dec = numpy.degrees(numpy.arcsin(rng.uniform(-1, 1, n)))
+    err = numpy.empty(n)
+    for code, (_, _, (lo, hi)) in enumerate(STREAMS):
+        err[streams == code] = rng.uniform(lo, hi, (streams == code).sum())
+    # Plant counterparts: put 10% of other events near the last gamma event.
+    last_gamma = None
+    for i in range(n):
+        if streams[i] == 2:
+            last_gamma = i
+        elif last_gamma is not None and rng.uniform() < 0.1:
+            ra[i] = ra[last_gamma] + rng.normal(0, err[last_gamma] / 2)
+            dec[i] = numpy.clip(
+                dec[last_gamma] + rng.normal(0, err[last_gamma] / 2), -90, 90)
+    return ivorns, streams, times, ra % 360, dec, err
+
+
+def window_scan(xyz, err, streams, times, new, dt_us):
+    """Matches event ``new`` against all events before it in the arrays."""
+    chord_squared = ((xyz[:new] - xyz[new]) ** 2).sum(axis=1)
+    dt = times[new].astype(numpy.int64) - times[:new].astype(numpy.int64)
+    return numpy.flatnonzero(
+        (chord_squared <= _chord_squared(err[:new] + err[new])) &
+        (numpy.abs(dt) <= dt_us) & (streams[:new] != streams[new]))
+
+
+def scaling():
+    n_timed = 2000
+    for window_events in (1000, 10000, 100000):
+        rng = numpy.random.RandomState(42)
+        n = window_events + n_timed
+        ivorns, streams, times, ra, dec, err = synthesize(rng, n)
+        positions = [vp.Position2D(ra=r, dec=d, err=e, units='deg',
+                                   system=None)
+                     for r, d, e in zip(ra.tolist(), dec.tolist(),
+                                        err.tolist())]
+        dt = window_events / RATE
+        matcher = CoincidenceMatcher(dt=dt)
+        for i in range(window_events):
+            matcher.add_event(ivorns[i], times[i], positions[i])
+        n_matches = 0
+        start = time.time()
+        for i in range(window_events, n):
+            n_matches += len(matcher.add_event(ivorns[i], times[i],
+                                               positions[i]))
+        matcher_time = (time.time() - start) / n_timed
+
+        xyz = _unit_vectors(ra, dec)
+        scan_matches = sum(
+            len(window_scan(xyz, err, streams, times, i, dt * 1e6))
+            for i in range(window_events, n))
+        assert scan_matches == n_matches, (scan_matches, n_matches)
+
+        def run_scan():
+            for i in range(window_events, window_events + 100):
+                window_scan(xyz, err, streams, times, i, dt * 1e6)
+
+        scan_time = best_of(run_scan, number=1, repeat=3) / 100
+        print('window of {} events ({} s), {} matches in {} inserts:'.format(
+            len(matcher), dt, n_matches, n_timed))
+        report_per_call('  vectorized window scan (matching only)',
+                        scan_time)
+        report_per_call('  CoincidenceMatcher.add_event', matcher_time)
+
+
+def end_to_end(n):
+    rng = numpy.random.RandomState(1)
+    ivorns, streams, times, ra, dec, err = synthesize(rng, n)
+    location = vp.definitions.observatory_location.geosurface
+    raw = []
+    for i in range(n):
+        stream, stream_id = ivorns[i][len('ivo://'):].split('#')
+        v = vp.Voevent(stream=stream, stream_id=stream_id,
+                       role=vp.definitions.roles.test)
+        vp.add_where_when(
+            v, coords=vp.Position2D(
+                ra=ra[i], dec=dec[i], err=err[i], units='deg',
+                system=vp.definitions.sky_coord_system.utc_fk5_geo),
+            obs_time=times[i].astype(datetime.datetime).replace(
+                tzinfo=pytz.UTC),
+            observatory_location=location)
+        raw.append(vp.dumps(v))
+    packets = [vp.loads(r) for r in raw]
+
+    def run(add):
+        matcher = CoincidenceMatcher(dt=60)
+        start = time.time()
+        add(matcher)
+        return time.time() - start
+
+    per_packet = min(run(lambda m: [m.add(v) for v in packets])
+                     for _ in range(3))
+    batch = min(run(lambda m: m.add_packets(packets)) for _ in range(3))
+    print('{} loaded packets, 60 s window:'.format(n))
+    report_per_call('  CoincidenceMatcher.add (per packet)', per_packet / n)
+    report_per_call('  CoincidenceMatcher.add_packets', batch / n)
+
+
+def main():
+    scaling()
+    end_to_end(5000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Columnar Param extraction: ``params_to_columns``.
+
+Compares pulling a few Params out of many packets with the per-packet
+``get_toplevel_params`` / ``get_grouped_params`` calls (collecting values in
+Python lists, then building masked arrays), against ``params_to_columns``.
+The packets are copies of the bundled SWIFT and MOA fixtures. Run from the
+repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_columns.py [n_packets]
+"""
+from __future__ import print_function
+
+import sys
+import timeit
+
+import numpy
+
+import voeventparse as vp
+from common import read_fixtures, v2_fixture_paths
+
+SPEC = [
+    ((None, 'TrigID'), int),
+    ((None, 'Integ_Time'), float),
+    ((None, 'Burst_Signif'), float),  # Not in either fixture.
+    ((None, 'RA'), float),
+    (('Solution_Status', 'GRB_Identified'), bool),
+]
+
+
+def per_packet(packets):
+    """The usual approach: a multi-dict per packet, then pick and convert."""
+    lists = dict((key, []) for key, _ in SPEC)
+    for v in packets:
+        top = vp.get_toplevel_params(v)
+        groups = vp.get_grouped_params(v)
+        for (group, name), _ in SPEC:
+            params = top if group is None else groups.get(group, {})
+            atts = params.get(name)
+            lists[(group, name)].append(
+                None if atts is None else atts.get('value'))
+    columns = {}
+    for (key, dtype) in SPEC:
+        values = lists[key]
+        mask = [value is None for value in values]
+        if dtype is bool:
+            values = [value == 'true' for value in values]
+        else:
+            values = [0 if value is None else dtype(value)
+                      for value in values]
+        columns[key] = numpy.ma.MaskedArray(numpy.array(values, dtype), mask)
+    return columns
+
+
+def main():
+    n_packets = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    raw = read_fixtures(v2_fixture_paths[:2])
+    packets = [vp.loads(raw[i % 2]) for i in range(n_packets)]
+    print('{} packets'.format(n_packets))
+    expected = per_packet(packets)
+    columns = vp.params_to_columns(packets, SPEC)
+    for key, _ in SPEC:
+        assert expected[key].tolist() == columns[key].tolist(), key
+
+    old_time = min(timeit.repeat(lambda: per_packet(packets),
+                                 number=1, repeat=3))
+    new_time = min(timeit.repeat(lambda: vp.params_to_columns(packets, SPEC),
+                                 number=1, repeat=3))
+    for label, seconds in [('per-packet get_*_params', old_time),
+                           ('params_to_columns', new_time)]:
+        print('{:<40} {:8.3f} s {:10.0f} packets/s'.format(
+            label, seconds, n_packets / seconds))
+    print('speedup: {:.1f}x'.format(old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Serialization throughput: ``dumps`` against the previous copying serializer,
+and the parse-and-forward cycle with and without ``keep_source``.
+
+Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_dumps.py
+"""
+from __future__ import print_function
+
+import os
+
+from lxml import etree
+
+import voeventparse as vp
+from voeventparse.voevent import _standard_xml_copy
+from common import best_of, read_fixtures, report_per_call, v2_fixture_paths
+
+
+def dumps_via_copy(v):
+    """The previous implementation of dumps."""
+    return etree.tostring(_standard_xml_copy(v), xml_declaration=True,
+                          encoding='UTF-8')
+
+
+def main():
+    for path, raw in zip(v2_fixture_paths, read_fixtures()):
+        print('{} ({} bytes)'.format(os.path.basename(path), len(raw)))
+        v = vp.loads(raw)
+        assert vp.dumps(v) == dumps_via_copy(v)
+        report_per_call('  deepcopy + deannotate + tostring (previous)',
+                        best_of(lambda: dumps_via_copy(v)))
+        report_per_call('  vp.dumps', best_of(lambda: vp.dumps(v)))
+        kept = vp.loads(raw, keep_source=True)
+        report_per_call('  vp.dumps (keep_source, unmodified)',
+                        best_of(lambda: vp.dumps(kept)))
+        report_per_call('  vp.dumps(vp.loads(raw))',
+                        best_of(lambda: vp.dumps(vp.loads(raw))))
+        report_per_call(
+            '  vp.dumps(vp.loads(raw, keep_source=True))',
+            best_of(lambda: vp.dumps(vp.loads(raw, keep_source=True))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Batch event-time extraction: ``get_event_times_as_utc``.
+
+Compares calling ``get_event_time_as_utc`` once per packet with a single
+call to ``get_event_times_as_utc``, for copies of the bundled v2.0 fixture
+packets - one in four of which (Gaia) gives its time in TDB, needing
+conversion via astropy - and then for synthesized packets spread evenly
+over the UTC, TT, GPS and TDB time-systems, half giving a TimeOffset rather
+than an ISOTime. Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_event_times.py [n_packets]
+"""
+from __future__ import print_function
+
+import datetime
+import sys
+import timeit
+
+import voeventparse as vp
+from common import read_fixtures
+
+SYSTEMS = ['UTC-ICRS-GEO', 'TT-ICRS-GEO', 'GPS-ICRS-GEO', 'TDB-ICRS-BARY']
+
+
+def per_packet(packets):
+    return [vp.get_event_time_as_utc(v) for v in packets]
+
+
+def synthesize_packets(n_packets):
+    start = datetime.datetime(2016, 1, 1)
+    packets = []
+    for i in range(n_packets):
+        v = vp.Voevent(stream='voeventparse.bench/SYNTH', stream_id=i,
+                       role=vp.definitions.roles.test)
+        obs_time = start + datetime.timedelta(minutes=i)
+        vp.add_where_when(
+            v, coords=vp.Position2D(ra=10., dec=20., err=0.1, units='deg',
+                                    system=SYSTEMS[i % len(SYSTEMS)]),
+            obs_time=obs_time,
+            observatory_location=vp.definitions.observatory_location
+            .geosurface,
+            allow_tz_naive_datetime=True)
+        if i % 8 >= 4:
+            ac = v.WhereWhen.ObsDataLocation.ObservationLocation.AstroCoords
+            del ac.Time.TimeInstant.ISOTime
+            ac.Time.TimeInstant.TimeOffset = (
+                obs_time - datetime.datetime(1858, 11, 17)).total_seconds()
+            ac.Time.TimeInstant.TimeScale = 'MJD'
+        packets.append(vp.loads(vp.dumps(v)))
+    return packets
+
+
+def main():
+    n_packets = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    raw = read_fixtures()
+    print('Fixture packets:')
+    run([vp.loads(raw[i % len(raw)]) for i in range(n_packets)])
+    print('Mixed time-systems:')
+    run(synthesize_packets(n_packets))
+
+
+def run(packets):
+    n_packets = len(packets)
+    print('{} packets'.format(n_packets))
+    # Warm up (imports, astropy's leap-second table) and check agreement:
+    expected = per_packet(packets[:8])
+    batch = vp.get_event_times_as_utc(packets[:8], as_datetime=True)
+    for a, b in zip(expected, batch):
+        assert abs((a - b).total_seconds()) < 1e-5, (a, b)
+
+    for label, func in [
+        ('per-packet get_event_time_as_utc', per_packet),
+        ('get_event_times_as_utc', vp.get_event_times_as_utc),
+        ('get_event_times_as_utc(as_datetime=True)',
+         lambda p: vp.get_event_times_as_utc(p, as_datetime=True)),
+    ]:
+        seconds = min(timeit.repeat(lambda: func(packets), number=1,
+                                    repeat=3))
+        print('{:<44} {:8.3f} s {:10.0f} packets/s'.format(
+            label, seconds, n_packets / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Startup benchmark: cost of ``import voeventparse`` in a fresh interpreter.
+
+Also times the one-off compilation of the VOEvent v2.0 schema, i.e. the cost
+which is now deferred from import-time to first use of
+:py:func:`voeventparse.get_v2_0_schema`.
+
+Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_import.py
+"""
+from __future__ import print_function
+
+import subprocess
+import sys
+
+from common import report
+
+IMPORT_SNIPPET = """
+import time
+t0 = time.time()
+import voeventparse
+t1 = time.time()
+voeventparse.get_v2_0_schema()
+t2 = time.time()
+print(t1 - t0, t2 - t1)
+"""
+
+
+def time_fresh_imports(repeats):
+    import_times, compile_times = [], []
+    for _ in range(repeats):
+        out = subprocess.check_output([sys.executable, '-c', IMPORT_SNIPPET])
+        import_time, compile_time = [float(x) for x in out.split()]
+        import_times.append(import_time)
+        compile_times.append(compile_time)
+    return import_times, compile_times
+
+
+def main(repeats=20):
+    import_times, compile_times = time_fresh_imports(repeats)
+    report('import voeventparse', import_times)
+    report('first get_v2_0_schema() (deferred)', compile_times)
+
+
+if __name__ == '__main__':
+    main()
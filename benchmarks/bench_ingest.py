@@ -0,0 +1,59 @@
+"""
+Bulk-ingest throughput: ``ThreadedIngestor`` against ``load_many``.
+
+Writes a directory of one-packet files (copies of the fixture packets) to a
+temporary directory, then loads, validates and extracts a couple of fields
+from them all with a plain ``load`` loop, with ``ThreadedIngestor`` and
+with the process pool of ``load_many``, for increasing numbers of workers.
+Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_ingest.py [n_files]
+"""
+from __future__ import print_function
+
+import multiprocessing
+import shutil
+import sys
+import tempfile
+
+import voeventparse as vp
+from bench_load_many import get_ivorn_and_author, timed, write_files
+
+
+def main(n_files=20000):
+    n_cpus = multiprocessing.cpu_count()
+    tempdir = tempfile.mkdtemp()
+    try:
+        paths = write_files(tempdir, n_files)
+        print('{} files, {} CPUs'.format(n_files, n_cpus))
+
+        def loop():
+            for path in paths:
+                with open(path, 'rb') as f:
+                    get_ivorn_and_author(vp.load(f, validate=True))
+            return len(paths)
+
+        baseline = timed(loop)
+        print('{:<40} {:>8.0f} packets/s'.format('load() loop', baseline))
+        for workers in sorted(set([1, 2, 4, n_cpus, 2 * n_cpus])):
+            ingestor = vp.ThreadedIngestor(workers=workers, validate=True,
+                                           extract=get_ivorn_and_author)
+            runs = [
+                ('ThreadedIngestor(workers={})'.format(workers),
+                 lambda: ingestor.load_many(paths)),
+                ('load_many(workers={})'.format(workers),
+                 lambda: vp.load_many(paths, workers=workers, validate=True,
+                                      extract=get_ivorn_and_author,
+                                      chunksize=64)),
+            ]
+            with ingestor:
+                for label, run in runs:
+                    rate = timed(lambda: sum(1 for _ in run()))
+                    print('{:<40} {:>8.0f} packets/s {:>6.2f}x'.format(
+                        label, rate, rate / baseline))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
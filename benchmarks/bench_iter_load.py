@@ -0,0 +1,59 @@
+"""
+Streaming throughput and memory usage of ``iter_load`` on large archives.
+
+Writes archives of concatenated copies of the fixture packets to a temporary
+directory, then reads each back with ``iter_load`` in a fresh interpreter,
+reporting packets per second and peak resident memory. Peak memory should
+stay flat as the archive grows. (Uses the ``resource`` module, so Unix only.)
+Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_iter_load.py
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from common import read_fixtures
+
+READ_SNIPPET = """
+import resource, sys, time
+import voeventparse as vp
+t0 = time.time()
+with open(sys.argv[1], 'rb') as f:
+    n = sum(1 for _ in vp.iter_load(f))
+elapsed = time.time() - t0
+print(n, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def write_archive(path, n_packets):
+    packets = read_fixtures()
+    with open(path, 'wb') as f:
+        for i in range(n_packets):
+            f.write(packets[i % len(packets)])
+            f.write(b'\n')
+
+
+def main(sizes=(1000, 10000, 50000)):
+    tempdir = tempfile.mkdtemp()
+    try:
+        for n_packets in sizes:
+            path = os.path.join(tempdir, 'archive.xml')
+            write_archive(path, n_packets)
+            output = subprocess.check_output(
+                [sys.executable, '-c', READ_SNIPPET, path])
+            n, elapsed, maxrss = output.split()
+            print('{:>7} packets, {:>7.1f} MB file: {:>8.0f} packets/s, '
+                  'peak RSS {:>6.1f} MB'.format(
+                      int(n), os.path.getsize(path) / 1e6,
+                      int(n) / float(elapsed), int(maxrss) / 1e3))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
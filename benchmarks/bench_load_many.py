@@ -0,0 +1,76 @@
+"""
+Bulk-loading throughput of ``load_many`` against a single-process loop.
+
+Writes a directory of one-packet files (copies of the fixture packets) to a
+temporary directory, then loads and validates them all, first with ``load``
+in a loop, then with ``load_many`` using increasing numbers of worker
+processes, reporting packets per second and the speedup over the loop.
+Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_load_many.py [n_files]
+"""
+from __future__ import print_function
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import voeventparse as vp
+from common import read_fixtures
+
+
+def get_ivorn_and_author(v):
+    return v.attrib['ivorn'], v.Who.AuthorIVORN.text
+
+
+def write_files(directory, n_files):
+    packets = read_fixtures()
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(directory, '{:07d}.xml'.format(i))
+        with open(path, 'wb') as f:
+            f.write(packets[i % len(packets)])
+        paths.append(path)
+    return paths
+
+
+def timed(func):
+    t0 = time.time()
+    n = func()
+    return n / (time.time() - t0)
+
+
+def main(n_files=20000):
+    n_cpus = multiprocessing.cpu_count()
+    tempdir = tempfile.mkdtemp()
+    try:
+        paths = write_files(tempdir, n_files)
+        print('{} files, {} CPUs'.format(n_files, n_cpus))
+
+        def loop():
+            for path in paths:
+                with open(path, 'rb') as f:
+                    get_ivorn_and_author(vp.load(f, validate=True))
+            return len(paths)
+
+        baseline = timed(loop)
+        print('{:<40} {:>8.0f} packets/s'.format('load() loop', baseline))
+        worker_counts = sorted(set([1, 2, 4, n_cpus, 2 * n_cpus]))
+        for ordered in (True, False):
+            for workers in worker_counts:
+                rate = timed(lambda: sum(1 for _ in vp.load_many(
+                    paths, workers=workers, extract=get_ivorn_and_author,
+                    validate=True, ordered=ordered, chunksize=64)))
+                label = 'load_many(workers={}, ordered={})'.format(workers,
+                                                                   ordered)
+                print('{:<40} {:>8.0f} packets/s {:>6.2f}x'.format(
+                    label, rate, rate / baseline))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,70 @@
+"""
+Cost of the multi-dicts returned by the Param getters.
+
+Times ``get_toplevel_params`` + ``get_grouped_params`` on each of the bundled
+v2.0 fixture packets, and counts the memory blocks they allocate (via
+:mod:`tracemalloc`, so Python 3 only), for the built-in
+``OrderedMultiDict`` and, if the package is installed, the
+``orderedmultidict.omdict`` which it replaced.
+Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_multidict.py
+"""
+from __future__ import print_function
+
+import os
+import tracemalloc
+
+import voeventparse as vp
+import voeventparse.convenience
+from common import best_of, read_fixtures, report_per_call, v2_fixture_paths
+
+
+def get_all_params(v):
+    return vp.get_toplevel_params(v), vp.get_grouped_params(v)
+
+
+def allocations(func, repeat=100):
+    """Mean number and size of memory blocks allocated and retained."""
+    results = []
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for _ in range(repeat):
+            results.append(func())
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(s.count_diff for s in stats)
+    size = sum(s.size_diff for s in stats)
+    return blocks / float(repeat), size / float(repeat)
+
+
+def main():
+    implementations = [('OrderedMultiDict', vp.OrderedMultiDict)]
+    try:
+        from orderedmultidict import omdict
+        implementations.append(('orderedmultidict.omdict', omdict))
+    except ImportError:
+        print('(orderedmultidict not installed, skipping comparison)')
+
+    for path, raw in zip(v2_fixture_paths, read_fixtures()):
+        v = vp.loads(raw)
+        print('{} ({} Params)'.format(os.path.basename(path),
+                                      len(v.What.findall('.//Param'))))
+        for label, cls in implementations:
+            voeventparse.convenience.OrderedMultiDict = cls
+            try:
+                report_per_call('  ' + label,
+                                best_of(lambda: get_all_params(v)))
+                blocks, size = allocations(lambda: get_all_params(v))
+                print('  {:<56} {:10.0f} blocks {:10.0f} bytes'.format(
+                    '', blocks, size))
+            finally:
+                voeventparse.convenience.OrderedMultiDict = \
+                    vp.OrderedMultiDict
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Multi-location packets: ``iter_obs_locations``.
+
+Compares calling ``get_event_time_as_utc`` and ``get_event_position`` for
+each ObsDataLocation index in turn with ``iter_obs_locations`` and
+``get_obs_locations_array``, for synthesized packets carrying a trajectory
+of N locations, in the UTC and TDB time-systems. Run from the repository
+root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_obs_locations.py
+"""
+from __future__ import print_function
+
+import datetime
+
+import pytz
+
+import voeventparse as vp
+from common import best_of, report_per_call
+
+
+def make_packet(n_locations, system):
+    v = vp.Voevent(stream='voeventparse.bench/TRAJECTORY', stream_id=1,
+                   role=vp.definitions.roles.test)
+    start = datetime.datetime(2016, 1, 1, tzinfo=pytz.utc)
+    for i in range(n_locations):
+        vp.add_where_when(
+            v, coords=vp.Position2D(ra=10. + 0.01 * i, dec=20., err=0.001,
+                                    units='deg', system=system),
+            obs_time=start + datetime.timedelta(minutes=i),
+            observatory_location='GEOSURFACE')
+    return vp.loads(vp.dumps(v))
+
+
+def per_index(v, n_locations):
+    return [(vp.get_event_time_as_utc(v, i), vp.get_event_position(v, i))
+            for i in range(n_locations)]
+
+
+def main():
+    for system in ('UTC-ICRS-GEO', 'TDB-ICRS-BARY'):
+        for n_locations in (1, 10, 100):
+            v = make_packet(n_locations, system)
+            print('{}, {} locations'.format(system, n_locations))
+            number = max(10, 1000 // n_locations)
+            per_index_time = best_of(lambda: per_index(v, n_locations),
+                                     number=number)
+            iter_time = best_of(lambda: list(vp.iter_obs_locations(v)),
+                                number=number)
+            array_time = best_of(lambda: vp.get_obs_locations_array(v),
+                                 number=number)
+            report_per_call('  per-index getters', per_index_time)
+            report_per_call('  iter_obs_locations', iter_time)
+            report_per_call('  get_obs_locations_array', array_time)
+
+
+if __name__ == '__main__':
+    main()
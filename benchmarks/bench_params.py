@@ -0,0 +1,67 @@
+"""
+Param extraction: ``get_toplevel_params`` / ``get_grouped_params``.
+
+Compares the previous implementation, which deep-copied and de-annotated the
+``What`` section before reading it, with the current one, which reads the
+attributes directly from the packet, on each of the bundled v2.0 fixture
+packets. Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_params.py
+"""
+from __future__ import print_function
+
+import os
+from copy import deepcopy
+
+import lxml.objectify
+
+import voeventparse as vp
+from common import best_of, read_fixtures, report_per_call, v2_fixture_paths
+
+
+def _old_param_children(elt):
+    omd = vp.OrderedMultiDict()
+    if elt.find('Param') is not None:
+        for p in elt.Param:
+            omd.add(p.attrib.get('name'), p.attrib)
+    return omd
+
+
+def old_get_toplevel_params(voevent):
+    """The previous implementation."""
+    w = deepcopy(voevent.What)
+    lxml.objectify.deannotate(w)
+    return _old_param_children(w)
+
+
+def old_get_grouped_params(voevent):
+    """The previous implementation."""
+    groups_omd = vp.OrderedMultiDict()
+    w = deepcopy(voevent.What)
+    lxml.objectify.deannotate(w)
+    if w.find('Group') is not None:
+        for grp in w.Group:
+            groups_omd.add(grp.attrib.get('name'), _old_param_children(grp))
+    return groups_omd
+
+
+def main():
+    for path, raw in zip(v2_fixture_paths, read_fixtures()):
+        v = vp.loads(raw)
+        n_params = len(v.What.findall('.//Param'))
+        print('{} ({} Params)'.format(os.path.basename(path), n_params))
+        for label, old, new in [
+            ('get_toplevel_params', old_get_toplevel_params,
+             vp.get_toplevel_params),
+            ('get_grouped_params', old_get_grouped_params,
+             vp.get_grouped_params),
+        ]:
+            old_time = best_of(lambda: old(v))
+            new_time = best_of(lambda: new(v))
+            report_per_call('  {} (deepcopy)'.format(label), old_time)
+            report_per_call('  {}'.format(label), new_time)
+            print('  speedup: {:.1f}x'.format(old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Parsing throughput: ``loads`` with various :py:class:`.VOEventParser` options.
+
+Compares the module-level ``loads`` against tuned parser instances on each of
+the bundled v2.0 fixture packets, and validated ingest via a separate
+``valid_as_v2_0`` pass against validation during parsing. Run from the
+repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_parse.py
+"""
+from __future__ import print_function
+
+import os
+
+from lxml import objectify
+
+import voeventparse as vp
+from common import best_of, read_fixtures, report_per_call, v2_fixture_paths
+
+PARSERS = [
+    ('VOEventParser(collect_ids=False)', vp.VOEventParser(collect_ids=False)),
+    ('VOEventParser(resolve_entities=False)',
+     vp.VOEventParser(resolve_entities=False)),
+    ('VOEventParser(collect_ids=False, resolve_entities=False)',
+     vp.VOEventParser(collect_ids=False, resolve_entities=False)),
+]
+
+
+def main():
+    for path, raw in zip(v2_fixture_paths, read_fixtures()):
+        print('{} ({} bytes)'.format(os.path.basename(path), len(raw)))
+        report_per_call('  objectify.fromstring (baseline)',
+                        best_of(lambda: objectify.fromstring(raw)))
+        report_per_call('  vp.loads', best_of(lambda: vp.loads(raw)))
+        for label, parser in PARSERS:
+            report_per_call('  ' + label, best_of(lambda: parser.loads(raw)))
+        report_per_call('  vp.loads + vp.valid_as_v2_0',
+                        best_of(lambda: vp.valid_as_v2_0(vp.loads(raw))))
+        report_per_call('  vp.loads(validate=True)',
+                        best_of(lambda: vp.loads(raw, validate=True)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Header-only parsing: ``peek_header`` against a full ``loads``.
+
+For each of the bundled v2.0 fixture packets, times reading the routing
+details (IVORN, role, version, Who.AuthorIVORN, Who.Date) with
+``peek_header``, versus loading the whole packet and reading the same fields.
+Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_peek.py
+"""
+from __future__ import print_function
+
+import os
+
+import voeventparse as vp
+from common import best_of, read_fixtures, report_per_call, v2_fixture_paths
+
+
+def header_via_loads(raw):
+    v = vp.loads(raw)
+    return (v.attrib['ivorn'], v.attrib['role'], v.attrib['version'],
+            v.Who.AuthorIVORN.text, v.Who.Date.text)
+
+
+def main():
+    for path, raw in zip(v2_fixture_paths, read_fixtures()):
+        print('{} ({} bytes, Who ends at byte {})'.format(
+            os.path.basename(path), len(raw), raw.find(b'</Who>') + 6))
+        full = best_of(lambda: header_via_loads(raw))
+        peek = best_of(lambda: vp.peek_header(raw))
+        report_per_call('  vp.loads + attribute access', full)
+        report_per_call('  vp.peek_header', peek)
+        print('  speedup: {:.1f}x'.format(full / peek))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Batch sky-position extraction: ``get_event_positions``.
+
+Compares calling ``get_event_position`` once per packet (then building
+arrays from the namedtuples) with a single call to ``get_event_positions``,
+for copies of the bundled v2.0 fixture packets. Run from the repository
+root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_positions.py [n_packets]
+"""
+from __future__ import print_function
+
+import sys
+import timeit
+
+import numpy
+
+import voeventparse as vp
+from common import read_fixtures
+
+
+def per_packet(packets):
+    positions = [vp.get_event_position(v) for v in packets]
+    return (numpy.array([p.ra for p in positions]),
+            numpy.array([p.dec for p in positions]),
+            numpy.array([p.err for p in positions]))
+
+
+def main():
+    n_packets = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    raw = read_fixtures()
+    packets = [vp.loads(raw[i % len(raw)]) for i in range(n_packets)]
+    print('{} packets'.format(n_packets))
+    ra, dec, err = per_packet(packets)
+    batch = vp.get_event_positions(packets)
+    assert (ra == batch.ra).all() and (dec == batch.dec).all()
+    assert (err == batch.err).all()
+
+    for label, func in [('per-packet get_event_position', per_packet),
+                        ('get_event_positions', vp.get_event_positions)]:
+        seconds = min(timeit.repeat(lambda: func(packets), number=1,
+                                    repeat=3))
+        print('{:<40} {:8.3f} s {:10.0f} packets/s'.format(
+            label, seconds, n_packets / seconds))
+
+
+if __name__ == '__main__':
+    main()
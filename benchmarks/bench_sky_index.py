@@ -0,0 +1,94 @@
+"""
+Cone searches: ``voeventparse.index.SkyIndex``.
+
+Builds an index of random positions spread uniformly over the sky, with
+error radii from arcseconds up to a few degrees (a few percent larger than
+the cell size), then times cone searches of a range of radii against both
+the index and a vectorized linear scan of the same arrays, plus single
+insertions and removals. Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_sky_index.py [n_events]
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+import numpy
+
+from voeventparse.index import SkyIndex, _chord_squared, _unit_vectors
+from common import best_of, report_per_call
+
+
+def random_events(rng, n):
+    ra = rng.uniform(0, 360, n)
+    dec = numpy.degrees(numpy.arcsin(rng.uniform(-1, 1, n)))
+    err = numpy.minimum(10 ** rng.uniform(-3.5, 0.5, n), 5.)
+    return ra, dec, err
+
+
+def linear_scan(xyz, err, ivorns, ra, dec, radius):
+    """The same search, testing every event."""
+    centre = _unit_vectors([ra], [dec])[0]
+    chord_squared = ((xyz - centre) ** 2).sum(axis=1)
+    return ivorns[chord_squared <= _chord_squared(radius + err)].tolist()
+
+
+def main():
+    n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rng = numpy.random.RandomState(42)
+    ra, dec, err = random_events(rng, n_events)
+    ivorns = numpy.array(['ivo://voeventparse.bench/SKY#{}'.format(i)
+                          for i in range(n_events)], dtype=object)
+    print('{} events, {:.1f}% with err > cell size'.format(
+        n_events, 100. * (err > 0.5).mean()))
+
+    start = time.time()
+    index = SkyIndex(cell_size=0.5)
+    index.add_many(ivorns, ra, dec, err)
+    print('build (add_many): {:.2f} s'.format(time.time() - start))
+    xyz = _unit_vectors(ra, dec)
+
+    query_ra, query_dec, _ = random_events(rng, 200)
+    for radius in (0., 0.1, 1.):
+        queries = list(zip(query_ra.tolist(), query_dec.tolist()))
+        for ra0, dec0 in queries[:20]:
+            assert (sorted(index.query(ra0, dec0, radius)) ==
+                    sorted(linear_scan(xyz, err, ivorns, ra0, dec0, radius)))
+        n_matches = sum(len(index.query(ra0, dec0, radius))
+                        for ra0, dec0 in queries)
+
+        def run_index():
+            for ra0, dec0 in queries:
+                index.query(ra0, dec0, radius)
+
+        def run_scan():
+            for ra0, dec0 in queries[:10]:
+                linear_scan(xyz, err, ivorns, ra0, dec0, radius)
+
+        index_time = best_of(run_index, number=1, repeat=3) / len(queries)
+        scan_time = best_of(run_scan, number=1, repeat=3) / 10
+        print('radius {} deg ({:.1f} matches/query):'.format(
+            radius, n_matches / len(queries)))
+        report_per_call('  linear scan', scan_time)
+        report_per_call('  SkyIndex.query', index_time)
+        print('  speedup: {:.0f}x'.format(scan_time / index_time))
+
+    new_ra, new_dec, new_err = random_events(rng, 20000)
+    new_ivorns = ['ivo://voeventparse.bench/NEW#{}'.format(i)
+                  for i in range(len(new_ra))]
+    start = time.time()
+    for args in zip(new_ivorns, new_ra.tolist(), new_dec.tolist(),
+                    new_err.tolist()):
+        index.add_many([args[0]], [args[1]], [args[2]], [args[3]])
+    report_per_call('single insertion (amortized)',
+                    (time.time() - start) / len(new_ivorns))
+    start = time.time()
+    for ivorn in new_ivorns:
+        index.remove(ivorn)
+    report_per_call('single removal (amortized)',
+                    (time.time() - start) / len(new_ivorns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Time-range queries: ``voeventparse.index.TimeIndex``.
+
+Builds an index of events from a few streams, with event times roughly in
+order (as from a live feed), then times "all events from stream X between
+t0 and t1" queries against both the index and a vectorized scan of the same
+arrays. Also times streaming use: appending events one at a time while
+evicting those older than a one-day horizon. Run from the repository root
+with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_time_index.py [n_events]
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+import numpy
+
+from voeventparse.index import TimeIndex
+from common import best_of, report_per_call
+
+STREAMS = ['voeventparse.bench/{}'.format(s) for s in 'ABCDEFGH']
+
+
+def random_events(rng, n, start):
+    """About one event per second, each time jittered by ~10 s."""
+    times = (start + (numpy.arange(n) * 1e6 + rng.normal(0, 1e7, n))
+             .astype('timedelta64[us]'))
+    dates = times + rng.uniform(0, 6e7, n).astype('timedelta64[us]')
+    streams = rng.randint(0, len(STREAMS), n)
+    ivorns = numpy.array(['ivo://{}#{}'.format(STREAMS[s], i)
+                          for i, s in enumerate(streams.tolist())],
+                         dtype=object)
+    return ivorns, streams, times, dates
+
+
+def main():
+    n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rng = numpy.random.RandomState(42)
+    start = numpy.datetime64('2020-01-01', 'us')
+    ivorns, streams, times, dates = random_events(rng, n_events, start)
+    print('{} events over {} streams'.format(n_events, len(STREAMS)))
+
+    t = time.time()
+    index = TimeIndex()
+    index.add_many(ivorns, times, dates)
+    print('build (add_many): {:.2f} s'.format(time.time() - t))
+
+    span = times[-1] - times[0]
+    for window_s in (60, 3600):
+        window = numpy.timedelta64(window_s, 's')
+        t0s = (times[0] + (rng.uniform(0, 1, 200) * span)
+               .astype('timedelta64[us]'))
+
+        def scan(t0):
+            selected = ((streams == 3) & (times >= t0) &
+                        (times <= t0 + window))
+            order = numpy.argsort(times[selected], kind='mergesort')
+            return ivorns[selected][order].tolist()
+
+        for t0 in t0s[:10]:
+            assert index.query(t0, t0 + window, STREAMS[3]) == scan(t0)
+
+        def run_index():
+            for t0 in t0s:
+                index.query(t0, t0 + window, STREAMS[3])
+
+        def run_scan():
+            for t0 in t0s[:10]:
+                scan(t0)
+
+        index_time = best_of(run_index, number=1, repeat=3) / len(t0s)
+        scan_time = best_of(run_scan, number=1, repeat=3) / 10
+        print('one stream, {} s window ({:.0f} matches/query):'.format(
+            window_s, numpy.mean([len(scan(t0)) for t0 in t0s[:10]])))
+        report_per_call('  linear scan', scan_time)
+        report_per_call('  TimeIndex.query', index_time)
+        print('  speedup: {:.0f}x'.format(scan_time / index_time))
+
+    # Streaming: a day's worth in the index, appending and evicting.
+    day = numpy.timedelta64(1, 'D')
+    index = TimeIndex()
+    n_day = 86400
+    index.add_many(ivorns[:n_day], times[:n_day], dates[:n_day])
+    n_stream = min(100000, n_events - n_day)
+    t = time.time()
+    for i in range(n_day, n_day + n_stream):
+        index.add(ivorns[i], times[i], dates[i])
+        if i % 100 == 0:
+            index.evict(times[i] - day)
+    report_per_call('streaming add, evicting every 100 events',
+                    (time.time() - t) / n_stream)
+
+
+if __name__ == '__main__':
+    main()
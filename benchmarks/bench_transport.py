@@ -0,0 +1,119 @@
+"""
+VTP framing throughput, in frames per second.
+
+Encodes the fixture packets (plus a share of iamalive messages) as a VTP
+stream, then decodes it with ``FrameDecoder`` in chunks of various sizes,
+with ``read_frame`` over a local socket pair and, on Python 3.5+, with
+``voeventparse.aio.read_frame`` over a local TCP connection. Also times
+telling Transport messages apart from VOEvents, and building acks.
+Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_transport.py
+"""
+from __future__ import print_function
+
+import socket
+import sys
+import threading
+import time
+
+from voeventparse import transport
+from common import best_of, read_fixtures, report_per_call
+
+N_FRAMES = 20000
+
+
+def make_stream():
+    packets = read_fixtures() + [transport.make_iamalive('ivo://bench/x')]
+    payloads = [packets[i % len(packets)] for i in range(N_FRAMES)]
+    return payloads, b''.join(transport.encode_frame(p) for p in payloads)
+
+
+def report_rate(label, n, seconds):
+    print('{:<58} {:10.0f} frames/s'.format(label, n / seconds))
+
+
+def time_decoder(stream, chunk_size):
+    decoder = transport.FrameDecoder()
+    t0 = time.time()
+    n = 0
+    for i in range(0, len(stream), chunk_size):
+        n += len(decoder.feed(stream[i:i + chunk_size]))
+    return n, time.time() - t0
+
+
+def time_socket(stream):
+    server, client = socket.socketpair()
+
+    def send():
+        server.sendall(stream)
+        server.close()
+
+    t = threading.Thread(target=send)
+    t0 = time.time()
+    t.start()
+    n = sum(1 for _ in transport.iter_frames(client))
+    elapsed = time.time() - t0
+    t.join()
+    client.close()
+    return n, elapsed
+
+
+def time_asyncio(stream):
+    import asyncio
+    from voeventparse.aio import read_frame
+
+    async def run():
+        async def handle(reader, writer):
+            writer.write(stream)
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        t0 = time.time()
+        n = 0
+        while await read_frame(reader) is not None:
+            n += 1
+        elapsed = time.time() - t0
+        writer.close()
+        server.close()
+        return n, elapsed
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+
+def main():
+    payloads, stream = make_stream()
+    print('{} frames, {:.1f} MB'.format(len(payloads), len(stream) / 1e6))
+    report_rate('encode_frame', len(payloads),
+                best_of(lambda: [transport.encode_frame(p) for p in payloads],
+                        number=1, repeat=3))
+    for chunk_size in (1024, 4096, 65536, 1 << 20):
+        n, elapsed = time_decoder(stream, chunk_size)
+        assert n == len(payloads)
+        report_rate('FrameDecoder.feed, {} byte chunks'.format(chunk_size),
+                    n, elapsed)
+    report_rate('read_frame over socketpair', *time_socket(stream))
+    if sys.version_info >= (3, 5):
+        report_rate('aio.read_frame over TCP', *time_asyncio(stream))
+    ack = payloads[-1]
+    report_per_call('is_transport_message (iamalive)',
+                    best_of(lambda: transport.is_transport_message(ack)))
+    report_per_call('is_transport_message (VOEvent)',
+                    best_of(lambda: transport.is_transport_message(
+                        payloads[0])))
+    report_per_call('parse_transport_message',
+                    best_of(lambda: transport.parse_transport_message(ack)))
+    report_per_call('make_ack',
+                    best_of(lambda: transport.make_ack('ivo://a/b#1',
+                                                       'ivo://c/d')))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Typed Param values: ``get_typed_params``.
+
+Compares the usual hand-rolled approach, in which each downstream filter
+fetches the Params and casts the values it needs in a Python loop, with
+``get_typed_params``, both on first call (decoding) and on repeat calls
+(with ``cache=True``, cached on the packet, which is loaded with
+``track_changes``), on each of the bundled v2.0 fixture packets. Run from
+the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_typed_params.py
+"""
+from __future__ import print_function
+
+import os
+
+import voeventparse as vp
+from common import best_of, read_fixtures, report_per_call, v2_fixture_paths
+
+
+def _cast(atts):
+    value = atts.get('value')
+    datatype = atts.get('dataType')
+    try:
+        if datatype == 'int':
+            return int(value)
+        if datatype == 'float' or atts.get('unit'):
+            return float(value)
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+def hand_rolled(voevent):
+    """What a filter typically does for itself."""
+    typed = {}
+    for name, atts in vp.get_toplevel_params(voevent).allitems():
+        typed[(None, name)] = _cast(atts)
+    for group, params in vp.get_grouped_params(voevent).allitems():
+        for name, atts in params.allitems():
+            typed[(group, name)] = _cast(atts)
+    return typed
+
+
+def first_call(voevent):
+    vp.mark_modified(voevent)  # Discards the cached result.
+    return vp.get_typed_params(voevent, cache=True)
+
+
+def main():
+    parser = vp.VOEventParser(track_changes=True)
+    for path, raw in zip(v2_fixture_paths, read_fixtures()):
+        v = parser.loads(raw)
+        print('{} ({} Params)'.format(os.path.basename(path),
+                                      len(v.What.findall('.//Param'))))
+        hand_time = best_of(lambda: hand_rolled(v))
+        first_time = best_of(lambda: first_call(v))
+        vp.get_typed_params(v, cache=True)
+        cached_time = best_of(lambda: vp.get_typed_params(v, cache=True),
+                              number=100000)
+        report_per_call('  hand-rolled casting', hand_time)
+        report_per_call('  get_typed_params (first call)', first_time)
+        report_per_call('  get_typed_params (cached)', cached_time)
+        print('  speedup, first call: {:.1f}x, 5 filters per packet: '
+              '{:.1f}x'.format(hand_time / first_time,
+                               5 * hand_time / (first_time +
+                                                4 * cached_time)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Schema-validation throughput on the bundled v2.0 fixture packets.
+
+Compares the previous in-place (mutating) validation against the current
+non-mutating ``valid_as_v2_0``, a round-trip through serialized bytes,
+re-parsing the packet's original bytes, the cached result on a packet loaded
+with ``track_changes``, and validation during parsing via
+``loads(validate=True)``.
+Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/bench_validate.py
+"""
+from __future__ import print_function
+
+import os
+
+from lxml import etree
+
+import voeventparse as vp
+from voeventparse.voevent import (_remove_root_tag_prefix,
+                                  _return_to_standard_xml)
+from common import best_of, read_fixtures, report_per_call, v2_fixture_paths
+
+
+def valid_in_place(v):
+    """The previous implementation, which modifies the packet."""
+    _return_to_standard_xml(v)
+    valid_bool = vp.get_v2_0_schema().validate(v)
+    _remove_root_tag_prefix(v)
+    return valid_bool
+
+
+validating_parser = etree.XMLParser(schema=vp.get_v2_0_schema())
+
+
+def valid_via_bytes(v):
+    try:
+        etree.fromstring(vp.dumps(v), parser=validating_parser)
+    except etree.XMLSyntaxError:
+        return False
+    return True
+
+
+def valid_via_source(raw):
+    try:
+        etree.fromstring(raw, parser=validating_parser)
+    except etree.XMLSyntaxError:
+        return False
+    return True
+
+
+def main():
+    tracking_parser = vp.VOEventParser(track_changes=True)
+    for path, raw in zip(v2_fixture_paths, read_fixtures()):
+        print('{} ({} bytes)'.format(os.path.basename(path), len(raw)))
+        v = vp.loads(raw)
+        tracked = tracking_parser.loads(raw)
+        for label, func in [
+            ('in-place (previous valid_as_v2_0)', lambda: valid_in_place(v)),
+            ('valid_as_v2_0 (copy, non-mutating)',
+             lambda: vp.valid_as_v2_0(v)),
+            ('dumps + validating parse', lambda: valid_via_bytes(v)),
+            ('validating parse of source bytes',
+             lambda: valid_via_source(raw)),
+            ('valid_as_v2_0 (cached, track_changes)',
+             lambda: vp.valid_as_v2_0(tracked)),
+            ('loads(raw, validate=True) (parse included)',
+             lambda: vp.loads(raw, validate=True)),
+        ]:
+            report_per_call('  ' + label, best_of(func))
+
+
+if __name__ == '__main__':
+    main()
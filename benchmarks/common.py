@@ -0,0 +1,41 @@
+"""Helpers shared by the benchmark scripts."""
+from __future__ import print_function
+
+import timeit
+
+from voeventparse.fixtures import datapaths
+
+#: The fixture packets which are valid VOEvent v2.0.
+v2_fixture_paths = [
+    datapaths.swift_bat_grb_pos_v2,
+    datapaths.moa_lensing_event_path,
+    datapaths.gaia_alert_16aac_direct,
+    datapaths.asassn_scraped_example,
+]
+
+
+def read_fixtures(paths=None):
+    """Returns the raw bytes of each fixture packet."""
+    contents = []
+    for path in paths or v2_fixture_paths:
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+    return contents
+
+
+def best_of(func, number=1000, repeat=5):
+    """Best per-call time of ``func`` in seconds (see :mod:`timeit`)."""
+    times = timeit.repeat(func, number=number, repeat=repeat)
+    return min(times) / number
+
+
+def report(label, times):
+    """Print min / median of a list of times (seconds) in milliseconds."""
+    times = sorted(times)
+    print('{:<58} min {:8.3f} ms   median {:8.3f} ms'.format(
+        label, 1e3 * times[0], 1e3 * times[len(times) // 2]))
+
+
+def report_per_call(label, seconds):
+    print('{:<58} {:10.1f} us/call {:10.0f} /s'.format(
+        label, 1e6 * seconds, 1. / seconds))
@@ -0,0 +1,242 @@
+"""
+A local stand-in for a VTP broker, for load-testing VOEvent consumers.
+
+Listens for a subscriber connection, then sends it packets over the VOEvent
+Transport Protocol at a given rate, as a broker would, along with periodic
+iamalive messages. Each VOEvent should be acknowledged by the subscriber;
+once all have been, reports the delivered frames per second and the
+send-to-ack latency percentiles.
+
+Packets are replayed from a directory of one-packet files, from an archive
+(see ``iter_load``), or by default are synthesized: the fixture packets,
+plus packets authored with ``Voevent()`` etc. Packets are sent in rotation
+until ``--count`` have been sent.
+
+With ``--consumer``, a simple subscriber (``loads`` then ack) is run in a
+separate process, so the whole thing is self-contained; otherwise connect
+your own consumer to the given port. Requires Python 3.5+.
+Run from the repository root with e.g.::
+
+    PYTHONPATH=src python benchmarks/vtp_broker.py --consumer --rate 2000
+    PYTHONPATH=src python benchmarks/vtp_broker.py --port 8099 \\
+        --directory /path/to/packets --rate 0
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import glob
+import multiprocessing
+import os
+import random
+import socket
+import time
+
+import pytz
+
+import voeventparse as vp
+from voeventparse import transport
+from voeventparse.aio import read_frame, write_frame
+from common import read_fixtures
+
+BROKER_IVORN = 'ivo://voeventparse.bench/broker'
+CONSUMER_IVORN = 'ivo://voeventparse.bench/consumer'
+IAMALIVE_INTERVAL = 1.  # seconds
+
+
+def synthesize_packets(n):
+    """Authors ``n`` packets with the Voevent() API."""
+    random.seed(42)
+    now = datetime.datetime.now(pytz.utc)
+    location = vp.definitions.observatory_location.geosurface
+    packets = []
+    for i in range(n):
+        v = vp.Voevent(stream='voeventparse.bench/SYNTH', stream_id=i,
+                       role=vp.definitions.roles.test)
+        vp.set_who(v, date=now, author_ivorn='voeventparse.bench')
+        vp.set_author(v, title='voevent-parse benchmark broker')
+        vp.add_where_when(
+            v,
+            coords=vp.Position2D(
+                ra=random.uniform(0, 360), dec=random.uniform(-90, 90),
+                err=random.uniform(0.01, 1),
+                units=vp.definitions.units.degrees,
+                system=vp.definitions.sky_coord_system.utc_fk5_geo),
+            obs_time=now - datetime.timedelta(seconds=i),
+            observatory_location=location)
+        for j in range(random.randint(1, 20)):
+            v.What.append(vp.Param(name='param_{}'.format(j),
+                                   value=random.random(), unit='Jy',
+                                   ucd='phot.flux'))
+        packets.append(vp.dumps(v))
+    return packets
+
+
+def load_packets(args):
+    if args.directory:
+        packets = []
+        for path in sorted(glob.glob(os.path.join(args.directory, '*.xml'))):
+            with open(path, 'rb') as f:
+                packets.append(f.read())
+    elif args.archive:
+        with open(args.archive, 'rb') as f:
+            packets = [vp.dumps(v) for v in vp.iter_load(f)]
+    else:
+        packets = read_fixtures() + synthesize_packets(args.synthesize)
+    if not packets:
+        raise SystemExit('No packets to send')
+    return packets
+
+
+class Session(object):
+    """Sends packets to one subscriber and matches up the acks."""
+
+    def __init__(self, packets, count, rate):
+        self.packets = packets
+        self.count = count
+        self.rate = rate
+        # VTP subscribers ack in order, so a FIFO of send times will do;
+        # we check the ack's Origin against the IVORN to make sure.
+        self.in_flight = collections.deque()
+        self.ivorns = [vp.peek_header(p).ivorn for p in packets]
+        self.latencies = []
+        self.naks = 0
+        self.iamalives = 0
+        self.first_send = self.last_ack = None
+        self.error = None
+        self.done = asyncio.Event()
+
+    async def send(self, writer):
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        next_iamalive = start + IAMALIVE_INTERVAL
+        for i in range(self.count):
+            if self.rate:
+                delay = start + i / self.rate - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if loop.time() > next_iamalive:
+                write_frame(writer, transport.make_iamalive(BROKER_IVORN))
+                next_iamalive += IAMALIVE_INTERVAL
+            k = i % len(self.packets)
+            now = time.perf_counter()
+            if self.first_send is None:
+                self.first_send = now
+            self.in_flight.append((self.ivorns[k], now))
+            write_frame(writer, self.packets[k])
+            await writer.drain()
+
+    async def receive(self, reader):
+        while len(self.latencies) + self.naks < self.count:
+            payload = await read_frame(reader)
+            if payload is None:
+                raise EOFError('Subscriber disconnected after {} acks'.format(
+                    len(self.latencies)))
+            message = transport.parse_transport_message(payload)
+            if message.role == 'iamalive':
+                self.iamalives += 1
+                continue
+            ivorn, sent = self.in_flight.popleft()
+            if message.origin != ivorn:
+                raise ValueError('Expected {} for {}, got {}'.format(
+                    message.role, ivorn, message.origin))
+            if message.role == 'ack':
+                self.latencies.append(time.perf_counter() - sent)
+            else:
+                self.naks += 1
+        self.last_ack = time.perf_counter()
+
+    async def handle(self, reader, writer):
+        try:
+            await asyncio.gather(self.send(writer), self.receive(reader))
+        except Exception as e:
+            self.error = e
+        finally:
+            writer.close()
+            self.done.set()
+
+    def report(self):
+        elapsed = self.last_ack - self.first_send
+        print('{} VOEvents acked ({} nak), {} iamalive replies'.format(
+            len(self.latencies), self.naks, self.iamalives))
+        print('delivered: {:.0f} frames/s over {:.2f} s'.format(
+            (len(self.latencies) + self.naks) / elapsed, elapsed))
+        latencies = sorted(self.latencies)
+        print('send-to-ack latency: ' + ' '.join(
+            'p{}={:.2f}ms'.format(
+                p, 1e3 * latencies[min(len(latencies) - 1,
+                                       len(latencies) * p // 100)])
+            for p in (50, 90, 99, 100)))
+
+
+def run_consumer(port):
+    """A simple blocking subscriber: loads each packet, then acks it."""
+    sock = socket.create_connection(('127.0.0.1', port))
+    try:
+        for payload in transport.iter_frames(sock):
+            if transport.is_transport_message(payload):
+                message = transport.parse_transport_message(payload)
+                if message.role == 'iamalive':
+                    reply = transport.make_iamalive(CONSUMER_IVORN,
+                                                    origin=message.origin)
+                    sock.sendall(transport.encode_frame(reply))
+                continue
+            v = vp.loads(payload)
+            ack = transport.make_ack(v.attrib['ivorn'], CONSUMER_IVORN)
+            sock.sendall(transport.encode_frame(ack))
+    finally:
+        sock.close()
+
+
+async def serve(args, packets):
+    session = Session(packets, args.count, args.rate)
+    server = await asyncio.start_server(session.handle, '127.0.0.1',
+                                        args.port)
+    port = server.sockets[0].getsockname()[1]
+    print('{} distinct packets; sending {} at {} on port {}'.format(
+        len(packets), args.count,
+        '{} frames/s'.format(args.rate) if args.rate else 'full speed',
+        port))
+    consumer = None
+    if args.consumer:
+        consumer = multiprocessing.Process(target=run_consumer, args=(port,))
+        consumer.start()
+    try:
+        await session.done.wait()
+    finally:
+        server.close()
+        if consumer is not None:
+            consumer.join(5)
+            consumer.terminate()
+    if session.error is not None:
+        raise session.error
+    session.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--directory', help='Replay the *.xml files here')
+    source.add_argument('--archive', help='Replay the packets in this file')
+    parser.add_argument('--synthesize', type=int, default=100,
+                        help='Number of packets to author (default: 100)')
+    parser.add_argument('--count', type=int, default=10000,
+                        help='Number of packets to send (default: 10000)')
+    parser.add_argument('--rate', type=float, default=1000.,
+                        help='Packets per second, 0 for unlimited '
+                             '(default: 1000)')
+    parser.add_argument('--port', type=int, default=0,
+                        help='Port to listen on (default: any free port)')
+    parser.add_argument('--consumer', action='store_true',
+                        help='Run a simple loads()-based subscriber')
+    args = parser.parse_args()
+    packets = load_packets(args)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(serve(args, packets))
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,7 @@ install_requires = [
     "astropy>=1.2",
     "lxml>=2.3",
     'iso8601',
-    'orderedmultidict',
+    'numpy',
     'pytz',
     'six',
 ]
@@ -10,27 +10,42 @@ del get_versions
 
 from voeventparse.voevent import (
     Voevent,
+    VOEventParser,
+    get_v2_0_schema,
     voevent_v2_0_schema,
-    load, loads, dump, dumps,
+    load, loads, iter_load, peek_header, dump, dumps, mark_modified,
     valid_as_v2_0, assert_valid_as_v2_0,
     set_who, set_author, add_where_when,
     add_how, add_why, add_citations
 )
 import voeventparse.definitions as definitions
+from voeventparse.ingest import load_many, ThreadedIngestor
+import voeventparse.transport as transport
 from voeventparse.misc import (
     Citation,
+    Coincidence,
     EventIvorn,
     Group,
     Inference,
+    ObsLocation,
+    OrderedMultiDict,
     Param,
+    PacketHeader,
     Position2D,
+    PositionArrays,
     Reference,
 )
 from voeventparse.convenience import (
     get_event_time_as_utc,
+    get_event_times_as_utc,
     get_grouped_params,
     get_toplevel_params,
+    get_typed_params,
+    params_to_columns,
     get_event_position,
+    get_event_positions,
+    iter_obs_locations,
+    get_obs_locations_array,
     pull_astro_coords,
     pull_isotime,
     pull_params,
@@ -0,0 +1,188 @@
+"""
+An :py:mod:`asyncio` interface for loading and validating VOEvent packets.
+
+Parsing and validating a large packet can take milliseconds, which is far
+too long to spend blocking an event loop. The coroutines here run that work
+in a thread pool instead (lxml releases the GIL while parsing), while
+limiting the number of packets in flight, so that a burst of traffic queues
+up in the event loop rather than swamping the pool. E.g.::
+
+    from voeventparse.aio import aloads, avalidate
+
+    async def handle(packet_bytes):
+        v = await aloads(packet_bytes)
+        if await avalidate(v):
+            ...
+
+Requires Python 3.5 or later. Not imported by ``import voeventparse``, since
+that also supports Python 2.
+"""
+import asyncio
+import concurrent.futures
+import os
+
+from voeventparse.transport import MAX_FRAME_SIZE, frame_prefix
+from voeventparse.voevent import loads, valid_as_v2_0
+
+
+class AsyncLoader(object):
+    """
+    Runs packet loading and validation in a bounded thread pool.
+
+    Each call to a coroutine method first waits for a free slot (at most
+    ``max_concurrency`` calls are in progress at once), then submits the
+    work to the executor. If the awaiting task is cancelled, work which has
+    not yet started is dropped; work which has started cannot be
+    interrupted, but the task is still cancelled straight away, and the slot
+    is freed once the work finishes in the background.
+
+    Instances may be shared by several event loops, though not used by them
+    concurrently.
+
+    Args:
+        max_workers (int): Number of threads, if creating the executor.
+            Defaults to the number of CPUs.
+        max_concurrency (int): Maximum calls in progress at once. Defaults
+            to the number of executor threads, so that work never queues up
+            inside the executor (where it's harder to cancel).
+        executor (:py:class:`concurrent.futures.Executor`): Use this rather
+            than creating a thread pool. It is then up to you to shut it
+            down. (A process pool will not work, since objectify trees
+            cannot be pickled.)
+    """
+
+    def __init__(self, max_workers=None, max_concurrency=None,
+                 executor=None):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_concurrency is None:
+            max_concurrency = getattr(executor, '_max_workers', max_workers)
+        if max_concurrency < 1:
+            raise ValueError("'max_concurrency' must be at least 1")
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._loop = None
+        self._semaphore = None
+
+    @property
+    def executor(self):
+        """The executor used to run the work, created on first use."""
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                self.max_workers)
+        return self._executor
+
+    async def loads(self, s, check_version=True, validate=False,
+                    keep_source=False):
+        """Load VOEvent from bytes. See :py:func:`.loads`."""
+        return await self._run(loads, s, check_version, validate,
+                               keep_source)
+
+    async def validate(self, voevent):
+        """Tests if a voevent conforms to the schema.
+        See :py:func:`.valid_as_v2_0`."""
+        return await self._run(valid_as_v2_0, voevent)
+
+    def shutdown(self, wait=True):
+        """Shut down the executor, if created by this instance."""
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        semaphore = self._get_semaphore(loop)
+        await semaphore.acquire()
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            semaphore.release()
+            raise
+
+        # Release the slot only once the work is really done (or dropped),
+        # not as soon as the awaiting task is cancelled.
+        def release(_):
+            try:
+                loop.call_soon_threadsafe(semaphore.release)
+            except RuntimeError:
+                pass  # Loop closed; the semaphore is of no further use.
+
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def _get_semaphore(self, loop):
+        # asyncio primitives belong to the loop they were first used in.
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+
+_default_loader = AsyncLoader()
+
+
+async def aloads(s, check_version=True, validate=False, keep_source=False):
+    """Load VOEvent from bytes, without blocking the event loop.
+
+    The coroutine equivalent of :py:func:`.loads`, run using a default
+    :py:class:`AsyncLoader`.
+    """
+    return await _default_loader.loads(s, check_version, validate,
+                                       keep_source)
+
+
+async def avalidate(voevent):
+    """Tests if a voevent conforms to the schema, without blocking the
+    event loop.
+
+    The coroutine equivalent of :py:func:`.valid_as_v2_0`, run using a
+    default :py:class:`AsyncLoader`.
+    """
+    return await _default_loader.validate(voevent)
+
+
+async def read_frame(reader, max_frame_size=MAX_FRAME_SIZE):
+    """Read one VTP frame from an asyncio stream.
+
+    The asyncio counterpart of :py:func:`voeventparse.transport.read_frame`.
+
+    Args:
+        reader (:py:class:`asyncio.StreamReader`): The stream to read from.
+        max_frame_size (int): See
+            :py:class:`voeventparse.transport.FrameDecoder`.
+    Returns:
+        bytes: The frame payload, or ``None`` if the stream ended cleanly
+        before the start of a frame.
+    Raises:
+        EOFError: If the stream ended part-way through a frame.
+        ValueError: If the frame exceeds ``max_frame_size``.
+    """
+    try:
+        prefix = await reader.readexactly(4)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise EOFError('Stream ended part-way through a VTP frame')
+    length = int.from_bytes(prefix, 'big')
+    if max_frame_size is not None and length > max_frame_size:
+        raise ValueError('VTP frame of {} bytes exceeds maximum of {}'.format(
+            length, max_frame_size))
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise EOFError('Stream ended part-way through a VTP frame')
+
+
+def write_frame(writer, payload):
+    """Write a VTP frame to an asyncio stream.
+
+    The payload is not copied. As usual with asyncio streams, follow up
+    with ``await writer.drain()`` to apply flow control.
+
+    Args:
+        writer (:py:class:`asyncio.StreamWriter`): The stream to write to.
+        payload (bytes): The frame payload.
+    """
+    writer.writelines((frame_prefix(len(payload)), payload))
@@ -1,16 +1,22 @@
-"""Convenience routines for common actions on VOEvent objects"""
+"""Convenience routines for common actions on VOEvent objects
+
+Note that the heavier third-party dependencies used here (astropy, iso8601,
+numpy) are imported within the routines that need them, so that
+``import voeventparse`` stays cheap for processes which never call them.
+"""
 
 from __future__ import absolute_import
 
+import re
+import threading
 from collections import OrderedDict
 from copy import deepcopy
 
-import astropy.time
-import iso8601
 import lxml
 import pytz
-from voeventparse.misc import (Position2D)
-from orderedmultidict import omdict as OMDict
+from voeventparse.misc import (ObsLocation, OrderedMultiDict, Position2D,
+                               PositionArrays)
+from voeventparse.voevent import _packet_cache
 
 
 def get_event_time_as_utc(voevent, index=0):
@@ -28,13 +34,17 @@ def get_event_time_as_utc(voevent, index=0):
     moving over time. Most packets will have only one, however, so the
     default is to access the first.
 
-    This function now implements conversion from the
+    This function implements conversion from the
     TDB (Barycentric Dynamical Time) time scale in ISOTime format,
-    since this is the format used by GAIA VOEvents.
+    since this is the format used by GAIA VOEvents, and from the
+    TT (Terrestrial Time) and GPS time scales.
     (See also http://docs.astropy.org/en/stable/time/#time-scale )
 
-    Other timescales (i.e. TT, GPS) will presumably be formatted as a
-    TimeOffset, parsing this format is not yet implemented.
+    In place of an ISOTime, the time may be given as a TimeOffset, in the
+    units of the Time element (seconds, or ``d`` for days), from the epoch
+    named by the TimeScale element: ``MJD`` or ``JD`` (i.e. MJD / JD zero),
+    or ``GPS`` (1980-01-06T00:00:00, the default for the GPS time-system).
+    The offset and epoch are in the packet's time-system.
 
     Args:
         voevent (:class:`voeventparse.voevent.Voevent`): Root node of the VOevent
@@ -46,33 +56,268 @@ def get_event_time_as_utc(voevent, index=0):
         converted to UTC (timezone aware).
 
     """
-    try:
-        od = voevent.WhereWhen.ObsDataLocation[index]
-        ol = od.ObservationLocation
-        coord_sys = ol.AstroCoords.attrib['coord_system_id']
-        timesys_identifier = coord_sys.split('-')[0]
-
+    fields = _get_time_fields(voevent, index, strict=True)
+    if fields is None:
+        return None
+    timesys_identifier, isotime_str = fields[:2]
+    if isotime_str is not None:
+        import iso8601
         if timesys_identifier == 'UTC':
-            isotime_str = str(ol.AstroCoords.Time.TimeInstant.ISOTime)
             return iso8601.parse_date(isotime_str)
         elif (timesys_identifier == 'TDB'):
-            isotime_str = str(ol.AstroCoords.Time.TimeInstant.ISOTime)
             isotime_dtime = iso8601.parse_date(isotime_str)
+            import astropy.time
             tdb_time = astropy.time.Time(isotime_dtime, scale='tdb')
             return tdb_time.utc.to_datetime().replace(tzinfo=pytz.UTC)
-        elif (timesys_identifier == 'TT' or timesys_identifier == 'GPS'):
-            raise NotImplementedError(
-                "Conversion from time-system '{}' to UTC not yet implemented"
-            )
-        else:
+    utc = _convert_time_fields([fields])[0].astype(object)
+    return utc.replace(tzinfo=pytz.UTC)
+
+
+# Paths of the fields we extract from an ObservationLocation.
+_position_field_paths = (
+    'AstroCoordSystem/@id',
+    'AstroCoords/Position2D/@unit',
+    'AstroCoords/Position2D/Value2/C1',
+    'AstroCoords/Position2D/Value2/C2',
+    'AstroCoords/Position2D/Error2Radius',
+    'AstroCoords/Position2D/Name1',
+    'AstroCoords/Position2D/Name2',
+)
+_time_field_paths = (
+    'AstroCoords/@coord_system_id',
+    'AstroCoords/Time/@unit',
+    'AstroCoords/Time/TimeInstant/ISOTime',
+    'AstroCoords/Time/TimeInstant/TimeOffset',
+    'AstroCoords/Time/TimeInstant/TimeScale',
+)
+_location_field_paths = {
+    'position': _position_field_paths,
+    'time': _time_field_paths,
+    'all': _position_field_paths + _time_field_paths,
+}
+_packet_location_path = 'WhereWhen/ObsDataLocation[$index]/ObservationLocation'
+
+
+def _make_location_xpaths(location, paths):
+    # Fetches all the fields in one evaluation, as a '|'-separated string,
+    # which avoids creating an objectify proxy for each element on the way.
+    # (Characters which can't appear in XML text can't go in an XPath
+    # either, so '|' may also turn up in a field; then we fall back to
+    # fetching the fields one at a time.)
+    fields = [location + '/' + path for path in paths]
+    return (lxml.etree.XPath("concat({})".format(", '|', ".join(fields)),
+                             smart_strings=False),
+            [lxml.etree.XPath("string({})".format(field), smart_strings=False)
+             for field in fields])
+
+
+_xpath_local = threading.local()
+
+
+def _location_xpaths(kind, location):
+    """Returns the XPaths which fetch the ``kind`` fields of an
+    ObservationLocation, relative to ``location``, belonging to the calling
+    thread. (lxml XPath objects are not safe to share between threads.)"""
+    xpaths = getattr(_xpath_local, 'xpaths', None)
+    if xpaths is None:
+        xpaths = _xpath_local.xpaths = {}
+    kind_xpaths = xpaths.get((kind, location))
+    if kind_xpaths is None:
+        kind_xpaths = xpaths[(kind, location)] = _make_location_xpaths(
+            location, _location_field_paths[kind])
+    return kind_xpaths
+
+
+def _fetch_location_fields(node, kind, location=_packet_location_path,
+                           **variables):
+    """Returns the ``kind`` fields of the ObservationLocation at
+    ``location`` relative to ``node``, as a list of strings (empty where
+    absent)."""
+    all_fields, each_field = _location_xpaths(kind, location)
+    fields = all_fields(node, **variables).split('|')
+    if len(fields) != len(each_field):
+        # Some field contains a '|' itself.
+        fields = [xpath(node, **variables) for xpath in each_field]
+    return fields
+
+
+def _get_location_fields(voevent, index, kind, strict=False):
+    """Returns the ``kind`` fields of the given `ObsDataLocation`, as a list
+    of strings (empty where absent).
+
+    Negative indices count back from the last `ObsDataLocation`, as for a
+    list. If the packet has no such `ObsDataLocation` the fields are all
+    empty, unless ``strict`` is set and the packet has some (but fewer)
+    `ObsDataLocation` entries, in which case IndexError is raised.
+    """
+    if index < 0 or strict:
+        where_when = voevent.find('WhereWhen')
+        n_locations = 0 if where_when is None else len(
+            where_when.findall('ObsDataLocation'))
+        if index < 0:
+            index += n_locations
+        if not 0 <= index < n_locations:
+            if strict and n_locations:
+                raise IndexError('ObsDataLocation index out of range')
+            return [''] * len(_location_field_paths[kind])
+    return _fetch_location_fields(voevent, kind, index=index + 1)
+
+
+def _get_time_fields(voevent, index=0, strict=False):
+    """Returns the time-system identifier, then the ISOTime string, or else
+    the TimeOffset, TimeScale and Time unit, of the given `ObsDataLocation`
+    (as a tuple). Returns None if the packet does not have them. See
+    :py:func:`_get_location_fields` regarding ``index`` and ``strict``."""
+    return _time_fields(_get_location_fields(voevent, index, 'time', strict))
+
+
+def _time_fields(fields):
+    """See :py:func:`_get_time_fields`; ``fields`` are the strings given by
+    ``_time_field_paths``."""
+    coord_sys, time_unit, isotime, offset, timescale = fields
+    isotime = isotime.strip()
+    if isotime:
+        return coord_sys.split('-')[0], isotime, None, None, None
+    if not offset:
+        return None
+    return (coord_sys.split('-')[0], None, float(offset),
+            timescale.strip() or None, time_unit or None)
+
+
+def _position_fields(fields):
+    """Returns the (system, unit, ra, dec, err) given the strings given by
+    ``_position_field_paths``, checking the axes are RA and Dec."""
+    system, unit, c1, c2, err, name1, name2 = fields
+    if name1 and (name1.strip() != 'RA' or name2.strip() != 'Dec'):
+        raise ValueError('Unsupported Position2D axes: {}, {}'.format(
+            name1, name2))
+    return system, unit, c1, c2, err
+
+
+# An explicit UTC offset (or 'Z') at the end of an ISOTime string.
+_utc_offset_regex = re.compile(r'(Z|[+-]\d\d(:?\d\d)?)$')
+
+#: Epochs of TimeOffset values, by TimeScale: (epoch, seconds to add).
+_time_offset_epochs = {
+    'MJD': ('1858-11-17T00:00:00', 0.),
+    'JD': ('1858-11-17T00:00:00', -2400000.5 * 86400.),
+    'GPS': ('1980-01-06T00:00:00', 0.),
+}
+_time_units = {'s': 1., 'd': 86400.}
+
+#: Fixed offsets, in seconds, from the time-systems tied to atomic time
+#: to TAI. (Leap seconds only come in between TAI and UTC.)
+_tai_offsets = (('TT', -32.184), ('GPS', 19.))
+
+
+def _resolve_time_offset(timesys_identifier, offset, timescale, unit):
+    """Returns (epoch, seconds) for a TimeOffset."""
+    if timescale is None and timesys_identifier == 'GPS':
+        timescale = 'GPS'
+    try:
+        epoch, shift = _time_offset_epochs[timescale]
+    except KeyError:
+        raise ValueError(
+            'Unsupported TimeScale for a TimeOffset: {}'.format(timescale))
+    try:
+        seconds = offset * _time_units[unit or 's']
+    except KeyError:
+        raise ValueError('Unsupported Time unit: {}'.format(unit))
+    return epoch, seconds + shift
+
+
+def _convert_time_fields(fields_list):
+    """Converts the output of :py:func:`_get_time_fields` for many packets
+    to UTC, returning an array of ``datetime64[us]``.
+
+    Packets in the TT and GPS time-systems are brought to TAI by their fixed
+    offsets, then converted to UTC together, so that the leap-second
+    handling is done once per batch (by astropy). Likewise for TDB.
+    """
+    import numpy
+    isotimes = ['NaT'] * len(fields_list)
+    offsets = []
+    rows_by_system = dict(UTC=[], TDB=[], TT=[], GPS=[])
+    for row, fields in enumerate(fields_list):
+        if fields is None:
+            continue
+        timesys_identifier, isotime_str = fields[:2]
+        rows = rows_by_system.get(timesys_identifier)
+        if rows is None:
             raise ValueError(
                 'Unrecognised time-system: {} (badly formatted VOEvent?)'.format(
                     timesys_identifier
                 )
             )
+        rows.append(row)
+        if isotime_str is None:
+            offsets.append((row, _resolve_time_offset(timesys_identifier,
+                                                      *fields[2:])))
+        elif _utc_offset_regex.search(isotime_str):
+            # NumPy parses plain ISO-8601 strings in bulk, but not offsets.
+            import iso8601
+            dt = iso8601.parse_date(isotime_str).astimezone(pytz.UTC)
+            isotimes[row] = dt.replace(tzinfo=None).isoformat()
+        else:
+            isotimes[row] = isotime_str
+    times = numpy.array(isotimes, dtype='datetime64[us]')
+    for row, (epoch, seconds) in offsets:
+        times[row] = (numpy.datetime64(epoch, 'us') +
+                      numpy.timedelta64(int(round(seconds * 1e6)), 'us'))
+
+    tai_rows = []
+    for timesys_identifier, shift in _tai_offsets:
+        rows = rows_by_system[timesys_identifier]
+        if rows:
+            times[rows] += numpy.timedelta64(int(round(shift * 1e6)), 'us')
+            tai_rows.extend(rows)
+    for scale, rows in (('tai', tai_rows), ('tdb', rows_by_system['TDB'])):
+        if rows:
+            import astropy.time
+            # (Via ISO strings, as astropy < 3.1 has no datetime64 format.)
+            t = astropy.time.Time(times[rows].astype(str), format='isot',
+                                  scale=scale).utc
+            t.precision = 6
+            times[rows] = numpy.array(t.isot, dtype='datetime64[us]')
+    return times
+
+
+def get_event_times_as_utc(packets, index=0, as_datetime=False):
+    """
+    Extracts the event times of many packets, converted to UTC.
 
-    except AttributeError:
-        return None
+    The batch equivalent of :py:func:`.get_event_time_as_utc`, giving the
+    same results much faster for large numbers of packets. The time fields
+    of all packets are collected first, then converted in bulk: ISOTime
+    strings are parsed by NumPy, and the times of all packets using the TDB,
+    TT and GPS time-systems (which may be mixed freely) are converted to UTC
+    by array-valued :py:class:`astropy.time.Time` operations, rather than
+    one per packet. In particular, the leap-second handling is done once for
+    the whole batch.
+
+    Args:
+        packets (iterable): Root nodes of the VOEvent etrees.
+        index (int): Index of the ObsDataLocation to extract an ISOtime from,
+            in each packet (negative indices count from the last).
+        as_datetime (bool): Return a list of datetimes rather than an array
+            (Default=False).
+
+    Returns:
+        By default a :py:class:`numpy.ndarray` of ``datetime64[us]`` values
+        (UTC), with NaT for packets which have no event time. With
+        ``as_datetime=True``, a list of :class:`datetime.datetime`
+        (timezone aware, UTC), with None for packets which have no event
+        time.
+    Raises:
+        ValueError: If any packet uses an unrecognised time-system, or a
+            TimeOffset with an unsupported TimeScale or unit.
+    """
+    times = _convert_time_fields(
+        [_get_time_fields(voevent, index) for voevent in packets])
+    if not as_datetime:
+        return times
+    return [None if dt is None else dt.replace(tzinfo=pytz.UTC)
+            for dt in times.astype(object)]
 
 
 def get_event_position(voevent, index=0):
@@ -94,7 +339,7 @@ def get_event_position(voevent, index=0):
     """
     od = voevent.WhereWhen.ObsDataLocation[index]
     ac = od.ObservationLocation.AstroCoords
-    ac_sys = voevent.WhereWhen.ObsDataLocation.ObservationLocation.AstroCoordSystem
+    ac_sys = od.ObservationLocation.AstroCoordSystem
     sys = ac_sys.attrib['id']
 
     if hasattr(ac.Position2D, "Name1"):
@@ -107,31 +352,189 @@ def get_event_position(voevent, index=0):
     return posn
 
 
-def _get_param_children_as_omdict(subtree_element):
-    elt = subtree_element
-    omd = OMDict()
-    if elt.find('Param') is not None:
-        for p in elt.Param:
-            omd.add(p.attrib.get('name'), p.attrib)
+def get_event_positions(packets, index=0):
+    """Extracts the sky positions of many packets into NumPy arrays.
+
+    The batch equivalent of :py:func:`.get_event_position`, returning
+    contiguous arrays ready for vectorized use (e.g. cross-matching). All
+    the fields of each packet are fetched in a single XPath evaluation,
+    rather than by a chain of objectify attribute lookups.
+
+    Packets without a position (or without the given ObsDataLocation) get
+    NaN values and -1 codes, rather than raising an error.
+
+    Args:
+        packets (iterable): Root nodes of the VOEvent etrees.
+        index (int): Index of the ObsDataLocation to extract AstroCoords
+            from, in each packet (negative indices count from the last).
+
+    Returns:
+        :py:class:`.PositionArrays`: The positions, with the system of each
+        taken from the ``AstroCoordSystem`` of the same ObsDataLocation.
+    Raises:
+        ValueError: If a position is not given as RA and Dec.
+    """
+    import numpy
+    coords = []
+    unit_codes, system_codes = {}, {}
+    units, systems = [], []
+    nan = float('nan')
+    for voevent in packets:
+        system, unit, c1, c2, err = _position_fields(
+            _get_location_fields(voevent, index, 'position'))
+        if c1:
+            coords.append((float(c1), float(c2), float(err) if err else nan))
+        else:
+            coords.append((nan, nan, nan))
+        units.append(unit_codes.setdefault(unit, len(unit_codes))
+                     if unit else -1)
+        systems.append(system_codes.setdefault(system, len(system_codes))
+                       if system else -1)
+    coords = numpy.array(coords, dtype=float).reshape(-1, 3)
+    return PositionArrays(
+        ra=numpy.ascontiguousarray(coords[:, 0]),
+        dec=numpy.ascontiguousarray(coords[:, 1]),
+        err=numpy.ascontiguousarray(coords[:, 2]),
+        units=numpy.array(units, dtype=numpy.int16),
+        system=numpy.array(systems, dtype=numpy.int16),
+        unit_names=sorted(unit_codes, key=unit_codes.get),
+        system_names=sorted(system_codes, key=system_codes.get))
+
+
+def _iter_location_fields(voevent):
+    """Yields the fields ('all' of them) of every ObservationLocation."""
+    where_when = voevent.find('WhereWhen')
+    if where_when is None:
+        return
+    n_position_fields = len(_position_field_paths)
+    for od in where_when.iterchildren(tag='ObsDataLocation'):
+        ol = od.find('ObservationLocation')
+        if ol is None:
+            yield None, None
+        else:
+            fields = _fetch_location_fields(ol, 'all', location='.')
+            yield (_position_fields(fields[:n_position_fields]),
+                   _time_fields(fields[n_position_fields:]))
+
+
+def iter_obs_locations(voevent):
+    """Iterates over every `WhereWhen.ObsDataLocation` of a packet.
+
+    Moving-object or multi-epoch packets may carry several ObsDataLocation
+    entries. Rather than calling :py:func:`.get_event_time_as_utc` and
+    :py:func:`.get_event_position` for each index in turn (each of which
+    walks the tree again), this extracts every entry in a single traversal,
+    converting all the times to UTC together (see
+    :py:func:`.get_event_times_as_utc`).
+
+    Args:
+        voevent (:class:`voeventparse.voevent.Voevent`): Root node of the
+            VOEvent etree.
+
+    Returns:
+        iterator: Yields an :py:class:`.ObsLocation` per ObsDataLocation, in
+        document order. The ``time`` or ``position`` is ``None`` where an
+        entry does not give one.
+    Raises:
+        ValueError: If a position is not given as RA and Dec, or a time
+            cannot be converted (see :py:func:`.get_event_times_as_utc`).
+    """
+    entries = list(_iter_location_fields(voevent))
+    times = _convert_time_fields([time for _, time in entries])
+    nan = float('nan')
+    for (position, _), time in zip(entries, times.astype(object)):
+        if position is None:
+            yield ObsLocation(None, None, None)
+            continue
+        system, unit, c1, c2, err = position
+        if c1:
+            position = Position2D(ra=float(c1), dec=float(c2),
+                                  err=float(err) if err else nan,
+                                  units=unit, system=system)
+        else:
+            position = None
+        yield ObsLocation(
+            time=None if time is None else time.replace(tzinfo=pytz.UTC),
+            position=position, system=system or None)
+
+
+def get_obs_locations_array(voevent):
+    """Extracts every `WhereWhen.ObsDataLocation` of a packet as a NumPy
+    structured array, e.g. for trajectory processing.
+
+    The array form of :py:func:`.iter_obs_locations`.
+
+    Args:
+        voevent (:class:`voeventparse.voevent.Voevent`): Root node of the
+            VOEvent etree.
+
+    Returns:
+        :py:class:`numpy.ndarray`: A structured array with a row per
+        ObsDataLocation, in document order, and fields ``time``
+        (``datetime64[us]``, UTC, NaT if absent), ``ra``, ``dec``, ``err``
+        (float64, NaN if absent), ``units`` and ``system`` (strings, empty
+        if absent).
+    """
+    import numpy
+    entries = list(_iter_location_fields(voevent))
+    times = _convert_time_fields([time for _, time in entries])
+    rows = []
+    nan = float('nan')
+    for (position, _), time in zip(entries, times):
+        system, unit, c1, c2, err = position or ('', '', '', '', '')
+        rows.append((time, float(c1) if c1 else nan,
+                     float(c2) if c2 else nan, float(err) if err else nan,
+                     unit, system))
+    text_size = max([1] + [len(row[i]) for row in rows for i in (4, 5)])
+    text_dtype = 'U{}'.format(text_size)
+    dtype = [('time', 'datetime64[us]'), ('ra', float), ('dec', float),
+             ('err', float), ('units', text_dtype), ('system', text_dtype)]
+    return numpy.array(rows, dtype=dtype)
+
+
+# Attributes added by lxml.objectify, which we leave out of Param attribs
+# (as :py:func:`lxml.objectify.deannotate` would).
+_annotation_attribs = (
+    lxml.objectify.PYTYPE_ATTRIBUTE,
+    '{http://www.w3.org/2001/XMLSchema-instance}type',
+)
+
+
+def _get_attribs(element):
+    """Returns a copy of an element's attributes, minus any objectify
+    annotations."""
+    attribs = dict(element.attrib)
+    for key in _annotation_attribs:
+        attribs.pop(key, None)
+    return attribs
+
+
+def _get_param_children(subtree_element):
+    omd = OrderedMultiDict()
+    for p in subtree_element.iterchildren(tag='Param'):
+        attribs = _get_attribs(p)
+        omd.add(attribs.get('name'), attribs)
     return omd
 
 
 def get_grouped_params(voevent):
     """
-    Fetch grouped Params from the `What` section of a voevent as an omdict.
+    Fetch grouped Params from the `What` section of a voevent as a multi-dict.
 
     This fetches 'grouped' Params, i.e. those enclosed in a Group element,
     and returns them as a nested dict-like structure, keyed by
     GroupName->ParamName->AttribName.
 
     Note that since multiple Params may share the same ParamName, the returned
-    data-structure is actually an
-    `orderedmultidict.omdict <https://github.com/gruns/orderedmultidict>`_
+    data-structure is actually an :class:`.OrderedMultiDict`
     and has extra methods such as 'getlist' to allow retrieval of all values.
+    The attribs of each Param are copied straight from the packet, without
+    copying the whole ``What`` section first. Any objectify annotation
+    attributes (``py:pytype``, ``xsi:type``) are left out.
 
     Args:
         voevent (:class:`voeventparse.voevent.Voevent`): Root node of the VOevent etree.
-    Returns (orderedmultidict.omdict):
+    Returns (:class:`.OrderedMultiDict`):
         Mapping of ``ParamName->Attribs``.
         Typical access like so::
 
@@ -140,35 +543,34 @@ def get_grouped_params(voevent):
             all_foo_vals = [atts['value'] for atts in top_params.getlist('foo')]
 
     """
-    groups_omd = OMDict()
-    w = deepcopy(voevent.What)
-    lxml.objectify.deannotate(w)
-    if w.find('Group') is not None:
-        for grp in w.Group:
-            groups_omd.add(grp.attrib.get('name'),
-                           _get_param_children_as_omdict(grp))
+    groups_omd = OrderedMultiDict()
+    for grp in voevent.What.iterchildren(tag='Group'):
+        groups_omd.add(grp.attrib.get('name'),
+                       _get_param_children(grp))
     return groups_omd
 
 
 def get_toplevel_params(voevent):
     """
-    Fetch ungrouped Params from the `What` section of a voevent as an omdict.
+    Fetch ungrouped Params from the `What` section of a voevent as a multi-dict.
 
     This fetches 'toplevel' Params, i.e. those not enclosed in a Group element,
     and returns them as a nested dict-like structure, keyed like
     ParamName->AttribName.
 
     Note that since multiple Params may share the same ParamName, the returned
-    data-structure is actually an
-    `orderedmultidict.omdict <https://github.com/gruns/orderedmultidict>`_
+    data-structure is actually an :class:`.OrderedMultiDict`
     and has extra methods such as 'getlist' to allow retrieval of all values.
+    The attribs of each Param are copied straight from the packet, without
+    copying the whole ``What`` section first. Any objectify annotation
+    attributes (``py:pytype``, ``xsi:type``) are left out.
 
     Any Params with no defined name (technically off-spec, but not invalidated
     by the XML schema) are returned under the dict-key ``None``.
 
     Args:
         voevent (:class:`voeventparse.voevent.Voevent`): Root node of the VOevent etree.
-    Returns (orderedmultidict.omdict):
+    Returns (:class:`.OrderedMultiDict`):
         Mapping of ``ParamName->Attribs``.
         Typical access like so::
 
@@ -177,10 +579,234 @@ def get_toplevel_params(voevent):
             all_foo_vals = [atts['value'] for atts in top_params.getlist('foo')]
 
     """
-    result = OrderedDict()
-    w = deepcopy(voevent.What)
-    lxml.objectify.deannotate(w)
-    return _get_param_children_as_omdict(w)
+    return _get_param_children(voevent.What)
+
+
+# Unbound, since method lookup on objectify elements is relatively slow.
+_get_attrib = lxml.etree._Element.get
+
+
+def _get_param_value(element):
+    """Returns the raw value of a Param element (a string), or None.
+
+    The value is normally the ``value`` attribute, but may instead be given
+    by a ``Value`` child element.
+    """
+    value = _get_attrib(element, 'value')
+    if value is None:
+        value_element = element.find('Value')
+        if value_element is not None:
+            value = value_element.text or ''
+    return value
+
+
+def _decode_param_value(element):
+    """Returns the value of a Param element, decoded as described in
+    :py:func:`get_typed_params`."""
+    value = _get_param_value(element)
+    if value is None:
+        return None
+    datatype = _get_attrib(element, 'dataType')
+    try:
+        if datatype == 'int':
+            return int(value)
+        elif datatype == 'float':
+            return float(value)
+        elif _get_attrib(element, 'unit'):
+            # A physical quantity, whatever the (default) dataType says.
+            try:
+                return int(value)
+            except ValueError:
+                return float(value)
+    except ValueError:
+        pass
+    return value
+
+
+def get_typed_params(voevent, cache=False):
+    """
+    Fetch the values of all Params in the `What` section, decoded into
+    native Python types.
+
+    Values are decoded according to the Param's ``dataType``: ``int`` to
+    :py:class:`int`, ``float`` to :py:class:`float`. Many packets leave
+    numeric values with the default ``string`` dataType, so Params which
+    have a ``unit`` are also decoded, as an int if the value looks like one,
+    otherwise as a float. Any other values (and any which fail to decode)
+    are returned as strings. A Param's value may be given by a ``Value``
+    child element rather than the ``value`` attribute; if it has neither,
+    the value is ``None``.
+
+    With ``cache=True`` the result is cached on the packet, so repeated
+    calls (e.g. by several filters handling the same packet) cost next to
+    nothing. The cached result is shared between callers, so treat it as
+    read-only. It is discarded by structural changes made via the objectify
+    API, but *not* by changes to attribute values or data elements in place
+    (e.g. ``param.set('value', ...)``); call :py:func:`.mark_modified` after
+    those. Only packets loaded with ``keep_source`` or by a
+    :py:class:`.VOEventParser` with ``track_changes`` can hold a cache;
+    others are simply decoded afresh on each call.
+
+    Args:
+        voevent (:class:`voeventparse.voevent.Voevent`): Root node of the
+            VOevent etree.
+        cache (bool): Cache the result on the packet, and reuse any cached
+            result (Default=False).
+    Returns (:class:`.OrderedMultiDict`):
+        Mapping of ``(GroupName, ParamName)->value``, in document order,
+        with a GroupName of ``None`` for toplevel Params. Typical access
+        like so::
+
+            typed = get_typed_params(v)
+            ra = typed[(None, 'RA')]
+            flux = typed[('Photometry', 'flux')]
+
+    """
+    cache = _packet_cache(voevent) if cache else None
+    if cache is not None:
+        typed = cache.get('typed_params')
+        if typed is not None:
+            return typed
+    typed = OrderedMultiDict()
+    what = voevent.find('What')
+    if what is not None:
+        for element in what.iterchildren('Param', 'Group'):
+            if element.tag == 'Param':
+                typed.add((None, _get_attrib(element, 'name')),
+                          _decode_param_value(element))
+            else:
+                group_name = _get_attrib(element, 'name')
+                for p in element.iterchildren(tag='Param'):
+                    typed.add((group_name, _get_attrib(p, 'name')),
+                              _decode_param_value(p))
+    if cache is not None:
+        cache['typed_params'] = typed
+    return typed
+
+
+_bool_strings = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def _parse_bool(value):
+    try:
+        return _bool_strings[value.strip().lower()]
+    except KeyError:
+        raise ValueError('Not a boolean value: {!r}'.format(value))
+
+
+def params_to_columns(packets, spec, errors='raise'):
+    """
+    Extract chosen Param values from many packets into NumPy arrays.
+
+    Walks each packet's `What` section once, picking out just the requested
+    Params, and stores their values straight into arrays of the requested
+    dtypes - one array per Param, one entry per packet. Entries are masked
+    where a packet lacks the Param (or it has no value). E.g.::
+
+        columns = params_to_columns(packets, [
+            ((None, 'TrigID'), int),
+            ((None, 'Integ_Time'), float),
+            (('Solution_Status', 'GRB_Identified'), bool),
+        ])
+        long_bursts = columns[(None, 'Integ_Time')] > 1.
+
+    Values are converted by NumPy, so e.g. a float dtype accepts any
+    numeric string, while an int dtype rejects ``'1.5'``. For a bool dtype
+    the value must be one of ``true``, ``false``, ``1`` or ``0`` (in any
+    case). Where a packet has several Params of the same name, the first is
+    used.
+
+    Args:
+        packets (iterable): Root nodes of the VOEvent etrees. If this has
+            a length (e.g. a list), the arrays are allocated up front;
+            otherwise they are grown as needed, so a generator such as
+            :py:func:`.iter_load` works too.
+        spec: Mapping (or sequence of pairs) of ``(GroupName, ParamName)``
+            to a dtype (anything accepted by :py:class:`numpy.dtype`), with
+            a GroupName of ``None`` for toplevel Params. String dtypes
+            without a size (e.g. ``str``) are sized to fit the longest value.
+        errors (str): What to do if a value cannot be converted to the
+            requested dtype: ``'raise'`` (the default) raises
+            :py:obj:`ValueError`, ``'ignore'`` masks the entry.
+    Returns (:py:class:`collections.OrderedDict`):
+        Mapping of each key of ``spec`` to a
+        :py:class:`numpy.ma.MaskedArray` with an entry per packet.
+    """
+    import numpy
+    if errors not in ('raise', 'ignore'):
+        raise ValueError("'errors' must be one of 'raise', 'ignore'")
+    spec = OrderedDict(spec)
+    keys = list(spec)
+    dtypes = [numpy.dtype(spec[key]) for key in keys]
+    # Flexible dtypes (e.g. 'U') have no size until we've seen the values.
+    storage = [numpy.dtype(object) if dtype.itemsize == 0 else dtype
+               for dtype in dtypes]
+    converters = [_parse_bool if dtype.kind == 'b' else None
+                  for dtype in dtypes]
+    wanted = {}  # GroupName -> ParamName -> column number
+    for column, (group_name, param_name) in enumerate(keys):
+        wanted.setdefault(group_name, {})[param_name] = column
+
+    try:
+        capacity = len(packets)
+    except TypeError:
+        capacity = 1024
+    values = [numpy.zeros(capacity, dtype) for dtype in storage]
+    filled = [numpy.zeros(capacity, bool) for _ in keys]
+
+    def store(params, columns, row):
+        for p in params:
+            column = columns.get(_get_attrib(p, 'name'))
+            if column is None or filled[column][row]:
+                continue
+            value = _get_param_value(p)
+            if value is None:
+                continue
+            try:
+                if converters[column] is not None:
+                    value = converters[column](value)
+                values[column][row] = value
+            except (ValueError, OverflowError) as e:
+                if errors == 'raise':
+                    raise ValueError('Packet {}, Param {}: {}'.format(
+                        row, keys[column], e))
+                continue
+            filled[column][row] = True
+
+    toplevel = wanted.get(None)
+    count = 0
+    for row, voevent in enumerate(packets):
+        if row == capacity:
+            capacity *= 2
+            values = [_resized(a, capacity) for a in values]
+            filled = [_resized(a, capacity) for a in filled]
+        count = row + 1
+        what = voevent.find('What')
+        if what is None:
+            continue
+        if toplevel is not None:
+            store(what.iterchildren(tag='Param'), toplevel, row)
+        for group in what.iterchildren(tag='Group'):
+            columns = wanted.get(_get_attrib(group, 'name'))
+            if columns is not None:
+                store(group.iterchildren(tag='Param'), columns, row)
+
+    columns = OrderedDict()
+    for key, dtype, data, mask in zip(keys, dtypes, values, filled):
+        data, mask = data[:count], ~mask[:count]
+        if data.dtype != dtype:
+            data[mask] = ''
+            data = data.astype(dtype)
+        columns[key] = numpy.ma.MaskedArray(data, mask)
+    return columns
+
+
+def _resized(array, size):
+    """Returns a copy of ``array`` extended (with zeros) to ``size``."""
+    import numpy
+    new = numpy.zeros(size, array.dtype)
+    new[:len(array)] = array
+    return new
 
 
 def pull_astro_coords(voevent, index=0):
@@ -0,0 +1,898 @@
+"""
+In-memory indexes over loaded VOEvent packets, for cross-matching.
+
+:py:class:`SkyIndex` answers cone searches by sky position, taking the
+error radius of each event into account. E.g. to cross-match each new alert
+against those received recently::
+
+    from voeventparse.index import SkyIndex
+
+    index = SkyIndex()
+    index.add_packets(recent_packets)
+    ...
+    position = vp.get_event_position(new_packet)
+    matches = index.query(position.ra, position.dec, err=position.err)
+
+:py:class:`TimeIndex` answers time-range queries, optionally restricted to
+one stream, on either the event time or ``Who.Date``::
+
+    from voeventparse.index import TimeIndex
+
+    index = TimeIndex()
+    index.add_packets(packets)
+    ivorns = index.query(t0, t1, stream='nasa.gsfc.gcn/SWIFT')
+
+:py:class:`CoincidenceMatcher` combines the two, to find events from
+different streams which coincide in both time and position, as packets
+arrive::
+
+    from voeventparse.index import CoincidenceMatcher
+
+    matcher = CoincidenceMatcher(dt=600)
+    for v in incoming_packets:
+        for coincidence in matcher.add(v):
+            ...
+
+This module requires NumPy, so (to keep ``import voeventparse`` cheap) it is
+not imported by the top-level package. The indexes are not thread-safe;
+guard them with a lock if they are shared between threads.
+"""
+from __future__ import absolute_import
+from __future__ import division
+
+import datetime
+import math
+
+import numpy
+import pytz
+from six import string_types
+
+from voeventparse.convenience import (_utc_offset_regex, get_event_positions,
+                                      get_event_times_as_utc)
+from voeventparse.misc import Coincidence, Position2D
+
+#: Factors converting the supported Position2D units to degrees.
+_unit_scales = {'deg': 1., 'rad': 180. / math.pi}
+
+
+def _to_degrees(units):
+    try:
+        return _unit_scales[units]
+    except KeyError:
+        raise ValueError('Unsupported position units: {}'.format(units))
+
+
+def _positions_in_degrees(positions):
+    """Returns the ra, dec and err arrays of a :py:class:`.PositionArrays`,
+    converted to degrees (NaN where absent)."""
+    scales = numpy.array([_to_degrees(units)
+                          for units in positions.unit_names] + [numpy.nan])
+    scale = scales[positions.units]  # Code -1 picks the NaN.
+    return (positions.ra * scale, positions.dec * scale,
+            positions.err * scale)
+
+
+def _unit_vectors(ra, dec):
+    """Returns an (n, 3) array of unit vectors, given ra / dec in degrees."""
+    ra = numpy.radians(ra)
+    dec = numpy.radians(dec)
+    cos_dec = numpy.cos(dec)
+    return numpy.column_stack((cos_dec * numpy.cos(ra),
+                               cos_dec * numpy.sin(ra),
+                               numpy.sin(dec)))
+
+
+def _chord_squared(angle):
+    """Squared chord length between unit vectors ``angle`` degrees apart.
+
+    Comparing squared chord lengths, rather than angles via ``arccos``,
+    keeps full precision for small separations.
+    """
+    half_angle = numpy.radians(numpy.minimum(angle, 180.)) / 2
+    return (2 * numpy.sin(half_angle)) ** 2
+
+
+class SkyIndex(object):
+    """
+    An index of event positions, supporting cone searches.
+
+    The sky is divided into cells of (roughly) ``cell_size`` degrees,
+    equal-area in the manner of a Lambert cylindrical projection: bands of
+    equal height in sin(dec), each split into equal ranges of RA. The index
+    holds the events sorted by cell, so a cone search only needs to test the
+    events in the few cells the cone overlaps, which it does with vectorized
+    NumPy operations.
+
+    An event matches a cone search if its separation from the cone centre is
+    no more than the cone radius plus the error radii of both the query and
+    the event. So that events with large error radii (e.g. Fermi GBM
+    localisations) don't widen every search, each event goes in the finest
+    of a hierarchy of grids (of cell sizes ``cell_size``, ``4 * cell_size``,
+    ...) whose cells are at least as large as its error radius; a search
+    covers each grid in turn.
+
+    Events are added and removed incrementally, keyed by IVORN. Newly added
+    events are held in a small unsorted buffer (tested by every search),
+    which is merged into the sorted index once it grows past about
+    ``4 * sqrt(n)`` events; removed events are dropped from the arrays once
+    they make up half of them. So insertion and removal costs are
+    amortized, and stay small relative to the size of the index.
+
+    Positions are taken to be in a common (e.g. ICRS / FK5) frame; the
+    co-ordinate system of a :py:class:`.Position2D` is not checked.
+
+    Args:
+        cell_size (float): Approximate size in degrees of the finest cells.
+            Best set to around the typical search radius (Default=0.5).
+    """
+
+    def __init__(self, cell_size=0.5):
+        self.cell_size = cell_size
+        # The grids, finest first, as (cell size, number of bands, cells per
+        # band, ID of the first cell); cell IDs are unique across grids.
+        self._grids = []
+        size, first_cell = float(cell_size), 0
+        while True:
+            n_bands = max(1, int(math.ceil(2. / math.radians(size))))
+            n_ra = max(1, int(math.ceil(360. / size)))
+            self._grids.append((size, n_bands, n_ra, first_cell))
+            first_cell += n_bands * n_ra
+            if size >= 90.:
+                break
+            size *= 4
+        self._grid_sizes = numpy.array([g[0] for g in self._grids])
+        self._grid_table = numpy.array([g[1:] for g in self._grids],
+                                       numpy.int64)
+        # Largest error radius of the indexed events in each grid:
+        self._max_errs = numpy.full(len(self._grids), -1.)
+        self._slots = {}  # IVORN -> slot (row of the arrays).
+        self._size = 0  # Slots used, including those of removed events.
+        self._n_removed = 0
+        self._allocate(1024)
+        # Slots [0, _n_indexed) are indexed in _order, sorted by cell.
+        self._n_indexed = 0
+        self._order = numpy.empty(0, numpy.intp)
+        self._order_cells = numpy.empty(0, numpy.int64)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, ivorn):
+        return ivorn in self._slots
+
+    def add(self, ivorn, position):
+        """Add (or replace) an event.
+
+        Args:
+            ivorn (str): Identifies the event, e.g. for :py:meth:`remove`.
+            position (:py:class:`.Position2D`): Its position, with units of
+                ``deg`` or ``rad``.
+        """
+        scale = _to_degrees(position.units)
+        self.add_many([ivorn], [position.ra * scale], [position.dec * scale],
+                      [position.err * scale])
+
+    def add_many(self, ivorns, ra, dec, err=0.):
+        """Add (or replace) many events at once.
+
+        Events with a NaN position are skipped; a NaN error radius is taken
+        as zero.
+
+        Args:
+            ivorns (sequence): IVORNs of the events.
+            ra (array-like): Right ascensions, in degrees.
+            dec (array-like): Declinations, in degrees.
+            err (array-like): Error radii, in degrees.
+        """
+        ivorns = numpy.asarray(ivorns, dtype=object).reshape(-1)
+        ra, dec, err = numpy.broadcast_arrays(
+            numpy.asarray(ra, dtype=float), numpy.asarray(dec, dtype=float),
+            numpy.asarray(err, dtype=float))
+        ra, dec, err = (numpy.atleast_1d(a).reshape(-1) for a in
+                        (ra, dec, err))
+        if not len(ra) == len(dec) == len(ivorns):
+            raise ValueError('ivorns, ra and dec must be the same length')
+        valid = numpy.isfinite(ra) & numpy.isfinite(dec)
+        if not valid.all():
+            ivorns, ra, dec, err = (a[valid] for a in (ivorns, ra, dec, err))
+        err = numpy.where(numpy.isfinite(err), err, 0.)
+        n_new = len(ivorns)
+        if not n_new:
+            return
+        start, end = self._size, self._size + n_new
+        if end > len(self._ra):
+            self._grow(end)
+        self._ra[start:end] = ra
+        self._dec[start:end] = dec
+        self._err[start:end] = err
+        self._xyz[start:end] = _unit_vectors(ra, dec)
+        self._cells[start:end] = self._cell_ids(ra, dec, err)
+        self._alive[start:end] = True
+        self._ivorns[start:end] = ivorns
+        self._size = end
+        slots = self._slots
+        for slot, ivorn in enumerate(ivorns.tolist(), start):
+            previous = slots.get(ivorn)
+            if previous is not None:
+                self._alive[previous] = False
+                self._n_removed += 1
+            slots[ivorn] = slot
+        if self._size - self._n_indexed > self._buffer_limit():
+            self._merge_buffer()
+
+    def add_packets(self, packets):
+        """Add (or replace) the events of many packets, by IVORN, using
+        :py:func:`.get_event_positions`. Packets without a position are
+        skipped."""
+        packets = list(packets)
+        self.add_many([v.attrib['ivorn'] for v in packets],
+                      *_positions_in_degrees(get_event_positions(packets)))
+
+    def remove(self, ivorn):
+        """Remove an event.
+
+        Raises:
+            KeyError: If there is no such event.
+        """
+        slot = self._slots.pop(ivorn)
+        self._alive[slot] = False
+        self._n_removed += 1
+        if self._n_removed > max(1024, self._size // 2):
+            self._compact()
+
+    def position(self, ivorn):
+        """Returns the :py:class:`.Position2D` of an event (in degrees).
+
+        Raises:
+            KeyError: If there is no such event.
+        """
+        slot = self._slots[ivorn]
+        return Position2D(ra=float(self._ra[slot]),
+                          dec=float(self._dec[slot]),
+                          err=float(self._err[slot]), units='deg',
+                          system=None)
+
+    def query(self, ra, dec, radius=0., err=0., separations=False):
+        """Cone search.
+
+        Args:
+            ra (float): Right ascension of the cone centre, in degrees.
+            dec (float): Declination of the cone centre, in degrees.
+            radius (float): Cone radius, in degrees.
+            err (float): Error radius of the cone centre, in degrees (e.g.
+                that of the alert being cross-matched), added to the radius.
+            separations (bool): Also return the separations (Default=False).
+
+        Returns:
+            list: IVORNs of the events within ``radius + err`` plus their
+            own error radius of the centre, nearest first. With
+            ``separations=True``, a list of ``(ivorn, separation)`` tuples,
+            the separations in degrees.
+        """
+        candidates = self._candidates(ra, dec, radius + err)
+        centre = _unit_vectors([ra], [dec])[0]
+        chord_squared = ((self._xyz[candidates] - centre) ** 2).sum(axis=1)
+        limit = _chord_squared(radius + err + self._err[candidates])
+        hits = chord_squared <= limit
+        candidates, chord_squared = candidates[hits], chord_squared[hits]
+        nearest_first = numpy.argsort(chord_squared, kind='mergesort')
+        ivorns = self._ivorns[candidates[nearest_first]].tolist()
+        if not separations:
+            return ivorns
+        angles = numpy.degrees(
+            2 * numpy.arcsin(numpy.sqrt(chord_squared[nearest_first]) / 2))
+        return list(zip(ivorns, angles.tolist()))
+
+    def query_many(self, ra, dec, radius=0., err=0., separations=False):
+        """Cone searches about many centres.
+
+        Takes arrays (or scalars, broadcast against them) of the arguments
+        to :py:meth:`query`, and returns a list of its results.
+        """
+        ra, dec, radius, err = numpy.broadcast_arrays(
+            numpy.asarray(ra, dtype=float), numpy.asarray(dec, dtype=float),
+            numpy.asarray(radius, dtype=float),
+            numpy.asarray(err, dtype=float))
+        return [self.query(*args, separations=separations) for args in
+                zip(ra.ravel().tolist(), dec.ravel().tolist(),
+                    radius.ravel().tolist(), err.ravel().tolist())]
+
+    def _allocate(self, capacity):
+        self._ra = numpy.zeros(capacity)
+        self._dec = numpy.zeros(capacity)
+        self._err = numpy.zeros(capacity)
+        self._xyz = numpy.zeros((capacity, 3))
+        self._cells = numpy.zeros(capacity, numpy.int64)
+        self._alive = numpy.zeros(capacity, bool)
+        self._ivorns = numpy.empty(capacity, object)
+
+    def _grow(self, size):
+        capacity = len(self._ra)
+        while capacity < size:
+            capacity *= 2
+        old = (self._ra, self._dec, self._err, self._xyz, self._cells,
+               self._alive, self._ivorns)
+        self._allocate(capacity)
+        new = (self._ra, self._dec, self._err, self._xyz, self._cells,
+               self._alive, self._ivorns)
+        for old_array, new_array in zip(old, new):
+            new_array[:self._size] = old_array[:self._size]
+
+    def _buffer_limit(self):
+        return max(256, 4 * int(math.sqrt(self._size)))
+
+    def _grid_indices(self, err):
+        """Index of the finest grid with cells at least ``err`` in size."""
+        return numpy.minimum(
+            numpy.searchsorted(self._grid_sizes, err, side='left'),
+            len(self._grids) - 1)
+
+    def _cell_ids(self, ra, dec, err):
+        n_bands, n_ra, first_cell = self._grid_table[
+            self._grid_indices(err)].T
+        z = numpy.sin(numpy.radians(dec))
+        bands = numpy.clip(((z + 1) / 2 * n_bands).astype(numpy.int64),
+                           0, n_bands - 1)
+        ra_cells = numpy.clip(
+            (numpy.mod(ra, 360.) / 360. * n_ra).astype(numpy.int64),
+            0, n_ra - 1)
+        return first_cell + bands * n_ra + ra_cells
+
+    def _merge_buffer(self):
+        """Merges the unindexed slots into the sorted order."""
+        start, end = self._n_indexed, self._size
+        slots = numpy.arange(start, end)
+        cells = self._cells[start:end]
+        numpy.maximum.at(self._max_errs,
+                         self._grid_indices(self._err[start:end]),
+                         self._err[start:end])
+        by_cell = numpy.argsort(cells, kind='mergesort')
+        slots, cells = slots[by_cell], cells[by_cell]
+        positions = numpy.searchsorted(self._order_cells, cells, side='right')
+        self._order = numpy.insert(self._order, positions, slots)
+        self._order_cells = numpy.insert(self._order_cells, positions, cells)
+        self._n_indexed = end
+
+    def _compact(self):
+        """Drops the slots of removed events, and rebuilds the index."""
+        keep = numpy.flatnonzero(self._alive[:self._size])
+        arrays = [a[keep] for a in (self._ra, self._dec, self._err,
+                                    self._xyz, self._cells, self._ivorns)]
+        self._allocate(max(1024, 2 * len(keep)))
+        for new_array, kept in zip(
+                (self._ra, self._dec, self._err, self._xyz, self._cells,
+                 self._ivorns), arrays):
+            new_array[:len(keep)] = kept
+        self._alive[:len(keep)] = True
+        self._size = len(keep)
+        self._n_removed = 0
+        self._slots = dict(zip(self._ivorns[:self._size].tolist(),
+                               range(self._size)))
+        self._n_indexed = 0
+        self._order = numpy.empty(0, numpy.intp)
+        self._order_cells = numpy.empty(0, numpy.int64)
+        self._max_errs[:] = -1.
+        self._merge_buffer()
+
+    def _candidates(self, ra, dec, reach):
+        """Slots of the live events which might be within ``reach`` (plus
+        their own error radius) of the given centre."""
+        lo_cells, hi_cells = [], []
+        for grid, max_err in zip(self._grids, self._max_errs.tolist()):
+            if max_err >= 0:  # I.e. the grid is not empty.
+                self._add_cell_ranges(grid, ra, dec, reach + max_err,
+                                      lo_cells, hi_cells)
+        lo = numpy.searchsorted(self._order_cells, lo_cells, side='left')
+        hi = numpy.searchsorted(self._order_cells, hi_cells, side='right')
+        parts = [self._order[a:b] for a, b in zip(lo.tolist(), hi.tolist())]
+        parts.append(numpy.arange(self._n_indexed, self._size))
+        candidates = numpy.concatenate(parts)
+        return candidates[self._alive[candidates]]
+
+    @staticmethod
+    def _add_cell_ranges(grid, ra, dec, reach, lo_cells, hi_cells):
+        """Appends the (inclusive) ranges of cell IDs in ``grid`` which a
+        cone of radius ``reach`` overlaps to ``lo_cells`` / ``hi_cells``."""
+        _, n_bands, n_ra, first_cell = grid
+        if reach >= 90.:
+            lo_cells.append(first_cell)
+            hi_cells.append(first_cell + n_bands * n_ra - 1)
+            return
+        # The bands which the cone overlaps (in z = sin(dec)):
+        z_lo, z_hi = (math.sin(math.radians(d)) for d in
+                      (max(-90., dec - reach), min(90., dec + reach)))
+        band_height = 2. / n_bands
+        band_lo, band_hi = (min(n_bands - 1, int((z + 1) / band_height))
+                            for z in (z_lo, z_hi))
+        sin_reach = math.sin(math.radians(reach))
+        cell_width = 360. / n_ra
+        for band in range(band_lo, band_hi + 1):
+            # The RA half-width of the cone over the band is greatest at the
+            # band's most polar declination (within the cone).
+            band_z_lo = band * band_height - 1
+            band_z_hi = band_z_lo + band_height
+            polar_z = max(abs(min(max(band_z_lo, z_lo), z_hi)),
+                          abs(min(max(band_z_hi, z_lo), z_hi)))
+            cos_polar = math.sqrt(max(0., 1. - polar_z * polar_z))
+            first = first_cell + band * n_ra
+            is_full = cos_polar <= sin_reach
+            if not is_full:
+                width = math.degrees(math.asin(sin_reach / cos_polar))
+                c0 = int(math.floor((ra - width) / cell_width))
+                c1 = int(math.floor((ra + width) / cell_width))
+                is_full = c1 - c0 + 1 >= n_ra
+            if is_full:
+                lo_cells.append(first)
+                hi_cells.append(first + n_ra - 1)
+                continue
+            c0, c1 = c0 % n_ra, c1 % n_ra
+            if c0 <= c1:
+                lo_cells.append(first + c0)
+                hi_cells.append(first + c1)
+            else:  # Wraps around RA=0.
+                lo_cells.extend((first + c0, first))
+                hi_cells.extend((first + n_ra - 1, first + c1))
+
+
+#: The times by which a :py:class:`TimeIndex` can be queried.
+_time_keys = ('event', 'date')
+
+
+def _to_datetime64(value):
+    """Converts a datetime (naive ones are taken to be UTC), ISO-8601 string
+    or datetime64 to a UTC ``datetime64[us]``; None or NaT to None."""
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        value = value.astimezone(pytz.UTC).replace(tzinfo=None)
+    elif (isinstance(value, string_types) and
+          _utc_offset_regex.search(value)):
+        import iso8601
+        value = iso8601.parse_date(value).astimezone(pytz.UTC).replace(
+            tzinfo=None)
+    value = numpy.datetime64(value, 'us')
+    return None if _isnat(value) else value
+
+
+def _isnat(values):
+    """Like ``numpy.isnat`` (which needs NumPy 1.13), for datetime64
+    values."""
+    return (numpy.asarray(values).view(numpy.int64) ==
+            numpy.iinfo(numpy.int64).min)
+
+
+def _stream(ivorn):
+    """The stream part of an IVORN, as passed to :py:func:`.Voevent`."""
+    stream = ivorn.split('#', 1)[0]
+    if stream.startswith('ivo://'):
+        stream = stream[len('ivo://'):]
+    return stream
+
+
+class _SortedTimes(object):
+    """A column of timestamps kept in sorted order, with the ID of the entry
+    each belongs to.
+
+    Live rows are ``[_start, _end)`` of the arrays, which have spare
+    capacity at the end, so in-order appends are amortized O(1); eviction
+    from the head just advances ``_start``. Removal from elsewhere is left
+    to the owner, which tracks how many rows are still live (``n_live``) and
+    calls :py:meth:`keep` once too many are not.
+    """
+
+    def __init__(self):
+        self._times = numpy.empty(1024, 'datetime64[us]')
+        self._ids = numpy.empty(1024, numpy.int64)
+        self._start = self._end = 0
+        self.n_live = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def insert(self, times, ids):
+        """Inserts the given ``datetime64[us]`` times and IDs."""
+        if not len(times):
+            return
+        if len(times) > 1:
+            by_time = numpy.argsort(times, kind='mergesort')
+            times, ids = times[by_time], ids[by_time]
+        self._reserve(len(times))
+        start, end = self._start, self._end
+        # Only the rows after the earliest new time need to move; for
+        # events arriving roughly in time order, that's a short suffix.
+        first = start + numpy.searchsorted(self._times[start:end], times[0],
+                                           side='right')
+        if first == end:
+            self._times[end:end + len(times)] = times
+            self._ids[end:end + len(times)] = ids
+        else:
+            positions = numpy.searchsorted(self._times[first:end], times,
+                                           side='right')
+            merged_end = end + len(times)
+            self._times[first:merged_end] = numpy.insert(
+                self._times[first:end], positions, times)
+            self._ids[first:merged_end] = numpy.insert(
+                self._ids[first:end], positions, ids)
+        self._end += len(times)
+        self.n_live += len(times)
+
+    def range(self, start, end):
+        """IDs of the rows with times in ``[start, end]``, in time order."""
+        times = self._times[self._start:self._end]
+        lo = numpy.searchsorted(times, start, side='left')
+        hi = numpy.searchsorted(times, end, side='right')
+        return self._ids[self._start + lo:self._start + hi]
+
+    def evict(self, horizon):
+        """Drops the rows with times before ``horizon``, returning their
+        IDs."""
+        n = numpy.searchsorted(self._times[self._start:self._end], horizon,
+                               side='left')
+        ids = self._ids[self._start:self._start + n].copy()
+        self._start += n
+        return ids
+
+    def keep(self, is_live):
+        """Drops the rows for which ``is_live(id)`` is false."""
+        ids = self._ids[self._start:self._end]
+        keep = numpy.fromiter((is_live(i) for i in ids.tolist()), bool,
+                              len(ids))
+        self._replace(self._times[self._start:self._end][keep], ids[keep])
+        self.n_live = len(self)
+
+    def _reserve(self, n):
+        if self._end + n <= len(self._times):
+            return
+        if self._start:  # Reclaim the space of evicted rows first.
+            self._replace(self._times[self._start:self._end],
+                          self._ids[self._start:self._end], extra=n)
+        else:
+            self._replace(self._times[:self._end], self._ids[:self._end],
+                          extra=n)
+
+    def _replace(self, times, ids, extra=0):
+        capacity = len(self._times)
+        while capacity < len(times) + extra:
+            capacity *= 2
+        if capacity != len(self._times) or self._start:
+            new_times = numpy.empty(capacity, 'datetime64[us]')
+            new_ids = numpy.empty(capacity, numpy.int64)
+        else:
+            new_times, new_ids = self._times, self._ids
+        new_times[:len(times)] = times
+        new_ids[:len(ids)] = ids
+        self._times, self._ids = new_times, new_ids
+        self._start, self._end = 0, len(times)
+
+
+class TimeIndex(object):
+    """
+    An index of event times, supporting time-range queries.
+
+    Each event is indexed by both its event time (the ``ISOTime`` of the
+    first ``ObsDataLocation``, see :py:func:`.get_event_time_as_utc`) and
+    the ``Who.Date`` of its packet, both in UTC, and both overall and
+    within its stream (the IVORN up to the ``#``, without the ``ivo://``).
+    So a query such as "all events from stream X between t0 and t1" is a
+    binary search of a sorted ``datetime64`` array, O(log n).
+
+    Events are added and removed incrementally, keyed by IVORN. Events
+    usually arrive roughly in time order, and appending in time order is
+    amortized O(1); out-of-order events are merged in, at a cost
+    proportional to the number of later events. For streaming use,
+    :py:meth:`evict` drops the events older than a horizon, at a cost
+    proportional to the number dropped.
+    """
+
+    def __init__(self):
+        self._ivorns = {}  # IVORN -> ID.
+        # ID -> (IVORN, stream, has event time, has date).
+        self._entries = {}
+        self._next_id = 0
+        # (time key, stream) -> _SortedTimes; stream is None for all streams.
+        self._columns = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, ivorn):
+        return ivorn in self._ivorns
+
+    def add(self, ivorn, event_time=None, date=None):
+        """Add (or replace) an event.
+
+        Args:
+            ivorn (str): Identifies the event, e.g. for :py:meth:`remove`.
+            event_time: Its event time, or None if it has none. A
+                :class:`datetime.datetime` (naive ones are taken to be UTC),
+                :class:`numpy.datetime64` or ISO-8601 string.
+            date: Likewise, its ``Who.Date``.
+        """
+        self.add_many([ivorn],
+                      numpy.array([_to_datetime64(event_time)],
+                                  'datetime64[us]'),
+                      numpy.array([_to_datetime64(date)], 'datetime64[us]'))
+
+    def add_many(self, ivorns, event_times=None, dates=None):
+        """Add (or replace) many events at once.
+
+        Args:
+            ivorns (sequence): IVORNs of the events.
+            event_times (array-like): Event times, as UTC ``datetime64``
+                values (or naive UTC datetimes), NaT for none. May be None
+                if none of the events have one.
+            dates (array-like): Likewise, ``Who.Date`` values.
+        """
+        ivorns = list(ivorns)
+        n = len(ivorns)
+        times = {}
+        for key, values in zip(_time_keys, (event_times, dates)):
+            if values is None:
+                times[key] = numpy.full(n, 'NaT', 'datetime64[us]')
+            else:
+                times[key] = numpy.asarray(values, 'datetime64[us]')
+                if times[key].shape != (n,):
+                    raise ValueError('Expected {} {} times'.format(n, key))
+        rows_by_ivorn = dict((ivorn, row) for row, ivorn in enumerate(ivorns))
+        if len(rows_by_ivorn) < n:  # The last of any duplicates wins.
+            rows = numpy.array(sorted(rows_by_ivorn.values()), numpy.intp)
+            ivorns = [ivorns[row] for row in rows.tolist()]
+            times = dict((key, values[rows]) for key, values in times.items())
+            n = len(ivorns)
+        for ivorn in ivorns:
+            if ivorn in self._ivorns:
+                self._discard(self._ivorns[ivorn])
+        ids = numpy.arange(self._next_id, self._next_id + n)
+        self._next_id += n
+        streams = [_stream(ivorn) for ivorn in ivorns]
+        has_times = dict((key, ~_isnat(times[key])) for key in _time_keys)
+        self._ivorns.update(zip(ivorns, ids.tolist()))
+        flags = [has_times[key].tolist() for key in _time_keys]
+        self._entries.update(zip(ids.tolist(), zip(ivorns, streams, *flags)))
+        rows_by_stream = {}
+        for row, stream in enumerate(streams):
+            rows_by_stream.setdefault(stream, []).append(row)
+        for key in _time_keys:
+            has_time = has_times[key]
+            self._column(key, None).insert(times[key][has_time],
+                                           ids[has_time])
+            for stream, rows in rows_by_stream.items():
+                rows = numpy.array(rows, numpy.intp)
+                rows = rows[has_time[rows]]
+                self._column(key, stream).insert(times[key][rows], ids[rows])
+
+    def add_packets(self, packets):
+        """Add (or replace) the events of many packets, by IVORN, using
+        :py:func:`.get_event_times_as_utc` for the event times."""
+        packets = list(packets)
+        self.add_many(
+            [v.attrib['ivorn'] for v in packets],
+            get_event_times_as_utc(packets),
+            numpy.array([_to_datetime64(v.findtext('Who/Date'))
+                         for v in packets], 'datetime64[us]'))
+
+    def remove(self, ivorn):
+        """Remove an event.
+
+        Raises:
+            KeyError: If there is no such event.
+        """
+        self._discard(self._ivorns[ivorn])
+
+    def query(self, start, end, stream=None, key='event'):
+        """Time-range query.
+
+        Args:
+            start: Start of the range (inclusive); a
+                :class:`datetime.datetime` (naive ones are taken to be UTC),
+                :class:`numpy.datetime64` or ISO-8601 string.
+            end: End of the range (inclusive), likewise.
+            stream (str): Only return events from this stream, e.g.
+                ``'nasa.gsfc.gcn/SWIFT'`` (Default=None, for all streams).
+            key (str): ``'event'`` to query by event time, ``'date'`` by
+                ``Who.Date``.
+
+        Returns:
+            list: IVORNs of the events in the range, in time order.
+        """
+        if key not in _time_keys:
+            raise ValueError('Unknown time key: {}'.format(key))
+        column = self._columns.get((key, stream))
+        if column is None:
+            return []
+        entries = self._entries
+        ids = column.range(_to_datetime64(start), _to_datetime64(end))
+        return [entries[id_][0] for id_ in ids.tolist() if id_ in entries]
+
+    def evict(self, horizon, key='event'):
+        """Removes the events with a time (event time, or ``Who.Date`` with
+        ``key='date'``) before ``horizon``.
+
+        Events without that time are not evicted.
+
+        Returns:
+            list: IVORNs of the evicted events.
+        """
+        if key not in _time_keys:
+            raise ValueError('Unknown time key: {}'.format(key))
+        horizon = _to_datetime64(horizon)
+        evicted = []
+        for (column_key, stream), column in list(self._columns.items()):
+            if column_key != key:
+                continue
+            ids = column.evict(horizon)
+            if stream is None:
+                evicted = ids.tolist()
+        entries = self._entries
+        ivorns = []
+        for id_ in evicted:
+            entry = entries.get(id_)
+            if entry is not None:
+                ivorns.append(entry[0])
+                self._discard(id_)
+        return ivorns
+
+    def _column(self, key, stream):
+        column = self._columns.get((key, stream))
+        if column is None:
+            column = self._columns[(key, stream)] = _SortedTimes()
+        return column
+
+    def _discard(self, id_):
+        entry = self._entries.pop(id_)
+        ivorn, stream = entry[:2]
+        del self._ivorns[ivorn]
+        for key, has_time in zip(_time_keys, entry[2:]):
+            if not has_time:
+                continue
+            for column in (self._columns[(key, None)],
+                           self._columns[(key, stream)]):
+                column.n_live -= 1
+                # Rows of removed events are skipped by queries, and dropped
+                # once they make up half of a column.
+                if len(column) - column.n_live > max(1024, len(column) // 2):
+                    column.keep(self._entries.__contains__)
+
+
+class CoincidenceMatcher(object):
+    """
+    Finds coincident events, e.g. a GRB and an optical transient, as packets
+    arrive.
+
+    Two events coincide if their event times (see
+    :py:func:`.get_event_time_as_utc`) are no more than ``dt`` apart, and
+    their positions (see :py:func:`.get_event_position`) are within
+    ``radius`` plus their combined error radii. By default, only events from
+    different streams are matched.
+
+    The matcher keeps a sliding window of the events whose event time is
+    within ``window`` of the latest event time seen. Each new event is
+    matched against the window, which is a cone search of a
+    :py:class:`SkyIndex` followed by a check of the times of just the
+    events it returns, so the work per event grows far slower than the
+    window size. Events leave the window via a :py:class:`TimeIndex`.
+
+    Args:
+        dt (float or datetime.timedelta): Maximum time difference, in
+            seconds if a float.
+        radius (float): Maximum separation in degrees, beyond the error
+            radii (Default=0).
+        window (float or datetime.timedelta): How far behind the latest
+            event time events are kept for matching (Default=``dt``).
+            Events arriving with event times more than ``window - dt``
+            behind the latest may miss matches.
+        same_stream (bool): Also match events from the same stream
+            (Default=False).
+        cell_size (float): Passed to :py:class:`SkyIndex`.
+    """
+
+    def __init__(self, dt, radius=0., window=None, same_stream=False,
+                 cell_size=0.5):
+        self.dt = _to_seconds(dt)
+        self.radius = radius
+        self.window = self.dt if window is None else _to_seconds(window)
+        self.same_stream = same_stream
+        self._sky = SkyIndex(cell_size=cell_size)
+        self._time_index = TimeIndex()
+        self._events = {}  # IVORN -> (stream, event time in microseconds).
+        self._latest = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def __contains__(self, ivorn):
+        return ivorn in self._events
+
+    def add(self, voevent):
+        """Adds a packet's event to the window (replacing any with the same
+        IVORN), returning those it coincides with.
+
+        Packets without an event time or position are not added.
+
+        Returns:
+            list: :py:class:`.Coincidence` tuples, nearest first.
+        """
+        return self.add_packets([voevent])
+
+    def add_packets(self, packets):
+        """Adds the events of many packets, in order, as for :py:meth:`add`.
+
+        The event times and positions are extracted in bulk, with
+        :py:func:`.get_event_times_as_utc` and
+        :py:func:`.get_event_positions`.
+
+        Returns:
+            list: :py:class:`.Coincidence` tuples for all the packets.
+        """
+        packets = list(packets)
+        times = get_event_times_as_utc(packets)
+        ra, dec, err = _positions_in_degrees(get_event_positions(packets))
+        coincidences = []
+        for v, event_time, args in zip(packets, times, zip(
+                ra.tolist(), dec.tolist(), err.tolist())):
+            coincidences.extend(
+                self._add(v.attrib['ivorn'], event_time, *args))
+        return coincidences
+
+    def add_event(self, ivorn, event_time, position):
+        """Adds an event by its values, as for :py:meth:`add`.
+
+        Args:
+            ivorn (str): Identifies the event (the stream is taken from it).
+            event_time: A :class:`datetime.datetime` (naive ones are taken
+                to be UTC), :class:`numpy.datetime64` or ISO-8601 string.
+            position (:py:class:`.Position2D`): With units of ``deg`` or
+                ``rad``.
+        """
+        scale = _to_degrees(position.units)
+        return self._add(ivorn, _to_datetime64(event_time),
+                         position.ra * scale, position.dec * scale,
+                         position.err * scale)
+
+    def remove(self, ivorn):
+        """Removes an event from the window, e.g. on retraction.
+
+        Raises:
+            KeyError: If there is no such event.
+        """
+        del self._events[ivorn]
+        self._sky.remove(ivorn)
+        self._time_index.remove(ivorn)
+
+    def _add(self, ivorn, event_time, ra, dec, err):
+        if ivorn in self._events:
+            self.remove(ivorn)
+        if (event_time is None or _isnat(event_time) or
+                not (numpy.isfinite(ra) and numpy.isfinite(dec))):
+            return []
+        if not numpy.isfinite(err):
+            err = 0.
+        stream = _stream(ivorn)
+        time_us = int(event_time.astype(numpy.int64))
+        max_dt_us = self.dt * 1e6
+        coincidences = []
+        for other, separation in self._sky.query(ra, dec, self.radius, err,
+                                                 separations=True):
+            other_stream, other_time_us = self._events[other]
+            dt_us = time_us - other_time_us
+            if (abs(dt_us) <= max_dt_us and
+                    (self.same_stream or other_stream != stream)):
+                coincidences.append(
+                    Coincidence(ivorn, other, dt_us / 1e6, separation))
+        self._events[ivorn] = (stream, time_us)
+        self._sky.add_many([ivorn], [ra], [dec], [err])
+        self._time_index.add(ivorn, event_time=event_time)
+        if self._latest is None or event_time > self._latest:
+            self._latest = event_time
+            horizon = self._latest - numpy.timedelta64(
+                int(round(self.window * 1e6)), 'us')
+            for old in self._time_index.evict(horizon):
+                del self._events[old]
+                self._sky.remove(old)
+        return coincidences
+
+
+def _to_seconds(value):
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    return float(value)
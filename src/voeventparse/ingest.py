@@ -0,0 +1,259 @@
+"""
+Routines for loading many VOEvent packets at once.
+
+Loading a large collection of packets one at a time is CPU-bound; these
+routines spread the work over several worker processes
+(:py:func:`load_many`) or threads (:py:class:`ThreadedIngestor`).
+"""
+from __future__ import absolute_import
+
+import functools
+import multiprocessing
+import multiprocessing.pool
+import threading
+
+from voeventparse.misc import PacketHeader
+from voeventparse.voevent import VOEventParser, load
+
+
+def load_many(paths, workers=None, extract=None, validate=False,
+              check_version=True, ordered=True, errors='raise',
+              chunksize=16):
+    """Load and process many VOEvent files, using a pool of processes.
+
+    Each file is loaded (and optionally validated) in a worker process, then
+    passed to ``extract``, which should pull out whatever information is
+    required and return it in picklable form, e.g. a tuple or dict of
+    strings. Only those results are sent back, since objectify trees cannot
+    be pickled (and would be costly to transfer anyway). E.g.::
+
+        def get_ivorn_and_time(v):
+            return v.attrib['ivorn'], vp.get_event_time_as_utc(v)
+
+        for path, (ivorn, time) in vp.load_many(paths, workers=4,
+                                                extract=get_ivorn_and_time):
+            ...
+
+    As with any :py:mod:`multiprocessing` task, ``extract`` must be picklable
+    (i.e. a module-level function, not a lambda), and on platforms which
+    spawn worker processes your script needs an
+    ``if __name__ == '__main__':`` guard.
+
+    Args:
+        paths (iterable): Paths of the VOEvent files, one packet per file.
+        workers (int): Number of worker processes. Defaults to the number of
+            CPUs. With ``workers=1`` the files are processed in the current
+            process, without a pool.
+        extract (callable): Called with each loaded :py:class:`Voevent`;
+            its return value is the result for that file. Defaults to
+            returning a :py:class:`.PacketHeader`.
+        validate (bool): (Default=False) Validate each packet against the
+            v2.0 schema, see :py:func:`.loads`.
+        check_version (bool): (Default=True) See :py:func:`.loads`.
+        ordered (bool): (Default=True) Yield results in the order of
+            ``paths``. If False, yield them as soon as they are completed.
+        errors (str): What to do if a file can't be loaded, is invalid, or
+            ``extract`` fails: ``'raise'`` (the default) re-raises the error
+            in the calling process (as the same exception type, with the
+            path prepended to the message), ``'ignore'`` skips the file.
+        chunksize (int): Number of files sent to a worker at a time.
+    Returns:
+        iterator: Yields a ``(path, result)`` tuple per file.
+    """
+    if errors not in ('raise', 'ignore'):
+        raise ValueError("'errors' must be one of 'raise', 'ignore'")
+    task = functools.partial(_load_and_extract,
+                             extract=extract or _extract_header,
+                             validate=validate,
+                             check_version=check_version)
+    if workers == 1:
+        outcomes = (task(path) for path in paths)
+        for outcome in _handle_errors(outcomes, errors):
+            yield outcome
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for outcome in _handle_errors(imap(task, paths, chunksize), errors):
+            yield outcome
+    except BaseException:
+        # Includes the consumer abandoning the generator early.
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+class ThreadedIngestor(object):
+    """
+    Loads and processes many VOEvent packets using a pool of threads.
+
+    lxml releases the GIL while parsing and validating, so threads can make
+    use of several cores for much of the work, without the overheads of a
+    process pool (pickling results, starting processes). The trees are
+    loaded by a :py:class:`.VOEventParser`, which gives each thread its own
+    lxml parser and, with ``validate=True``, its own compiled schema.
+
+    Since the results don't leave the process, ``extract`` can be any
+    callable (and may simply return the packet itself, which is the
+    default). E.g.::
+
+        with vp.ThreadedIngestor(workers=4, validate=True) as ingestor:
+            for path, v in ingestor.load_many(paths):
+                ...
+
+    The threads are started on first use and kept for the lifetime of the
+    ingestor, so that their parsers and schemas are reused from one call to
+    the next; it's worth keeping an ingestor around to process a stream of
+    small batches. Call :py:meth:`close` (or use it as a context manager)
+    to stop them.
+
+    Note that the Python code in ``extract`` (and in objectify attribute
+    access generally) does hold the GIL, so the more work is done there, the
+    less benefit from extra threads; see ``benchmarks/bench_ingest.py``.
+
+    Args:
+        workers (int): Number of threads. Defaults to the number of CPUs.
+        extract (callable): Called with each loaded :py:class:`Voevent`;
+            its return value is the result for that packet. Defaults to
+            returning the packet.
+        validate (bool): (Default=False) Validate each packet against the
+            v2.0 schema during parsing, see :py:func:`.loads`.
+        check_version (bool): (Default=True) See :py:func:`.loads`.
+        **parser_options: Passed on to :py:class:`.VOEventParser`.
+    """
+
+    def __init__(self, workers=None, extract=None, validate=False,
+                 check_version=True, **parser_options):
+        self.workers = workers
+        self.extract = extract
+        self.check_version = check_version
+        self.parser = VOEventParser(validate=validate, **parser_options)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop the worker threads, once they've finished any outstanding
+        work.
+
+        The ingestor may still be used afterwards, in which case a fresh set
+        of threads is started.
+        """
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def loads_many(self, packets, ordered=True, errors='raise'):
+        """Load and process many packets, each held as bytes.
+
+        Args:
+            packets (iterable): Bytes holding each packet.
+            ordered (bool): (Default=True) Yield results in the order of
+                ``packets``. If False, yield them as soon as completed.
+            errors (str): ``'raise'`` (the default) to re-raise the first
+                error while loading or processing a packet, ``'ignore'`` to
+                skip that packet.
+        Returns:
+            iterator: Yields the result for each packet.
+        """
+        outcomes = self._map(self._loads_and_extract, packets, ordered,
+                             errors)
+        for _, result in outcomes:
+            yield result
+
+    def load_many(self, paths, ordered=True, errors='raise'):
+        """Load and process many VOEvent files, one packet per file.
+
+        Args:
+            paths (iterable): Paths of the VOEvent files.
+            ordered (bool): See :py:meth:`loads_many`.
+            errors (str): See :py:meth:`loads_many`.
+        Returns:
+            iterator: Yields a ``(path, result)`` tuple per file.
+        """
+        return self._map(self._load_and_extract, paths, ordered, errors)
+
+    def _loads_and_extract(self, s):
+        v = self.parser.loads(s, check_version=self.check_version)
+        if self.extract is None:
+            return s, v
+        return s, self.extract(v)
+
+    def _load_and_extract(self, path):
+        with open(path, 'rb') as f:
+            _, result = self._loads_and_extract(f.read())
+        return path, result
+
+    def _map(self, func, items, ordered, errors):
+        if errors not in ('raise', 'ignore'):
+            raise ValueError("'errors' must be one of 'raise', 'ignore'")
+        if errors == 'ignore':
+            func = functools.partial(_ignore_errors, func)
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = multiprocessing.pool.ThreadPool(self.workers)
+            pool = self._pool
+        imap = pool.imap if ordered else pool.imap_unordered
+        for outcome in imap(func, items):
+            if outcome is not None:
+                yield outcome
+
+
+def _ignore_errors(func, item):
+    try:
+        return func(item)
+    except Exception:
+        return None
+
+
+def _extract_header(voevent):
+    """Default ``extract`` for :py:func:`.load_many`."""
+    who = voevent.find('Who')
+    author_ivorn = date = None
+    if who is not None:
+        author_ivorn = who.findtext('AuthorIVORN')
+        date = who.findtext('Date')
+    attrib = voevent.attrib
+    return PacketHeader(attrib.get('ivorn'), attrib.get('role'),
+                        attrib.get('version'), author_ivorn, date)
+
+
+def _load_and_extract(path, extract, validate, check_version):
+    """Worker task; returns ``(path, result, error)``.
+
+    Exceptions are passed back as a ``(type, message)`` pair, since many
+    (e.g. lxml's, which carry an error log) cannot be pickled.
+    """
+    try:
+        with open(path, 'rb') as f:
+            v = load(f, check_version=check_version, validate=validate)
+        return path, extract(v), None
+    except Exception as e:
+        return path, None, (type(e), str(e))
+
+
+def _handle_errors(outcomes, errors):
+    for path, result, error in outcomes:
+        if error is None:
+            yield path, result
+        elif errors == 'raise':
+            exc_type, message = error
+            message = '{}: {}'.format(path, message)
+            try:
+                exc = exc_type(message)
+            except Exception:
+                # Some exception types require further constructor args.
+                exc = RuntimeError('{} ({})'.format(message,
+                                                    exc_type.__name__))
+            raise exc
@@ -25,6 +25,186 @@ class Position2D(namedtuple('Position2D', 'ra dec err units system')):
     pass  # Just wrapping a namedtuple so we can assign a docstring.
 
 
+class ObsLocation(namedtuple('ObsLocation', 'time position system')):
+    """A namedtuple representing one `WhereWhen.ObsDataLocation`, as
+    yielded by :py:func:`.iter_obs_locations`.
+
+    Args:
+        time (datetime.datetime): The event time, converted to UTC
+            (timezone aware), or ``None``.
+        position (:py:class:`.Position2D`): The sky position, or ``None``.
+        system (str): Co-ordinate system, e.g. UTC-FK5-GEO (the
+            ``AstroCoordSystem`` id), or ``None``.
+
+    """
+    pass  # Just wrapping a namedtuple so we can assign a docstring.
+
+
+class PositionArrays(namedtuple('PositionArrays',
+                                'ra dec err units system unit_names '
+                                'system_names')):
+    """A namedtuple holding the sky positions of many packets as arrays,
+    as returned by :py:func:`.get_event_positions`.
+
+    The units and co-ordinate systems are stored as categorical codes: an
+    integer array indexing into a list of the distinct values.
+
+    Args:
+        ra (numpy.ndarray): Right ascensions (float64, NaN if absent).
+        dec (numpy.ndarray): Declinations (float64, NaN if absent).
+        err (numpy.ndarray): Error radii (float64, NaN if absent).
+        units (numpy.ndarray): Codes for the units (int16, -1 if absent),
+            indexing into ``unit_names``.
+        system (numpy.ndarray): Codes for the co-ordinate systems (int16,
+            -1 if absent), indexing into ``system_names``.
+        unit_names (list): Distinct units, e.g. ``['deg']``.
+        system_names (list): Distinct co-ordinate systems, e.g.
+            ``['UTC-FK5-GEO', 'TDB-ICRS-BARY']``.
+
+    """
+    pass  # Just wrapping a namedtuple so we can assign a docstring.
+
+
+class Coincidence(namedtuple('Coincidence',
+                             'ivorn matched_ivorn dt separation')):
+    """A namedtuple describing a pair of coincident events, as returned by
+    :py:meth:`.CoincidenceMatcher.add`.
+
+    Args:
+        ivorn (str): IVORN of the event just added.
+        matched_ivorn (str): IVORN of the earlier-received event it matches.
+        dt (float): Event time of ``ivorn`` minus that of
+            ``matched_ivorn``, in seconds.
+        separation (float): Angular separation, in degrees.
+
+    """
+    pass  # Just wrapping a namedtuple so we can assign a docstring.
+
+
+class PacketHeader(namedtuple('PacketHeader',
+                              'ivorn role version author_ivorn date')):
+    """A namedtuple summarising the header of a VOEvent packet,
+    as returned by :py:func:`.peek_header`.
+
+    Fields are strings, or ``None`` if absent from the packet.
+
+    Args:
+        ivorn (str): The packet's IVORN (root ``ivorn`` attribute).
+        role (str): The packet's role, cf :class:`.definitions.roles`.
+        version (str): The VOEvent schema version, e.g. '2.0'.
+        author_ivorn (str): Contents of ``Who.AuthorIVORN``.
+        date (str): Contents of ``Who.Date``, unparsed.
+
+    """
+    pass  # Just wrapping a namedtuple so we can assign a docstring.
+
+
+class OrderedMultiDict(object):
+    """A lightweight ordered mapping which may hold several values per key.
+
+    Returned by :func:`.get_toplevel_params` and :func:`.get_grouped_params`,
+    since multiple Params (or Groups) may share a name. Supports the commonly
+    used parts of the
+    `orderedmultidict.omdict <https://github.com/gruns/orderedmultidict>`_
+    interface, which was used previously: ``d[key]``, ``get``, ``keys``,
+    ``values`` and ``items`` behave like a dict holding the *first* value
+    for each key, while ``getlist``, ``allkeys``, ``allvalues`` and
+    ``allitems`` include every value, in insertion order.
+
+    Items are held in a single list, so ``getlist`` is a linear scan; fine
+    for the handful of entries in a typical VOEvent.
+
+    Args:
+        items: Optional iterable of ``(key, value)`` pairs to add.
+    """
+    __slots__ = ('_items', '_first')
+
+    def __init__(self, items=()):
+        self._items = []
+        self._first = {}  # key -> index of its first item
+        for key, value in items:
+            self.add(key, value)
+
+    def add(self, key, value):
+        """Add a value for ``key``, after any existing values."""
+        if key not in self._first:
+            self._first[key] = len(self._items)
+        self._items.append((key, value))
+
+    def __getitem__(self, key):
+        return self._items[self._first[key]][1]
+
+    def get(self, key, default=None):
+        index = self._first.get(key)
+        if index is None:
+            return default
+        return self._items[index][1]
+
+    def getlist(self, key, default=None):
+        """All values for ``key`` (or ``default``, if given, when absent)."""
+        if key not in self._first:
+            return [] if default is None else default
+        return [v for k, v in self._items if k == key]
+
+    def __contains__(self, key):
+        return key in self._first
+
+    def __len__(self):
+        return len(self._first)
+
+    def size(self):
+        """Total number of values, over all keys."""
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        """Distinct keys, in order of first appearance."""
+        first = self._first
+        return [k for i, (k, _) in enumerate(self._items) if first[k] == i]
+
+    def values(self):
+        """First value for each key."""
+        return [self._items[i][1] for i in sorted(self._first.values())]
+
+    def items(self):
+        """``(key, first value)`` for each key."""
+        return [self._items[i] for i in sorted(self._first.values())]
+
+    def lists(self):
+        """List of all values, for each key."""
+        return [self.getlist(key) for key in self.keys()]
+
+    def allkeys(self):
+        return [k for k, _ in self._items]
+
+    def allvalues(self):
+        return [v for _, v in self._items]
+
+    def allitems(self):
+        return list(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, OrderedMultiDict):
+            return self._items == other._items
+        try:
+            return (len(self) == len(other) and
+                    all(key in other and other[key] == value
+                        for key, value in self.items()))
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self._items)
+
+
 _datatypes_autoconversion = {
     bool: ('string', lambda b: str(b)),
     int: ('int', lambda i: str(i)),
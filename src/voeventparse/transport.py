@@ -0,0 +1,325 @@
+"""
+Routines for reading and writing the VOEvent Transport Protocol (VTP).
+
+VTP carries XML messages over TCP, each one preceded by its length in bytes
+as a 4-byte big-endian unsigned integer. Besides VOEvent packets, brokers and
+subscribers exchange small *Transport* messages: ``iamalive`` heartbeats,
+which should be answered in kind, and ``ack`` / ``nak`` responses, which a
+subscriber sends on receiving each VOEvent. See
+http://www.ivoa.net/documents/Notes/VOEventTransport/ for details.
+
+A minimal subscriber loop looks something like::
+
+    decoder = FrameDecoder()
+    while True:
+        for payload in decoder.feed(sock.recv(65536)):
+            if is_transport_message(payload):
+                message = parse_transport_message(payload)
+                if message.role == 'iamalive':
+                    sock.sendall(encode_frame(
+                        make_iamalive(local_ivorn, origin=message.origin)))
+            else:
+                v = vp.loads(payload)
+                sock.sendall(encode_frame(
+                    make_ack(v.attrib['ivorn'], local_ivorn)))
+                ...
+
+For asyncio streams, see :py:func:`voeventparse.aio.read_frame`.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import datetime
+import struct
+from collections import namedtuple
+
+import pytz
+from lxml import etree
+from six import string_types
+
+from voeventparse.voevent import _prolog_regex
+
+#: Transport message namespace.
+TRANSPORT_NS = 'http://telescope-networks.org/schema/Transport/v1.1'
+_TRANSPORT_SCHEMA_LOCATION = (
+    TRANSPORT_NS + ' http://telescope-networks.org/schema/Transport-v1.1.xsd')
+_XSI_NS = 'http://www.w3.org/2001/XMLSchema-instance'
+
+#: Default upper limit on the size of a frame, guarding against a corrupt
+#: or malicious length prefix making us buffer gigabytes.
+MAX_FRAME_SIZE = 2 ** 24
+
+_prefix = struct.Struct('>I')
+
+
+class TransportMessage(namedtuple('TransportMessage',
+                                  'role origin response timestamp')):
+    """A namedtuple representing a VTP Transport message.
+
+    Args:
+        role (str): 'iamalive', 'ack' or 'nak'.
+        origin (str): IVORN of the originating party (for ``iamalive``), or
+            of the VOEvent being acknowledged (for ``ack`` / ``nak``).
+        response (str): IVORN of the responding party, or ``None``.
+        timestamp (str): ISO-8601 timestamp of the message, or ``None``.
+
+    """
+    pass  # Just wrapping a namedtuple so we can assign a docstring.
+
+
+def encode_frame(payload):
+    """Prefixes ``payload`` (bytes) with its length, ready to send.
+
+    To avoid copying large payloads, you can instead send
+    ``frame_prefix(len(payload))`` followed by the payload itself, e.g.
+    with :py:meth:`socket.socket.sendmsg`.
+    """
+    return _prefix.pack(len(payload)) + payload
+
+
+def frame_prefix(length):
+    """Returns the 4-byte length prefix for a payload of ``length`` bytes."""
+    return _prefix.pack(length)
+
+
+class FrameDecoder(object):
+    """
+    Incrementally splits a stream of bytes into VTP frame payloads.
+
+    Feed it data as it arrives, in chunks of any size; complete payloads
+    are returned as soon as they are available. Payloads which arrive
+    within a single chunk are copied out of it exactly once. Only the
+    incomplete frame at the end of a chunk (if any) is buffered, and then
+    only until the rest of that frame arrives.
+
+    Args:
+        max_frame_size (int): Raise :py:obj:`ValueError` on encountering a
+            larger frame. Defaults to :py:data:`MAX_FRAME_SIZE`; ``None``
+            means no limit.
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+
+    @property
+    def buffered(self):
+        """Number of bytes held over, pending the rest of a frame."""
+        return len(self._buffer)
+
+    def feed(self, data):
+        """Add data to the stream.
+
+        Args:
+            data (bytes): The next chunk of the stream (or any object
+                supporting the buffer protocol, e.g. a bytearray).
+        Returns:
+            list: The payload (bytes) of each frame completed by ``data``.
+        Raises:
+            ValueError: If a frame exceeds ``max_frame_size``.
+        """
+        frames = []
+        view = memoryview(data)
+        try:
+            size = len(view)
+            position = 0
+            if self._buffer:
+                position = self._complete_buffered(view, frames)
+            while size - position >= 4:
+                length, = _prefix.unpack_from(view, position)
+                self._check_length(length)
+                end = position + 4 + length
+                if end > size:
+                    break
+                frames.append(view[position + 4:end].tobytes())
+                position = end
+            if position < size:
+                self._buffer.extend(view[position:])
+        finally:
+            _release(view)
+        return frames
+
+    def _complete_buffered(self, view, frames):
+        """Extends the buffered partial frame from the start of ``view``, by
+        no more than the rest of that frame. Returns the number of bytes of
+        ``view`` used."""
+        buffer = self._buffer
+        used = 0
+        if len(buffer) < 4:
+            used = min(4 - len(buffer), len(view))
+            buffer += view[:used]
+            if len(buffer) < 4:
+                return used
+            self._check_length(_prefix.unpack_from(buffer)[0])
+        # (Otherwise the length was checked when the frame was buffered.)
+        missing = 4 + _prefix.unpack_from(buffer)[0] - len(buffer)
+        if missing > len(view) - used:
+            buffer += view[used:] if used else view
+            return len(view)
+        buffer += view[used:used + missing]
+        payload = memoryview(buffer)
+        try:
+            frames.append(payload[4:].tobytes())
+        finally:
+            _release(payload)  # So that the buffer may be resized.
+        del buffer[:]
+        return used + missing
+
+    def _check_length(self, length):
+        if self.max_frame_size is not None and length > self.max_frame_size:
+            raise ValueError(
+                'VTP frame of {} bytes exceeds maximum of {}'.format(
+                    length, self.max_frame_size))
+
+
+def _release(view):
+    """Releases a memoryview now (Python 3), rather than when collected."""
+    release = getattr(view, 'release', None)
+    if release is not None:
+        release()
+
+
+def read_frame(sock, max_frame_size=MAX_FRAME_SIZE):
+    """Read one frame from a blocking socket.
+
+    Args:
+        sock (:py:class:`socket.socket`): A connected socket.
+        max_frame_size (int): See :py:class:`FrameDecoder`.
+    Returns:
+        bytes: The frame payload, or ``None`` if the connection was closed
+        cleanly before the start of a frame.
+    Raises:
+        EOFError: If the connection was closed part-way through a frame.
+        ValueError: If the frame exceeds ``max_frame_size``.
+    """
+    prefix = _recv_exactly(sock, 4)
+    if prefix is None:
+        return None
+    length, = _prefix.unpack(prefix)
+    if max_frame_size is not None and length > max_frame_size:
+        raise ValueError('VTP frame of {} bytes exceeds maximum of {}'.format(
+            length, max_frame_size))
+    payload = _recv_exactly(sock, length)
+    if payload is None and length:
+        raise EOFError('Connection closed part-way through a VTP frame')
+    return payload or b''
+
+
+def iter_frames(sock, max_frame_size=MAX_FRAME_SIZE):
+    """Iterate over the frames read from a blocking socket until it is
+    closed. See :py:func:`read_frame`."""
+    while True:
+        payload = read_frame(sock, max_frame_size)
+        if payload is None:
+            return
+        yield payload
+
+
+def _recv_exactly(sock, n):
+    if not n:
+        return b''
+    chunk = sock.recv(n)
+    if len(chunk) == n:
+        return chunk  # Usual case, no copying needed.
+    if not chunk:
+        return None
+    data = bytearray(chunk)
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise EOFError('Connection closed part-way through a VTP frame')
+        data.extend(chunk)
+    return bytes(data)
+
+
+def is_transport_message(payload):
+    """Tests if a frame payload is a Transport message (rather than a
+    VOEvent), by checking the root element name only."""
+    match = _prolog_regex.match(payload)
+    return (match is not None and
+            match.group(1).rpartition(b':')[2] == b'Transport')
+
+
+def parse_transport_message(payload):
+    """Parse a Transport message.
+
+    Args:
+        payload (bytes): A frame payload holding a Transport message.
+    Returns:
+        :py:class:`TransportMessage`: The message contents.
+    Raises:
+        ValueError: If ``payload`` is not a Transport message.
+    """
+    root = etree.fromstring(payload)
+    if etree.QName(root).localname != 'Transport':
+        raise ValueError('Not a Transport message: ' + root.tag)
+    fields = {}
+    for child in root:
+        if isinstance(child.tag, string_types):  # i.e. not a comment
+            fields[etree.QName(child).localname] = child.text
+    return TransportMessage(root.get('role'), fields.get('Origin'),
+                            fields.get('Response'), fields.get('TimeStamp'))
+
+
+def make_transport_message(role, origin, response=None, timestamp=None):
+    """Build a Transport message.
+
+    Args:
+        role (str): 'iamalive', 'ack' or 'nak'.
+        origin (str): Contents of the ``Origin`` element.
+        response (str): Contents of the ``Response`` element, if any.
+        timestamp (datetime.datetime): Defaults to now. Naive datetimes are
+            assumed to be UTC.
+    Returns:
+        bytes: The serialized message, ready for :py:func:`encode_frame`.
+    """
+    if timestamp is None:
+        timestamp = datetime.datetime.now(pytz.utc)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(pytz.utc)
+    root = etree.Element('{' + TRANSPORT_NS + '}Transport',
+                         nsmap={'trn': TRANSPORT_NS, 'xsi': _XSI_NS})
+    root.set('version', '1.0')
+    root.set('role', role)
+    root.set('{' + _XSI_NS + '}schemaLocation', _TRANSPORT_SCHEMA_LOCATION)
+    etree.SubElement(root, 'Origin').text = origin
+    if response is not None:
+        etree.SubElement(root, 'Response').text = response
+    etree.SubElement(root, 'TimeStamp').text = timestamp.strftime(
+        '%Y-%m-%dT%H:%M:%SZ')
+    return etree.tostring(root, xml_declaration=True, encoding='UTF-8')
+
+
+def make_iamalive(local_ivorn, origin=None, timestamp=None):
+    """Build an ``iamalive`` message.
+
+    Args:
+        local_ivorn (str): Our own IVORN.
+        origin (str): When replying to an ``iamalive``, the ``origin`` of
+            that message. Our reply then gives ``local_ivorn`` as the
+            ``Response``. If ``None``, we are the originator.
+        timestamp (datetime.datetime): Defaults to now.
+    """
+    if origin is None:
+        return make_transport_message('iamalive', local_ivorn,
+                                      timestamp=timestamp)
+    return make_transport_message('iamalive', origin, local_ivorn, timestamp)
+
+
+def make_ack(voevent_ivorn, local_ivorn, timestamp=None):
+    """Build an ``ack`` message acknowledging receipt of a VOEvent.
+
+    Args:
+        voevent_ivorn (str): IVORN of the VOEvent received.
+        local_ivorn (str): Our own IVORN.
+        timestamp (datetime.datetime): Defaults to now.
+    """
+    return make_transport_message('ack', voevent_ivorn, local_ivorn,
+                                  timestamp)
+
+
+def make_nak(voevent_ivorn, local_ivorn, timestamp=None):
+    """Build a ``nak`` message, rejecting a VOEvent.
+    See :py:func:`make_ack`."""
+    return make_transport_message('nak', voevent_ivorn, local_ivorn,
+                                  timestamp)
@@ -2,22 +2,92 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import codecs
 import copy
 import collections
+import re
+import threading
 
 import pytz
 from lxml import objectify, etree
 from six import string_types
 
 import voeventparse.definitions
-
-voevent_v2_0_schema = etree.XMLSchema(
-    etree.fromstring(voeventparse.definitions.v2_0_schema_str))
+from voeventparse.misc import PacketHeader
 
 from ._version import get_versions
 
 __version__ = get_versions()['version']
 
+_v2_0_schema = None
+_v2_0_schema_lock = threading.Lock()
+
+
+def get_v2_0_schema():
+    """Returns the compiled VOEvent v2.0 schema.
+
+    Compiling the schema is comparatively expensive, so it is deferred until
+    the first call to this function, and the result cached thereafter.
+
+    The same instance is returned to every caller. (The validation routines
+    in this package use a separate instance per thread, so that each thread
+    gets its own ``error_log``.)
+
+    Returns:
+        :py:class:`lxml.etree.XMLSchema`: The v2.0 schema validator.
+    """
+    global _v2_0_schema
+    if _v2_0_schema is None:
+        with _v2_0_schema_lock:
+            if _v2_0_schema is None:
+                _v2_0_schema = _compile_v2_0_schema()
+    return _v2_0_schema
+
+
+_local_schemas = threading.local()
+
+
+def _thread_v2_0_schema():
+    """Returns a compiled v2.0 schema belonging to the calling thread.
+
+    Validation itself is thread-safe, but each XMLSchema instance records
+    the errors from its last use in its ``error_log``, so we keep one
+    instance per thread to avoid mixing up error reports between threads.
+    """
+    schema = getattr(_local_schemas, 'v2_0', None)
+    if schema is None:
+        schema = _compile_v2_0_schema()
+        _local_schemas.v2_0 = schema
+    return schema
+
+
+def _compile_v2_0_schema():
+    return etree.XMLSchema(
+        etree.fromstring(voeventparse.definitions.v2_0_schema_str))
+
+
+class _LazyXMLSchema(object):
+    """
+    Stand-in for the compiled schema, for backwards compatibility.
+
+    Attribute access (e.g. ``voevent_v2_0_schema.validate``) is forwarded to
+    the schema returned by :py:func:`get_v2_0_schema`, so it only gets
+    compiled if somebody actually uses it.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_v2_0_schema(), name)
+
+    def __call__(self, tree):
+        return get_v2_0_schema()(tree)
+
+    def __repr__(self):
+        return '<lazily-compiled VOEvent v2.0 XMLSchema>'
+
+
+#: Retained for backwards compatibility, prefer :py:func:`get_v2_0_schema`.
+voevent_v2_0_schema = _LazyXMLSchema()
+
 
 def Voevent(stream, stream_id, role):
     """Create a new VOEvent element tree, with specified IVORN and role.
@@ -65,7 +135,246 @@ def Voevent(stream, stream_id, role):
     return v
 
 
-def loads(s, check_version=True):
+def _marks_modified(name):
+    base_method = getattr(objectify.ObjectifiedElement, name)
+
+    def method(self, *args, **kwargs):
+        mark_modified(self)
+        return base_method(self, *args, **kwargs)
+
+    method.__name__ = name
+    method.__doc__ = base_method.__doc__
+    return method
+
+
+class _TrackedElement(objectify.ObjectifiedElement):
+    """
+    Objectify tree-element class used for packets loaded by a
+    :py:class:`VOEventParser` with ``keep_source`` or ``track_changes``.
+
+    The root element of such a packet keeps per-packet state in its instance
+    ``__dict__``: the raw bytes it was parsed from (with ``keep_source``),
+    and any derived data cached by the convenience routines. Structural
+    changes made via the objectify API on any (non-leaf) element, e.g.
+    ``v.Who.Date = ...`` or ``v.What.append(...)``, flag the packet as
+    modified, so that the raw bytes are no longer used in its place and the
+    cached data is discarded.
+
+    NB lxml only keeps an element proxy (and hence its ``__dict__``) alive for
+    as long as something refers to it. If the root proxy is dropped then the
+    state is simply forgotten, which is safe.
+    """
+    __setattr__ = _marks_modified('__setattr__')
+    __delattr__ = _marks_modified('__delattr__')
+    __setitem__ = _marks_modified('__setitem__')
+    __delitem__ = _marks_modified('__delitem__')
+    addattr = _marks_modified('addattr')
+    append = _marks_modified('append')
+    extend = _marks_modified('extend')
+    insert = _marks_modified('insert')
+    remove = _marks_modified('remove')
+    replace = _marks_modified('replace')
+    set = _marks_modified('set')
+    clear = _marks_modified('clear')
+    addnext = _marks_modified('addnext')
+    addprevious = _marks_modified('addprevious')
+
+
+def _source_state(voevent):
+    """Returns the source-tracking state of a packet, or None."""
+    if isinstance(voevent, _TrackedElement):
+        state = voevent.__dict__
+        if '_source' in state:
+            return state
+    return None
+
+
+def _packet_cache(voevent):
+    """Returns the dict of derived data cached on a packet, or None if the
+    packet cannot hold any (i.e. was not loaded with ``keep_source`` or
+    ``track_changes``)."""
+    if isinstance(voevent, _TrackedElement):
+        state = voevent.__dict__
+        cache = state.get('_cache')
+        if cache is None:
+            cache = state['_cache'] = {}
+        return cache
+    return None
+
+
+def mark_modified(voevent):
+    """
+    Flags a packet as modified, so that its source bytes are no longer used,
+    and any data cached on it (see :py:func:`.get_typed_params`) is discarded.
+
+    Only relevant for packets loaded with ``keep_source`` (or a
+    :py:class:`VOEventParser` with ``track_changes``), and only needed
+    after changes which bypass the
+    objectify API - for example setting ``.attrib`` values, changing data
+    elements in place, or adding children via :py:func:`lxml.etree.SubElement`.
+    The authoring routines in this module call it for you.
+
+    Args:
+        voevent(:class:`Voevent`): Any element of a VOEvent etree.
+    """
+    # Data leaves (e.g. Param, Who.Date) are not _TrackedElements, so only
+    # the root's type says whether the packet is tracked.
+    root = voevent.getroottree().getroot()
+    if isinstance(root, _TrackedElement):
+        state = root.__dict__
+        state.pop('_cache', None)
+        if '_source' in state:
+            state['_modified'] = True
+
+
+class VOEventParser(object):
+    """
+    A reusable, configurable parser for VOEvent packets.
+
+    Wraps an :py:func:`lxml.objectify.makeparser` parser, built once with
+    the given options and then reused for every packet. lxml parsers must
+    not be shared between threads, so each thread using a VOEventParser
+    lazily gets its own underlying parser instance.
+
+    :py:func:`.loads` and :py:func:`.load` use a default instance, which is
+    configured identically to the lxml.objectify default parser. Create your
+    own instance if you need to tune the parsing options, e.g.::
+
+        parser = vp.VOEventParser(collect_ids=False, huge_tree=True)
+        v = parser.loads(packet_bytes)
+
+    Options left as ``None`` are not passed on, i.e. the lxml default applies.
+
+    If ``validate`` is set, the underlying parser is bound to the VOEvent v2.0
+    schema, so that packets are validated in the same pass as they are
+    parsed, rather than by walking the finished tree again with
+    :py:func:`.valid_as_v2_0`. Like the parsers, the compiled schema is
+    per-thread.
+
+    If ``keep_source`` is set, loaded packets retain a reference to the bytes
+    they were parsed from; see :py:func:`.loads`.
+
+    If ``track_changes`` (or ``keep_source``) is set, loaded packets are
+    built from an element class which notices modifications made via the
+    objectify API, so that they can hold cached data (see
+    :py:func:`.get_typed_params`). This makes objectify attribute access
+    somewhat slower, so it is off by default.
+
+    Args:
+        validate (bool): Validate packets against the v2.0 schema while
+            parsing (Default=False).
+        keep_source (bool): Keep the raw packet bytes attached to loaded
+            packets (Default=False). Implies ``track_changes``.
+        track_changes (bool): Track modifications of loaded packets, so that
+            they can hold cached data (Default=False). Cannot be combined
+            with ``lookup``.
+        remove_blank_text (bool): Discard ignorable whitespace between
+            elements (Default=True, as per the objectify default parser).
+        huge_tree (bool): Disable libxml2 security restrictions on very deep
+            trees and very long text content.
+        resolve_entities (bool): Replace entities by their text value.
+        collect_ids (bool): Build a hash table of XML IDs. VOEvents do not
+            use these, so ``False`` saves a little work per packet.
+        lookup (:py:class:`lxml.etree.ElementClassLookup`): Custom element
+            class lookup, replacing the standard objectify lookup.
+        **parser_options: Any further keyword arguments are passed through to
+            :py:func:`lxml.objectify.makeparser`.
+    """
+
+    def __init__(self, validate=False, keep_source=False,
+                 track_changes=False, remove_blank_text=True, huge_tree=None,
+                 resolve_entities=None, collect_ids=None, lookup=None,
+                 **parser_options):
+        track_changes = track_changes or keep_source
+        if track_changes and lookup is not None:
+            raise ValueError("Cannot use a custom element lookup with "
+                             "'keep_source' or 'track_changes'")
+        options = dict(remove_blank_text=remove_blank_text,
+                       huge_tree=huge_tree,
+                       resolve_entities=resolve_entities,
+                       collect_ids=collect_ids)
+        options.update(parser_options)
+        self.parser_options = dict(
+            (k, v) for k, v in options.items() if v is not None)
+        self.lookup = lookup
+        self.validate = validate
+        self.keep_source = keep_source
+        self.track_changes = track_changes
+        if track_changes:
+            self.lookup = objectify.ObjectifyElementClassLookup(
+                tree_class=_TrackedElement)
+        elif lookup is None:
+            self.lookup = objectify.ObjectifyElementClassLookup()
+        self._local = threading.local()
+
+    def _make_parser(self):
+        options = dict(self.parser_options)
+        if self.validate:
+            options['schema'] = _thread_v2_0_schema()
+        parser = objectify.makeparser(**options)
+        if self.lookup is not None:
+            parser.set_element_class_lookup(self.lookup)
+        return parser
+
+    @property
+    def parser(self):
+        """The underlying lxml parser belonging to the calling thread."""
+        parser = getattr(self._local, 'parser', None)
+        if parser is None:
+            parser = self._make_parser()
+            self._local.parser = parser
+        return parser
+
+    def loads(self, s, check_version=True):
+        """Load VOEvent from bytes. See :py:func:`.loads`."""
+        # .. note::
+        #
+        # The namespace is removed from the root element tag to make
+        #        objectify access work as expected,
+        #        (see  :py:func:`._remove_root_tag_prefix`)
+        #        so we must re-insert it when we want to conform to schema.
+        parser = self.parser
+        try:
+            v = objectify.fromstring(s, parser=parser)
+        except etree.XMLSyntaxError as e:
+            # A schema-bound parser reports validation failures as syntax
+            # errors; re-raise those as the usual validation exception.
+            # (NB the exception's own error_log can be stale, so we check
+            # the parser's log, which is reset for each document.)
+            error_log = parser.error_log
+            if self.validate and _only_schema_errors(error_log):
+                raise etree.DocumentInvalid(str(e), error_log)
+            raise
+        _remove_root_tag_prefix(v)
+
+        if check_version:
+            version = v.attrib['version']
+            if not version == '2.0':
+                raise ValueError(
+                    'Unsupported VOEvent schema version:' + version)
+
+        if isinstance(v, _TrackedElement):
+            if self.keep_source:
+                v.__dict__.update(_source=s, _modified=False)
+            if self.validate:
+                # Record the result, so it needn't be re-checked later:
+                _packet_cache(v)['valid'] = True
+        return v
+
+    def load(self, file, check_version=True):
+        """Load VOEvent from file object. See :py:func:`.load`."""
+        s = file.read()
+        return self.loads(s, check_version)
+
+
+_default_parsers = dict(
+    ((validate, keep_source),
+     VOEventParser(validate=validate, keep_source=keep_source))
+    for validate in (False, True) for keep_source in (False, True)
+)
+
+
+def loads(s, check_version=True, validate=False, keep_source=False):
     """
     Load VOEvent from bytes.
 
@@ -79,35 +388,40 @@ def loads(s, check_version=True):
     2.0. This can be disabled but voevent-parse routines are untested with
     other versions.
 
+    Packets are parsed with a default :py:class:`VOEventParser`; use your own
+    instance for control over the lxml parser options.
+
+    With ``keep_source=True`` the returned packet keeps a reference to ``s``.
+    Until the packet is modified, :py:func:`.dumps` then returns ``s``
+    verbatim (when the requested output options are compatible with it)
+    rather than re-serializing the tree, and schema validation results are
+    cached. This suits brokers which mostly parse, route and forward packets.
+    Changes made via the objectify API are detected automatically, but see
+    :py:func:`.mark_modified` for changes which bypass it.
+
     Args:
         s (bytes): Bytes containing raw XML.
         check_version (bool): (Default=True) Checks that the VOEvent is of a
             supported schema version - currently only v2.0 is supported.
+        validate (bool): (Default=False) Validate against the v2.0 schema
+            during parsing. Equivalent to :py:func:`.assert_valid_as_v2_0`
+            on the result, but without the second pass over the tree.
+        keep_source (bool): (Default=False) Keep ``s`` attached to the
+            packet, see above.
     Returns:
         :py:class:`Voevent`: Root-node of the  etree.
     Raises:
         ValueError: If passed a VOEvent of wrong schema version
             (i.e. schema 1.1)
+        :py:obj:`lxml.etree.DocumentInvalid`: If ``validate`` is set and the
+            packet does not conform to the schema.
 
     """
-    # .. note::
-    #
-    # The namespace is removed from the root element tag to make
-    #        objectify access work as expected,
-    #        (see  :py:func:`._remove_root_tag_prefix`)
-    #        so we must re-insert it when we want to conform to schema.
-    v = objectify.fromstring(s)
-    _remove_root_tag_prefix(v)
-
-    if check_version:
-        version = v.attrib['version']
-        if not version == '2.0':
-            raise ValueError('Unsupported VOEvent schema version:' + version)
-
-    return v
+    parser = _default_parsers[(bool(validate), bool(keep_source))]
+    return parser.loads(s, check_version)
 
 
-def load(file, check_version=True):
+def load(file, check_version=True, validate=False, keep_source=False):
     """Load VOEvent from file object.
 
     A simple wrapper to read a file before passing the contents to
@@ -123,11 +437,225 @@ def load(file, check_version=True):
 
         check_version (bool): (Default=True) Checks that the VOEvent is of a
             supported schema version - currently only v2.0 is supported.
+        validate (bool): (Default=False) See :py:func:`.loads`.
+        keep_source (bool): (Default=False) See :py:func:`.loads`.
     Returns:
         :py:class:`Voevent`: Root-node of the  etree.
     """
     s = file.read()
-    return loads(s, check_version)
+    return loads(s, check_version, validate, keep_source)
+
+
+def iter_load(file, check_version=True, chunk_size=65536, encoding=None):
+    """Iterate over the VOEvents in a file object holding many packets.
+
+    Handles archive-style files which contain many VOEvent documents, either
+    simply concatenated one after another, or wrapped in some container
+    element (at any depth). The file is parsed incrementally, and each
+    VOEvent is yielded (in the same form as returned by :py:func:`.loads`)
+    as soon as its closing tag has been read. The parsed elements are then
+    discarded, so memory usage stays constant however large the file is.
+    Use with an open file object, e.g.::
+
+        with open('/path/to/archive.xml', 'rb') as f:
+            for v in vp.iter_load(f):
+                print(v.attrib['ivorn'])
+
+    .. note:: XML declarations between documents are stripped from the
+        stream, so that concatenated documents can be parsed as one. As a
+        result the encoding is assumed to be UTF-8 (as per the VOEvent
+        standard), unless overridden with ``encoding``.
+
+    Args:
+        file (io.IOBase): An open file object (binary mode).
+        check_version (bool): (Default=True) Checks that each VOEvent is of a
+            supported schema version - currently only v2.0 is supported.
+        chunk_size (int): Number of bytes to read from the file at a time.
+        encoding (str): Override the assumed encoding of the file contents.
+    Returns:
+        iterator: Yields the root-node of each :py:class:`Voevent` etree.
+    Raises:
+        ValueError: If passed a VOEvent of wrong schema version
+            (i.e. schema 1.1)
+    """
+    parser = etree.XMLPullParser(events=('end',), tag='{*}VOEvent',
+                                 remove_blank_text=True, encoding=encoding)
+    parser.set_element_class_lookup(objectify.ObjectifyElementClassLookup())
+
+    def read_chunks():
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    # Wrap everything in a container element of our own, so that
+    # concatenated documents form a single well-formed document.
+    parser.feed(b'<voeventparse-stream>')
+    for chunk in _strip_xml_declarations(read_chunks()):
+        parser.feed(chunk)
+        for v in _detach_voevents(parser, check_version):
+            yield v
+    parser.feed(b'</voeventparse-stream>')
+    for v in _detach_voevents(parser, check_version):
+        yield v
+    parser.close()
+
+
+def _detach_voevents(parser, check_version):
+    for _, element in parser.read_events():
+        # Copy out the VOEvent as a standalone tree, then clear away
+        # everything parsed so far.
+        v = copy.deepcopy(element)
+        element.clear()
+        # Including the earlier siblings of any wrapper elements, e.g. from
+        # archives with one <entry><VOEvent/></entry> per packet.
+        node = element
+        while node.getparent() is not None:
+            parent = node.getparent()
+            while node.getprevious() is not None:
+                parent.remove(node.getprevious())
+            node = parent
+        _remove_root_tag_prefix(v)
+        if check_version:
+            version = v.attrib['version']
+            if not version == '2.0':
+                raise ValueError(
+                    'Unsupported VOEvent schema version:' + version)
+        yield v
+
+
+_xml_declaration_regex = re.compile(br'<\?xml\s')
+# Markup which may contain '<' and '>' without delimiting tags.
+_opaque_markup_regex = re.compile(br'<(?:!--|!\[CDATA\[|\?)')
+_opaque_markup_ends = {b'<!--': b'-->', b'<![CDATA[': b']]>', b'<?': b'?>'}
+_self_closing_tag_regex = re.compile(
+    br'''<[^/!?][^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*/>''')
+
+
+def _strip_xml_declarations(chunks):
+    """Removes ``<?xml ...?>`` declarations from a stream of byte-chunks.
+
+    Only declarations between documents (i.e. outside any element) are
+    removed, so the text of comments, CDATA sections etc. is left alone.
+    To tell where we are, the element depth is tracked by counting tags,
+    which is cheap as long as comments, CDATA sections and processing
+    instructions (which may contain anything) are skipped over.
+    """
+    depth = 0
+    pending = b''
+    for chunk in chunks:
+        data = pending + chunk
+        out = []
+        pos = 0
+        while True:
+            match = _opaque_markup_regex.search(data, pos)
+            if match is None:
+                # Hold back the last tag in case it's incomplete.
+                # ('<' can't appear unescaped in text or attribute values.)
+                cut = max(data.rfind(b'<', pos), pos)
+                depth += _depth_change(data, pos, cut)
+                out.append(data[pos:cut])
+                pending = data[cut:]
+                break
+            depth += _depth_change(data, pos, match.start())
+            out.append(data[pos:match.start()])
+            end = data.find(_opaque_markup_ends[match.group()], match.end())
+            if end == -1:
+                pending = data[match.start():]
+                break
+            pos = end + len(_opaque_markup_ends[match.group()])
+            if not (depth == 0 and
+                    _xml_declaration_regex.match(data, match.start())):
+                out.append(data[match.start():pos])
+        yield b''.join(out)
+    if pending:
+        yield pending
+
+
+def _depth_change(data, start, end):
+    """Change in element depth over complete tags in ``data[start:end]``.
+
+    Assumes there are no comments, CDATA sections or processing
+    instructions in that range. (Nor DOCTYPEs, which would make the stream
+    fail to parse anyway.)
+    """
+    n_tags = data.count(b'<', start, end)
+    n_end_tags = data.count(b'</', start, end)
+    if data.count(b'>', start, end) == n_tags:
+        # Every '>' ends a tag, so '/>' only ends self-closing ones.
+        n_empty = data.count(b'/>', start, end)
+    else:
+        n_empty = len(_self_closing_tag_regex.findall(data, start, end))
+    return n_tags - 2 * n_end_tags - n_empty
+
+
+def peek_header(s):
+    """Read the header of a VOEvent packet, without loading all of it.
+
+    Returns the root attributes and the ``Who`` details which are typically
+    all that's needed to route, de-duplicate or filter a packet, for a
+    fraction of the cost of :py:func:`.loads`. Only the start of the packet,
+    up to the end of the ``Who`` element, is actually parsed, and no
+    objectify tree is built. Hence malformed content after ``Who`` will go
+    unnoticed; load the packet in full to check it.
+
+    Args:
+        s (bytes): Bytes containing raw XML.
+    Returns:
+        :py:class:`.PacketHeader`: Header details (``None`` where absent).
+    Raises:
+        :py:obj:`lxml.etree.XMLSyntaxError`: If the packet header is not
+            well-formed XML.
+    """
+    parser = _peek_parser()
+    root = who = None
+    # Fast path: cut the document short just after '</Who>' and close the
+    # root element ourselves. This presumes the usual case of an ASCII
+    # compatible encoding and a simple prolog; if anything doesn't check
+    # out, fall back to parsing the whole packet.
+    prolog = _prolog_regex.match(s)
+    cut = s.find(b'</Who>')
+    if prolog is not None and cut != -1:
+        head = b''.join((s[:cut + 6], b'</', prolog.group(1), b'>'))
+        try:
+            root = etree.fromstring(head, parser)
+        except etree.XMLSyntaxError:
+            root = None
+        if root is not None and len(root):
+            who = root[-1]
+        if who is None or who.tag != 'Who':
+            root = who = None
+    if root is None:
+        root = etree.fromstring(s, parser)
+        who = root.find('Who')
+    author_ivorn = date = None
+    if who is not None:
+        for child in who:
+            if child.tag == 'AuthorIVORN':
+                author_ivorn = child.text
+            elif child.tag == 'Date':
+                date = child.text
+    attrib = root.attrib
+    return PacketHeader(attrib.get('ivorn'), attrib.get('role'),
+                        attrib.get('version'), author_ivorn, date)
+
+
+# Matches the document prolog (BOM, XML declaration, comments etc), capturing
+# the qualified name of the root element.
+_prolog_regex = re.compile(
+    br'(?:\xef\xbb\xbf)?(?:\s+|<\?.*?\?>|<!--.*?-->|<!DOCTYPE[^>\[]*>)*'
+    br'<([^\s/>]+)', re.DOTALL)
+
+_peek_local = threading.local()
+
+
+def _peek_parser():
+    parser = getattr(_peek_local, 'parser', None)
+    if parser is None:
+        parser = etree.XMLParser(remove_blank_text=True)
+        _peek_local.parser = parser
+    return parser
 
 
 def dumps(voevent, pretty_print=False, xml_declaration=True, encoding='UTF-8'):
@@ -138,6 +666,11 @@ def dumps(voevent, pretty_print=False, xml_declaration=True, encoding='UTF-8'):
         but I think it's probably the right thing to do (and lxml doesn't
         really give you a choice anyway).
 
+    If the packet was loaded with ``keep_source=True`` and has not been
+    modified since, the original bytes are returned as-is provided that
+    ``pretty_print`` is off and the ``xml_declaration`` and ``encoding``
+    options match the original.
+
     Args:
         voevent (:class:`Voevent`): Root node of the VOevent etree.
         pretty_print (bool): indent the output for improved human-legibility
@@ -149,11 +682,18 @@ def dumps(voevent, pretty_print=False, xml_declaration=True, encoding='UTF-8'):
         bytes: Bytestring containing raw XML representation of VOEvent.
 
     """
-    vcopy = copy.deepcopy(voevent)
-    _return_to_standard_xml(vcopy)
-    s = etree.tostring(vcopy, pretty_print=pretty_print,
-                       xml_declaration=xml_declaration,
-                       encoding=encoding)
+    s = _unmodified_source(voevent, pretty_print, xml_declaration, encoding)
+    if s is not None:
+        return s
+    # Packets which have been loaded and not annotated by objectify since
+    # (i.e. the common parse-and-forward case) are written out directly,
+    # everything else goes via a cleaned-up copy.
+    s = _dumps_without_copy(voevent, pretty_print, xml_declaration, encoding)
+    if s is None:
+        vcopy = _standard_xml_copy(voevent)
+        s = etree.tostring(vcopy, pretty_print=pretty_print,
+                           xml_declaration=xml_declaration,
+                           encoding=encoding)
     return s
 
 
@@ -178,15 +718,24 @@ def dump(voevent, file, pretty_print=True, xml_declaration=True):
 def valid_as_v2_0(voevent):
     """Tests if a voevent conforms to the schema.
 
+    The packet itself is not modified, so this is safe to call while other
+    threads are reading the same packet. For packets loaded with
+    ``keep_source`` or ``track_changes`` the result is cached (and recorded
+    at load time when parsing with ``validate=True``), until the packet is
+    modified.
+
     Args:
         voevent(:class:`Voevent`): Root node of a VOEvent etree.
     Returns:
         bool: Whether VOEvent is valid
     """
-    _return_to_standard_xml(voevent)
-    valid_bool = voevent_v2_0_schema.validate(voevent)
-    _remove_root_tag_prefix(voevent)
-    return valid_bool
+    cache = _packet_cache(voevent)
+    if cache is not None and 'valid' in cache:
+        return cache['valid']
+    valid = _thread_v2_0_schema().validate(_standard_xml_copy(voevent))
+    if cache is not None:
+        cache['valid'] = valid
+    return valid
 
 
 def assert_valid_as_v2_0(voevent):
@@ -195,6 +744,7 @@ def assert_valid_as_v2_0(voevent):
 
     Especially useful for debugging,
     since the stack trace contains a reason for the invalidation.
+    As with :py:func:`.valid_as_v2_0`, the packet itself is not modified.
 
     Args:
         voevent(:class:`Voevent`): Root node of a VOEvent etree.
@@ -202,9 +752,12 @@ def assert_valid_as_v2_0(voevent):
          :py:obj:`lxml.etree.DocumentInvalid`: if VOEvent does not conform to
             schema.
     """
-    _return_to_standard_xml(voevent)
-    voevent_v2_0_schema.assertValid(voevent)
-    _remove_root_tag_prefix(voevent)
+    cache = _packet_cache(voevent)
+    if cache is not None and cache.get('valid'):
+        return
+    _thread_v2_0_schema().assertValid(_standard_xml_copy(voevent))
+    if cache is not None:
+        cache['valid'] = True
 
 
 def set_who(voevent, date=None, author_ivorn=None):
@@ -219,6 +772,7 @@ def set_who(voevent, date=None, author_ivorn=None):
             Note that the prefix ``ivo://`` will be prepended internally.
 
     """
+    mark_modified(voevent)
     if author_ivorn is not None:
         voevent.Who.AuthorIVORN = ''.join(('ivo://', author_ivorn))
     if date is not None:
@@ -241,6 +795,7 @@ def set_author(voevent, title=None, shortName=None, logoURL=None,
         voevent(:class:`Voevent`): Root node of a VOEvent etree.
             The rest of the arguments are strings corresponding to child elements.
     """
+    mark_modified(voevent)
     # We inspect all local variables except the voevent packet,
     # Cycling through and assigning them on the Who.Author element.
     AuthChildren = locals()
@@ -273,6 +828,7 @@ def add_where_when(voevent, coords, obs_time, observatory_location,
             datetime-timestamps. See comments for ``obs_time``.
 
     """
+    mark_modified(voevent)
 
     # .. todo:: Implement TimeError using datetime.timedelta
     if obs_time.tzinfo is not None:
@@ -316,6 +872,7 @@ def add_how(voevent, descriptions=None, references=None):
         references(:py:class:`voeventparse.misc.Reference`): A reference element
             (or list thereof).
     """
+    mark_modified(voevent)
     if not voevent.xpath('How'):
         etree.SubElement(voevent, 'How')
     if descriptions is not None:
@@ -346,6 +903,7 @@ def add_why(voevent, importance=None, expires=None, inferences=None):
         inferences(:class:`voeventparse.misc.Inference`): Inference or list of
             inferences, denoting probable identifications or associations, etc.
     """
+    mark_modified(voevent)
     if not voevent.xpath('Why'):
         etree.SubElement(voevent, 'Why')
     if importance is not None:
@@ -370,6 +928,7 @@ def add_citations(voevent, event_ivorns):
             elements to add to citation list.
 
     """
+    mark_modified(voevent)
     if not voevent.xpath('Citations'):
         etree.SubElement(voevent, 'Citations')
     voevent.Citations.extend(_listify(event_ivorns))
@@ -426,6 +985,141 @@ def _return_to_standard_xml(v):
     etree.cleanup_namespaces(v)
 
 
+def _standard_xml_copy(v):
+    """
+    Returns a schema-conformant copy of v, leaving the original untouched.
+
+    The copy is made at the C level by lxml, so this is still much cheaper
+    than the alternative of round-tripping the packet through a string.
+    """
+    vcopy = copy.deepcopy(v)
+    _return_to_standard_xml(vcopy)
+    return vcopy
+
+
+def _only_schema_errors(error_log):
+    """True if all errors in the log come from schema validation."""
+    return bool(error_log) and all(
+        e.domain == etree.ErrorDomains.SCHEMASV for e in error_log)
+
+
+_PYTYPE_NS = 'http://codespeak.net/lxml/objectify/pytype'
+_XSI_NS = 'http://www.w3.org/2001/XMLSchema-instance'
+_ORIGINAL_PREFIX_ATTRIB = {'{' + _PYTYPE_NS + '}pytype': 'str'}
+_ORIGINAL_PREFIX_XML = ('<original_prefix xmlns:py="' + _PYTYPE_NS +
+                        '" py:pytype="str">{}</original_prefix>')
+
+
+def _unmodified_source(v, pretty_print, xml_declaration, encoding):
+    """
+    Returns the bytes v was loaded from, if they can stand in for dumps(v).
+    """
+    state = _source_state(v)
+    if state is None or state['_modified'] or pretty_print:
+        return None
+    source = state['_source']
+    if not isinstance(source, bytes):
+        return None
+    if xml_declaration != source.startswith(b'<?xml'):
+        return None
+    try:
+        source_encoding = v.getroottree().docinfo.encoding
+        if (codecs.lookup(encoding).name !=
+                codecs.lookup(source_encoding).name):
+            return None
+    except (LookupError, TypeError):
+        return None
+    return source
+
+
+def _dumps_without_copy(v, pretty_print, xml_declaration, encoding):
+    """
+    Serializes v exactly as :py:func:`.dumps` would, without copying it.
+
+    We serialize the tree as-is, then patch the output: the ``original_prefix``
+    bookkeeping element is cut out and the namespace prefix restored to the
+    root tags. This is only equivalent to deannotating and cleaning up a copy
+    if there is nothing to clean up, i.e. no objectify annotations and no
+    unused namespace declarations. Rather than walk the tree to check that
+    (which costs about as much as the copy we're trying to avoid), we check
+    the root by hand and then scan the serialized body for namespace
+    declarations. These are never needed below the root of a clean packet,
+    and always present below an annotated one.
+
+    The patching relies on knowing exactly where the root tags and the
+    ``original_prefix`` element are in the output, rather than searching for
+    them (which could match inside comments and the like). Serializing the
+    root element leaves out any DOCTYPE, comments or processing instructions
+    around it, so the output is just the XML declaration and the root; we
+    also require that ``original_prefix`` is the root's last child, as it is
+    after loading.
+
+    Returns None if the packet doesn't qualify, e.g. if it was authored or
+    modified via objectify, in which case the caller should fall back to
+    serializing a cleaned-up copy.
+    """
+    try:
+        if '<VOEvent'.encode(encoding) != b'<VOEvent':
+            return None  # Not an ASCII-compatible encoding, can't patch it.
+    except (LookupError, TypeError):
+        return None
+    if v.tag != 'VOEvent' or v.text is not None:
+        return None
+
+    children = list(v.iterchildren())
+    # (An otherwise empty root would be serialized as a self-closing tag.)
+    if len(children) < 2:
+        return None
+    original_prefix = children[-1]
+    if original_prefix.tag != 'original_prefix':
+        return None
+    for child in children:
+        if child.tail is not None:
+            return None
+    prefix = original_prefix.text
+    nsmap = v.nsmap
+    if (prefix not in nsmap or original_prefix.countchildren()
+            or original_prefix.attrib != _ORIGINAL_PREFIX_ATTRIB):
+        return None
+
+    # cleanup_namespaces would drop any unused declarations on the root:
+    used_namespaces = set([nsmap[prefix]])
+    for att in v.attrib.keys():
+        used_namespaces.add(etree.QName(att).namespace)
+    if _PYTYPE_NS in used_namespaces or ('{' + _XSI_NS + '}type') in v.attrib:
+        return None
+    for uri in nsmap.values():
+        if uri not in used_namespaces:
+            return None
+
+    s = etree.tostring(v, pretty_print=pretty_print,
+                       xml_declaration=xml_declaration, encoding=encoding)
+    # The first '<VOEvent' is the root's start tag (an XML declaration
+    # can't contain it), and the output ends with the prefix element then
+    # the root's end tag.
+    start = s.find(b'<VOEvent')
+    closing = b'</VOEvent>\n' if pretty_print else b'</VOEvent>'
+    prefix_element = _ORIGINAL_PREFIX_XML.format(prefix).encode(encoding)
+    if pretty_print:
+        prefix_element = b'  ' + prefix_element + b'\n'
+    end = len(s) - len(closing)
+    prefix_start = end - len(prefix_element)
+    if (start < 0 or not s.endswith(closing) or
+            s[prefix_start:end] != prefix_element):
+        return None
+
+    body = s[s.index(b'>', start):prefix_start]
+    if b'xmlns' in body:
+        return None
+    for p, uri in nsmap.items():
+        if uri == _XSI_NS and (' ' + p + ':type=').encode(encoding) in body:
+            return None  # deannotate would remove xsi:type attributes
+
+    root_tag = (prefix + ':VOEvent').encode(encoding)
+    return b''.join((s[:start + 1], root_tag, s[start + 8:prefix_start],
+                     b'</', root_tag, s[end + 9:]))
+
+
 # Define this for convenience in add_how:
 def _listify(x):
     """Ensure x is iterable; if not then enclose it in a list and return it."""
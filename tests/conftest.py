@@ -0,0 +1,6 @@
+import sys
+
+collect_ignore = []
+if sys.version_info < (3, 5):
+    # Uses async / await syntax.
+    collect_ignore.append('test_aio.py')
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase
+
+from lxml import etree
+
+import voeventparse as vp
+from voeventparse import transport
+from voeventparse.aio import (AsyncLoader, aloads, avalidate, read_frame,
+                              write_frame)
+from voeventparse.fixtures import datapaths
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAio(TestCase):
+    def setUp(self):
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            self.raw = f.read()
+
+    def test_aloads_and_avalidate(self):
+        v = run(aloads(self.raw))
+        self.assertEqual(v.attrib['ivorn'], vp.loads(self.raw).attrib['ivorn'])
+        self.assertTrue(run(avalidate(v)))
+        v.Who.BadChild = 42
+        self.assertFalse(run(avalidate(v)))
+        with self.assertRaises(etree.DocumentInvalid):
+            run(aloads(self.raw.replace(b'<Who>', b'<Who><BadChild/>'),
+                       validate=True))
+
+    def test_concurrency_limit(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def slow_loads(s):
+            with lock:
+                running.append(s)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(s)
+            return vp.loads(s)
+
+        loader = AsyncLoader(max_workers=4, max_concurrency=2)
+
+        async def burst():
+            return await asyncio.gather(
+                *[loader._run(slow_loads, self.raw) for _ in range(10)])
+
+        try:
+            results = run(burst())
+        finally:
+            loader.shutdown()
+        self.assertEqual(len(results), 10)
+        self.assertEqual(max(peak), 2)
+
+    def test_cancellation(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking(s):
+            started.set()
+            release.wait(5)
+            return vp.loads(s)
+
+        loader = AsyncLoader(max_workers=1)
+
+        async def scenario():
+            first = asyncio.ensure_future(loader._run(blocking, self.raw))
+            queued = asyncio.ensure_future(loader.loads(self.raw))
+            while not started.is_set():
+                await asyncio.sleep(0.001)
+            # Cancelling returns control immediately, even though the
+            # thread is still busy:
+            first.cancel()
+            queued.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await first
+            with self.assertRaises(asyncio.CancelledError):
+                await queued
+            release.set()
+            # The slot is freed once the work finishes:
+            v = await asyncio.wait_for(loader.loads(self.raw), 5)
+            return v
+
+        try:
+            v = run(scenario())
+        finally:
+            loader.shutdown()
+        self.assertEqual(v.tag, 'VOEvent')
+
+
+class TestAioFraming(TestCase):
+    def test_read_frame(self):
+        payloads = [b'<a/>', b'', b'x' * 100000]
+        stream = b''.join(transport.encode_frame(p) for p in payloads)
+
+        async def read_all(data):
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            frames = []
+            while True:
+                payload = await read_frame(reader)
+                if payload is None:
+                    return frames
+                frames.append(payload)
+
+        self.assertEqual(run(read_all(stream)), payloads)
+        with self.assertRaises(EOFError):
+            run(read_all(stream[:-1]))
+        with self.assertRaises(EOFError):
+            run(read_all(stream[:2]))
+
+    def test_write_frame(self):
+        class Writer(object):
+            def __init__(self):
+                self.data = b''
+
+            def writelines(self, lines):
+                self.data += b''.join(lines)
+
+        writer = Writer()
+        write_frame(writer, b'<a/>')
+        self.assertEqual(writer.data, transport.encode_frame(b'<a/>'))
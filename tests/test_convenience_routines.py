@@ -6,7 +6,9 @@ from copy import copy
 from unittest import TestCase
 
 import iso8601
+import numpy
 import pytest
+from lxml import objectify
 
 import voeventparse as vp
 from voeventparse.fixtures import datapaths
@@ -35,6 +37,29 @@ class TestConvenienceRoutines(TestCase):
         self.assertEqual(p, known_swift_grb_posn)
         self.assertIsInstance(p.ra, float)
 
+    def test_get_event_positions(self):
+        packets = [self.swift_grb_v2_packet, self.moa_packet,
+                   self.gaia_noname_param_packet, self.blank]
+        positions = vp.get_event_positions(packets)
+        for i, v in enumerate(packets[:-1]):
+            expected = vp.get_event_position(v)
+            self.assertEqual(positions.ra[i], expected.ra)
+            self.assertEqual(positions.dec[i], expected.dec)
+            self.assertEqual(positions.err[i], expected.err)
+            self.assertEqual(positions.unit_names[positions.units[i]],
+                             expected.units)
+            self.assertEqual(positions.system_names[positions.system[i]],
+                             expected.system)
+        self.assertEqual(positions.system_names,
+                         ['UTC-FK5-GEO', 'TDB-ICRS-BARY'])
+        self.assertEqual(positions.system.tolist(), [0, 0, 1, -1])
+        self.assertTrue(numpy.isnan(positions.ra[-1]))
+        self.assertEqual(positions.ra.dtype, numpy.float64)
+        self.assertTrue(positions.ra.flags.c_contiguous)
+        # No such ObsDataLocation:
+        self.assertTrue(numpy.isnan(
+            vp.get_event_positions(packets, index=1).ra).all())
+
     def test_pull_params(self):
         """
         Basic functionality tested here, but this function is deprecated
@@ -122,7 +147,94 @@ class TestConvenienceRoutines(TestCase):
         assert len(grouped_params.values())==len(group_list) - 1
         assert len(grouped_params.allvalues())==len(group_list)
 
+    def test_params_omit_annotations(self):
+        v = self.swift_grb_v2_packet
+        v.What.Param[0].set(objectify.PYTYPE_ATTRIBUTE, 'str')
+        v.What.Param[1].set(
+            '{http://www.w3.org/2001/XMLSchema-instance}type', 'xsd:string')
+        v.What.Group[0].Param[0].set(objectify.PYTYPE_ATTRIBUTE, 'str')
+        top_params = vp.get_toplevel_params(v)
+        self.assertEqual(top_params['Packet_Type'],
+                         {'name': 'Packet_Type', 'dataType': 'string',
+                          'value': '61'})
+        self.assertEqual(top_params['Pkt_Ser_Num'],
+                         {'name': 'Pkt_Ser_Num', 'dataType': 'string',
+                          'value': '1'})
+        self.assertEqual(
+            vp.get_grouped_params(v)['Merit_Values']['Merit_Val0'],
+            {'name': 'Merit_Val0', 'dataType': 'string', 'value': '1',
+             'unit': 'dn'})
+        self.assertEqual(top_params['TrigID'], dict(v.What.Param[2].attrib))
+
+    def test_params_are_copies(self):
+        v = self.swift_grb_v2_packet
+        top_params = vp.get_toplevel_params(v)
+        self.assertIsInstance(top_params['Packet_Type'], dict)
+        top_params['Packet_Type']['value'] = '99'
+        vp.get_grouped_params(v)['Merit_Values']['Merit_Val0']['unit'] = 'x'
+        self.assertEqual(v.What.Param[0].get('value'), '61')
+        self.assertEqual(v.What.Group[0].Param[0].get('unit'), 'dn')
+
+    def test_get_typed_params(self):
+        typed = vp.get_typed_params(self.swift_grb_v2_packet)
+        # No unit, default dataType:
+        self.assertEqual(typed[(None, 'Packet_Type')], '61')
+        self.assertEqual(typed[(None, 'Bkg_Time')], '00:24:06.37')
+        # dataType string, but with a unit:
+        self.assertEqual(typed[(None, 'Burst_TJD')], 16177)
+        self.assertIsInstance(typed[(None, 'Burst_TJD')], int)
+        self.assertEqual(typed[(None, 'Burst_SOD')], 1463.08)
+        self.assertEqual(typed[('Merit_Values', 'Merit_Val8')], 4)
+        self.assertEqual(typed[('Solution_Status', 'GRB_Identified')],
+                         'true')
+        n_params = len(self.swift_grb_v2_packet.What.findall('.//Param'))
+        self.assertEqual(typed.size(), n_params)
+
+    def test_get_typed_params_datatypes(self):
+        v = vp.Voevent(stream='voevent.soton.ac.uk/TEST', stream_id=1,
+                       role=vp.definitions.roles.test)
+        v.What.append(vp.Param('count', 42))
+        v.What.append(vp.Param('flux', 1.5e-3))
+        v.What.append(vp.Param('flag', True))
+        v.What.append(vp.Param('bad', 'n/a', dataType='float'))
+        v.What.append(vp.Param('empty'))
+        v.What.append(vp.Group([vp.Param('count', 7)], name='extra'))
+        typed = vp.get_typed_params(v)
+        self.assertEqual(list(typed.allitems()), [
+            ((None, 'count'), 42),
+            ((None, 'flux'), 1.5e-3),
+            ((None, 'flag'), 'True'),
+            ((None, 'bad'), 'n/a'),
+            ((None, 'empty'), None),
+            (('extra', 'count'), 7),
+        ])
+
+    def test_get_typed_params_cached(self):
+        # Packets loaded without tracking can't hold a cache:
+        v = self.swift_grb_v2_packet
+        self.assertIsNot(vp.get_typed_params(v, cache=True),
+                         vp.get_typed_params(v, cache=True))
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            v = vp.VOEventParser(track_changes=True).load(f)
+        # Not cached by default, so in-place changes are always seen:
+        self.assertIsNot(vp.get_typed_params(v), vp.get_typed_params(v))
+        v.What.Param[0].set('value', '62')
+        self.assertEqual(vp.get_typed_params(v)[(None, 'Packet_Type')], '62')
 
+        typed = vp.get_typed_params(v, cache=True)
+        self.assertIs(vp.get_typed_params(v, cache=True), typed)
+        # Modification via the objectify API discards the cache:
+        v.What.append(vp.Param('extra', 2.5))
+        retyped = vp.get_typed_params(v, cache=True)
+        self.assertIsNot(retyped, typed)
+        self.assertEqual(retyped[(None, 'extra')], 2.5)
+        # In-place changes need mark_modified, on any element:
+        p = v.What.Param[0]
+        p.set('value', '12345')
+        vp.mark_modified(p)
+        self.assertEqual(
+            vp.get_typed_params(v, cache=True)[(None, 'Packet_Type')],
+            '12345')
 
     def test_get_event_time_as_utc(self):
         isotime = vp.get_event_time_as_utc(self.swift_grb_v2_packet)
@@ -162,6 +274,250 @@ class TestConvenienceRoutines(TestCase):
         misinterpreted_as_utc = iso8601.parse_date(raw_iso_string)
         self.assertNotEqual(converted_isotime, misinterpreted_as_utc)
 
+    def test_get_event_times_as_utc(self):
+        packets = [self.swift_grb_v2_packet, self.moa_packet,
+                   self.gaia_noname_param_packet, self.assasn_scraped_packet,
+                   self.blank]
+        expected = [vp.get_event_time_as_utc(v) for v in packets]
+        times = vp.get_event_times_as_utc(packets, as_datetime=True)
+        self.assertEqual(len(times), len(packets))
+        for time, expected_time in zip(times[:-1], expected[:-1]):
+            self.assertEqual(time.utcoffset(), datetime.timedelta(0))
+            # TDB conversion may differ in rounding to the microsecond:
+            self.assertLessEqual(abs(time - expected_time),
+                                 datetime.timedelta(microseconds=1))
+        self.assertIsNone(times[-1])
+
+        array = vp.get_event_times_as_utc(packets)
+        self.assertEqual(array.dtype, numpy.dtype('datetime64[us]'))
+        self.assertEqual(array[0], numpy.datetime64('2012-09-07T00:24:23.08'))
+        self.assertTrue(numpy.isnat(array[-1]))
+
+    def test_get_event_times_as_utc_unsupported(self):
+        v = self.swift_grb_v2_packet
+        ac = v.WhereWhen.ObsDataLocation.ObservationLocation.AstroCoords
+        ac.attrib['coord_system_id'] = 'TCB-ICRS-BARY'
+        with pytest.raises(ValueError):
+            vp.get_event_times_as_utc([self.moa_packet, v])
+
+
+class TestTimeSystems(TestCase):
+    # At 2016-01-01, TT - UTC = 68.184s and GPS - UTC = 17s.
+    utc = datetime.datetime(2016, 1, 1, tzinfo=iso8601.UTC)
+
+    def make_packet(self, system, isotime=None, offset=None, timescale=None,
+                    unit=None):
+        v = vp.Voevent(stream='voevent.soton.ac.uk/TEST', stream_id=1,
+                       role=vp.definitions.roles.test)
+        vp.add_where_when(
+            v, coords=vp.Position2D(ra=10., dec=20., err=0.1, units='deg',
+                                    system=system),
+            obs_time=isotime or datetime.datetime(2000, 1, 1),
+            observatory_location=vp.definitions.observatory_location
+            .geosurface,
+            allow_tz_naive_datetime=True)
+        time = v.WhereWhen.ObsDataLocation.ObservationLocation.AstroCoords.Time
+        if offset is not None:
+            del time.TimeInstant.ISOTime
+            time.TimeInstant.TimeOffset = offset
+            if timescale is not None:
+                time.TimeInstant.TimeScale = timescale
+            if unit is not None:
+                time.attrib['unit'] = unit
+        return v
+
+    def assertTimeEqual(self, a, b):
+        self.assertLessEqual(abs(a - b), datetime.timedelta(microseconds=1))
+
+    def test_tt_and_gps_isotime(self):
+        tt = self.make_packet('TT-ICRS-GEO',
+                              datetime.datetime(2016, 1, 1, 0, 1, 8, 184000))
+        gps = self.make_packet('GPS-ICRS-GEO',
+                               datetime.datetime(2016, 1, 1, 0, 0, 17))
+        self.assertTimeEqual(vp.get_event_time_as_utc(tt), self.utc)
+        self.assertTimeEqual(vp.get_event_time_as_utc(gps), self.utc)
+
+    def test_time_offsets(self):
+        packets = [
+            # Seconds since the GPS epoch:
+            self.make_packet('GPS-ICRS-GEO', offset=1135641617.),
+            self.make_packet('UTC-ICRS-GEO', offset=57388., timescale='MJD',
+                             unit='d'),
+        ]
+        for v in packets:
+            self.assertTimeEqual(vp.get_event_time_as_utc(v), self.utc)
+        # A float64 JD only resolves to tens of microseconds:
+        jd = self.make_packet('TT-ICRS-GEO',
+                              offset=2457388.5 + 68.184 / 86400,
+                              timescale='JD', unit='d')
+        self.assertLess(abs(vp.get_event_time_as_utc(jd) - self.utc),
+                        datetime.timedelta(microseconds=100))
+        unsupported = self.make_packet('TT-ICRS-GEO', offset=1.)
+        with pytest.raises(ValueError):
+            vp.get_event_time_as_utc(unsupported)
+
+    def test_mixed_batch(self):
+        packets = [
+            self.make_packet('UTC-ICRS-GEO', datetime.datetime(2016, 1, 1)),
+            self.make_packet('TT-ICRS-GEO',
+                             datetime.datetime(2016, 1, 1, 0, 1, 8, 184000)),
+            self.make_packet('GPS-ICRS-GEO', offset=1135641617.),
+            self.make_packet('TDB-ICRS-BARY',
+                             datetime.datetime(2016, 1, 1, 0, 1, 8, 184000)),
+        ]
+        times = vp.get_event_times_as_utc(packets, as_datetime=True)
+        for time in times[:3]:
+            self.assertTimeEqual(time, self.utc)
+        # TDB differs from TT by at most a couple of milliseconds:
+        self.assertLess(abs(times[3] - self.utc),
+                        datetime.timedelta(milliseconds=2))
+        self.assertTimeEqual(times[3], vp.get_event_time_as_utc(packets[3]))
+
+
+class TestObsLocations(TestCase):
+    def setUp(self):
+        self.v = vp.Voevent(stream='voevent.soton.ac.uk/TEST', stream_id=1,
+                            role=vp.definitions.roles.test)
+        self.start = datetime.datetime(2016, 1, 1, tzinfo=iso8601.UTC)
+        self.systems = ['UTC-FK5-GEO', 'UTC-ICRS-GEO', 'TDB-ICRS-BARY']
+        for i, system in enumerate(self.systems):
+            vp.add_where_when(
+                self.v,
+                coords=vp.Position2D(ra=10. + i, dec=20. - i, err=0.1,
+                                     units='deg', system=system),
+                obs_time=self.start + datetime.timedelta(hours=i),
+                observatory_location='GEOSURFACE')
+
+    def test_get_event_position_system(self):
+        # The system should come from the requested ObsDataLocation:
+        for i, system in enumerate(self.systems):
+            self.assertEqual(vp.get_event_position(self.v, i).system, system)
+
+    def test_iter_obs_locations(self):
+        locations = list(vp.iter_obs_locations(self.v))
+        self.assertEqual(len(locations), 3)
+        for i, location in enumerate(locations):
+            self.assertIsInstance(location, vp.ObsLocation)
+            self.assertEqual(location.system, self.systems[i])
+            self.assertEqual(location.position,
+                             vp.get_event_position(self.v, i))
+            self.assertLessEqual(
+                abs(location.time - vp.get_event_time_as_utc(self.v, i)),
+                datetime.timedelta(microseconds=1))
+        self.assertEqual(locations[1].time,
+                         self.start + datetime.timedelta(hours=1))
+        self.assertEqual(list(vp.iter_obs_locations(
+            vp.Voevent(stream='voevent.soton.ac.uk/TEST', stream_id=1,
+                       role=vp.definitions.roles.test))), [])
+
+    def test_location_index(self):
+        self.assertEqual(vp.get_event_time_as_utc(self.v, -1),
+                         vp.get_event_time_as_utc(self.v, 2))
+        self.assertEqual(vp.get_event_time_as_utc(self.v, -3), self.start)
+        for index in (3, -4):
+            with self.assertRaises(IndexError):
+                vp.get_event_time_as_utc(self.v, index)
+        self.assertEqual(vp.get_event_positions([self.v], index=-1).ra[0], 12.)
+        self.assertEqual(vp.get_event_times_as_utc([self.v], index=-2)[0],
+                         numpy.datetime64('2016-01-01T01:00:00'))
+        # Batches get NaN / NaT for packets without the ObsDataLocation:
+        self.assertTrue(numpy.isnan(
+            vp.get_event_positions([self.v], index=-4).ra[0]))
+        self.assertTrue(numpy.isnat(
+            vp.get_event_times_as_utc([self.v], index=3)[0]))
+        # A packet with no ObsDataLocation at all has no event time:
+        blank = vp.Voevent(stream='voevent.soton.ac.uk/TEST', stream_id=1,
+                           role=vp.definitions.roles.test)
+        self.assertIsNone(vp.get_event_time_as_utc(blank, -1))
+        for path in (datapaths.swift_bat_grb_pos_v2,
+                     datapaths.moa_lensing_event_path,
+                     datapaths.gaia_alert_16aac_direct,
+                     datapaths.asassn_scraped_example):
+            with open(path, 'rb') as f:
+                v = vp.load(f)
+            self.assertEqual(vp.get_event_time_as_utc(v, -1),
+                             vp.get_event_time_as_utc(v, 0))
+            with self.assertRaises(IndexError):
+                vp.get_event_time_as_utc(v, 1)
+
+    def test_field_containing_separator(self):
+        # Fields are fetched together, '|'-separated; check a '|' in a value
+        # doesn't throw them out.
+        system = 'UTC-ICRS-GEO|X'
+        location = self.v.WhereWhen.ObsDataLocation[1].ObservationLocation
+        location.AstroCoordSystem.set('id', system)
+        location.AstroCoords.set('coord_system_id', system)
+        locations = list(vp.iter_obs_locations(self.v))
+        self.assertEqual(locations[1].system, system)
+        self.assertEqual(locations[1].position.ra, 11.)
+        self.assertEqual(locations[1].time,
+                         self.start + datetime.timedelta(hours=1))
+        positions = vp.get_event_positions([self.v], index=1)
+        self.assertEqual(positions.system_names, [system])
+        self.assertEqual(positions.ra.tolist(), [11.])
+        self.assertEqual(vp.get_event_times_as_utc([self.v], index=1)[0],
+                         numpy.datetime64('2016-01-01T01:00:00'))
+
+    def test_get_obs_locations_array(self):
+        array = vp.get_obs_locations_array(self.v)
+        self.assertEqual(array.shape, (3,))
+        self.assertEqual(array['ra'].tolist(), [10., 11., 12.])
+        self.assertEqual(array['system'].tolist(), self.systems)
+        self.assertEqual(array['units'].tolist(), ['deg'] * 3)
+        self.assertEqual(array['time'][1],
+                         numpy.datetime64('2016-01-01T01:00:00'))
+        self.assertEqual(array['time'].dtype, numpy.dtype('datetime64[us]'))
+
+
+class TestParamsToColumns(TestCase):
+    def setUp(self):
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            self.swift_raw = f.read()
+        with open(datapaths.moa_lensing_event_path, 'rb') as f:
+            self.moa_raw = f.read()
+        self.packets = [vp.loads(self.swift_raw), vp.loads(self.moa_raw),
+                        vp.loads(self.swift_raw)]
+        self.spec = [
+            ((None, 'TrigID'), int),
+            ((None, 'Integ_Time'), float),
+            ((None, 'Burst_Signif'), float),
+            (('Solution_Status', 'GRB_Identified'), bool),
+            ((None, 'Bkg_Time'), str),
+        ]
+
+    def test_columns(self):
+        columns = vp.params_to_columns(self.packets, self.spec)
+        self.assertEqual(list(columns), [key for key, _ in self.spec])
+        trig_id = columns[(None, 'TrigID')]
+        self.assertEqual(trig_id.dtype.kind, 'i')
+        self.assertEqual(trig_id.tolist(), [532871, 201500354, 532871])
+        integ_time = columns[(None, 'Integ_Time')]
+        self.assertEqual(integ_time.dtype, float)
+        self.assertEqual(integ_time.tolist(), [1.024, None, 1.024])
+        self.assertTrue(columns[(None, 'Burst_Signif')].mask.all())
+        self.assertEqual(
+            columns[('Solution_Status', 'GRB_Identified')].tolist(),
+            [True, None, True])
+        self.assertEqual(columns[(None, 'Bkg_Time')].tolist(),
+                         ['00:24:06.37', None, '00:24:06.37'])
+
+    def test_columns_from_iterator(self):
+        n_packets = 2500  # Enough to need the arrays growing.
+        packets = (vp.loads(self.swift_raw) for _ in range(n_packets))
+        columns = vp.params_to_columns(packets, self.spec)
+        trig_id = columns[(None, 'TrigID')]
+        self.assertEqual(len(trig_id), n_packets)
+        self.assertFalse(trig_id.mask.any())
+        self.assertTrue((trig_id == 532871).all())
+
+    def test_conversion_errors(self):
+        spec = [((None, 'Bkg_Time'), float), ((None, 'TrigID'), int)]
+        with pytest.raises(ValueError):
+            vp.params_to_columns(self.packets, spec)
+        columns = vp.params_to_columns(self.packets, spec, errors='ignore')
+        self.assertTrue(columns[(None, 'Bkg_Time')].mask.all())
+        self.assertEqual(columns[(None, 'TrigID')].count(), 3)
+
 
 class TestPrettyStr(TestCase):
     def setUp(self):
@@ -178,3 +534,42 @@ class TestPrettyStr(TestCase):
         self.assertTrue(vp.valid_as_v2_0(self.swift_grb_v2_packet))
         after = vp.dumps(self.swift_grb_v2_packet)
         self.assertEqual(before, after)
+
+
+class TestOrderedMultiDict(TestCase):
+    def setUp(self):
+        self.omd = vp.OrderedMultiDict(
+            [('a', 1), ('b', 2), ('a', 3), (None, 4)])
+
+    def test_dict_like_access(self):
+        omd = self.omd
+        self.assertEqual(omd['a'], 1)
+        self.assertEqual(omd[None], 4)
+        with self.assertRaises(KeyError):
+            omd['c']
+        self.assertEqual(omd.get('c'), None)
+        self.assertEqual(omd.get('c', 5), 5)
+        self.assertTrue('b' in omd)
+        self.assertFalse('c' in omd)
+        self.assertEqual(len(omd), 3)
+        self.assertEqual(list(omd), ['a', 'b', None])
+        self.assertEqual(omd.keys(), ['a', 'b', None])
+        self.assertEqual(omd.values(), [1, 2, 4])
+        self.assertEqual(omd.items(), [('a', 1), ('b', 2), (None, 4)])
+        self.assertEqual(dict(omd), {'a': 1, 'b': 2, None: 4})
+        self.assertEqual(omd, {'a': 1, 'b': 2, None: 4})
+        self.assertNotEqual(omd, {'a': 3, 'b': 2, None: 4})
+
+    def test_multi_value_access(self):
+        omd = self.omd
+        self.assertEqual(omd.getlist('a'), [1, 3])
+        self.assertEqual(omd.getlist('c'), [])
+        self.assertEqual(omd.size(), 4)
+        self.assertEqual(omd.allkeys(), ['a', 'b', 'a', None])
+        self.assertEqual(omd.allvalues(), [1, 2, 3, 4])
+        self.assertEqual(omd.allitems(),
+                         [('a', 1), ('b', 2), ('a', 3), (None, 4)])
+        self.assertEqual(omd.lists(), [[1, 3], [2], [4]])
+        self.assertEqual(omd, vp.OrderedMultiDict(omd.allitems()))
+        self.assertNotEqual(omd, vp.OrderedMultiDict(omd.items()))
+        self.assertFalse(hasattr(omd, '__dict__'))
@@ -0,0 +1,48 @@
+"""Check that importing voeventparse stays cheap."""
+
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+import voeventparse as vp
+from voeventparse.fixtures import datapaths
+
+# Generous enough to absorb a slow CI box (best-of-several is taken), but
+# well below the ~0.5s it used to take when astropy was imported eagerly.
+IMPORT_TIME_BUDGET = 0.35  # seconds
+
+HEAVY_MODULES = ['astropy', 'iso8601', 'numpy']
+
+IMPORT_AND_LOAD_SNIPPET = """
+import sys, time
+t0 = time.time()
+import voeventparse
+import_time = time.time() - t0
+with open({path!r}, 'rb') as f:
+    voeventparse.loads(f.read())
+print(import_time)
+print(' '.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def run_import_and_load():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.path.dirname(os.path.dirname(vp.__file__))
+    snippet = IMPORT_AND_LOAD_SNIPPET.format(
+        path=datapaths.swift_bat_grb_pos_v2, heavy=HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, '-c', snippet], env=env)
+    lines = output.decode('ascii').splitlines()
+    import_time = float(lines[0])
+    loaded = lines[1].split() if len(lines) > 1 else []
+    return import_time, loaded
+
+
+class TestImportCost(TestCase):
+    def test_loads_does_not_import_heavy_dependencies(self):
+        _, loaded = run_import_and_load()
+        self.assertEqual(loaded, [])
+
+    def test_import_time_budget(self):
+        best = min(run_import_and_load()[0] for _ in range(3))
+        self.assertLess(best, IMPORT_TIME_BUDGET)
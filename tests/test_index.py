@@ -0,0 +1,341 @@
+from __future__ import print_function
+
+import datetime
+from unittest import TestCase
+
+import numpy
+import pytest
+import pytz
+
+import voeventparse as vp
+from voeventparse.fixtures import datapaths
+from voeventparse.index import CoincidenceMatcher, SkyIndex, TimeIndex
+
+
+def brute_force_query(ivorns, ra, dec, err, centre_ra, centre_dec, radius,
+                      centre_err=0.):
+    """The IVORNs matching a cone search, via the haversine formula."""
+    ra, dec = numpy.radians(ra), numpy.radians(dec)
+    ra0, dec0 = numpy.radians(centre_ra), numpy.radians(centre_dec)
+    a = (numpy.sin((dec - dec0) / 2) ** 2 +
+         numpy.cos(dec) * numpy.cos(dec0) * numpy.sin((ra - ra0) / 2) ** 2)
+    separation = numpy.degrees(2 * numpy.arcsin(numpy.sqrt(a)))
+    return set(numpy.asarray(ivorns)[
+                   separation <= radius + centre_err + err + 1e-9])
+
+
+class TestSkyIndex(TestCase):
+    def setUp(self):
+        self.index = SkyIndex()
+        self.index.add('ivo://test#a', vp.Position2D(
+            ra=10., dec=20., err=0.1, units='deg', system='UTC-FK5-GEO'))
+        self.index.add('ivo://test#b', vp.Position2D(
+            ra=10.5, dec=20., err=0., units='deg', system='UTC-FK5-GEO'))
+        self.index.add('ivo://test#c', vp.Position2D(
+            ra=numpy.radians(200.), dec=numpy.radians(-45.), err=0.,
+            units='rad', system='UTC-FK5-GEO'))
+
+    def test_query(self):
+        self.assertEqual(len(self.index), 3)
+        self.assertIn('ivo://test#a', self.index)
+        self.assertEqual(self.index.query(10., 20.), ['ivo://test#a'])
+        # Nearest first:
+        self.assertEqual(self.index.query(10.4, 20., radius=0.3),
+                         ['ivo://test#b', 'ivo://test#a'])
+        # The query's own error radius is added to the search radius:
+        self.assertEqual(self.index.query(10.4, 20., err=0.3),
+                         ['ivo://test#b', 'ivo://test#a'])
+        self.assertEqual(self.index.query(200., -45.), ['ivo://test#c'])
+        matches = self.index.query(200.1, -45., radius=1, separations=True)
+        self.assertEqual(matches[0][0], 'ivo://test#c')
+        self.assertAlmostEqual(matches[0][1], 0.1 * numpy.cos(
+            numpy.radians(45.)), places=4)
+        self.assertEqual(self.index.query(100., 0., radius=10.), [])
+
+    def test_query_many(self):
+        results = self.index.query_many([10., 200., 100.], [20., -45., 0.],
+                                        radius=0.01)
+        self.assertEqual(results, [['ivo://test#a'], ['ivo://test#c'], []])
+
+    def test_remove_and_replace(self):
+        self.index.remove('ivo://test#a')
+        self.assertNotIn('ivo://test#a', self.index)
+        self.assertEqual(self.index.query(10., 20.), [])
+        with pytest.raises(KeyError):
+            self.index.remove('ivo://test#a')
+        self.index.add('ivo://test#b', vp.Position2D(
+            ra=50., dec=50., err=0., units='deg', system=None))
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.query(10.5, 20., radius=1.), [])
+        self.assertEqual(self.index.query(50., 50.), ['ivo://test#b'])
+        self.assertEqual(self.index.position('ivo://test#b').ra, 50.)
+
+    def test_unsupported_units(self):
+        with pytest.raises(ValueError):
+            self.index.add('ivo://test#d', vp.Position2D(
+                ra=1., dec=1., err=0., units='arcmin', system=None))
+
+    def test_add_packets(self):
+        packets = []
+        for path in (datapaths.swift_bat_grb_pos_v2,
+                     datapaths.moa_lensing_event_path):
+            with open(path, 'rb') as f:
+                packets.append(vp.load(f))
+        index = SkyIndex()
+        index.add_packets(packets)
+        position = vp.get_event_position(packets[0])
+        self.assertEqual(index.query(position.ra, position.dec),
+                         [packets[0].attrib['ivorn']])
+        self.assertEqual(len(index), 2)
+
+    def test_matches_brute_force(self):
+        rng = numpy.random.RandomState(42)
+        n = 20000
+        ivorns = ['ivo://test#{}'.format(i) for i in range(n)]
+        ra = rng.uniform(0, 360, n)
+        dec = numpy.degrees(numpy.arcsin(rng.uniform(-1, 1, n)))
+        err = rng.exponential(0.5, n)  # Many in the coarser grids.
+        index = SkyIndex(cell_size=0.5)
+        for start in range(0, n, 3000):  # Exercise the buffer merging.
+            chunk = slice(start, start + 3000)
+            index.add_many(ivorns[chunk], ra[chunk], dec[chunk], err[chunk])
+        alive = numpy.ones(n, bool)
+        for i in range(0, n, 3):  # Exercise the compaction.
+            index.remove(ivorns[i])
+            alive[i] = False
+        self.assertEqual(len(index), alive.sum())
+        live = numpy.flatnonzero(alive)
+        centres = [(0.05, 10.), (359.95, -10.), (123., 89.9), (321., -89.95),
+                   (180., 0.)]
+        centres += list(zip(rng.uniform(0, 360, 50),
+                            numpy.degrees(numpy.arcsin(rng.uniform(-1, 1,
+                                                                   50)))))
+        for centre_ra, centre_dec in centres:
+            for radius, centre_err in ((0., 0.3), (2., 0.), (5., 1.)):
+                expected = brute_force_query(
+                    numpy.asarray(ivorns)[live], ra[live], dec[live],
+                    err[live], centre_ra, centre_dec, radius, centre_err)
+                self.assertEqual(
+                    set(index.query(centre_ra, centre_dec, radius,
+                                    centre_err)), expected)
+
+
+class TestTimeIndex(TestCase):
+    def setUp(self):
+        self.t0 = datetime.datetime(2020, 1, 1, tzinfo=pytz.UTC)
+        self.index = TimeIndex()
+        for i in range(10):
+            for stream in ('test.org/A', 'test.org/B'):
+                self.index.add(
+                    'ivo://{}#{}'.format(stream, i),
+                    event_time=self.t0 + datetime.timedelta(minutes=i),
+                    date=self.t0 + datetime.timedelta(minutes=i, seconds=30))
+
+    def ivorns(self, stream, numbers):
+        return ['ivo://{}#{}'.format(stream, i) for i in numbers]
+
+    def test_query(self):
+        self.assertEqual(len(self.index), 20)
+        minutes = datetime.timedelta(minutes=1)
+        self.assertEqual(
+            self.index.query(self.t0 + 2 * minutes, self.t0 + 4 * minutes,
+                             stream='test.org/A'),
+            self.ivorns('test.org/A', [2, 3, 4]))
+        self.assertEqual(
+            len(self.index.query(self.t0 + 2 * minutes,
+                                 self.t0 + 4 * minutes)), 6)
+        # By Who.Date; naive datetimes and strings are taken to be UTC:
+        self.assertEqual(
+            self.index.query(datetime.datetime(2020, 1, 1, 0, 2),
+                             '2020-01-01T00:04:00', stream='test.org/B',
+                             key='date'),
+            self.ivorns('test.org/B', [2, 3]))
+        self.assertEqual(
+            self.index.query('2020-01-01T01:02:00+01:00',
+                             '2020-01-01T00:02:00Z', stream='test.org/B'),
+            self.ivorns('test.org/B', [2]))
+        self.assertEqual(self.index.query(self.t0, self.t0 + 9 * minutes,
+                                          stream='test.org/C'), [])
+        with pytest.raises(ValueError):
+            self.index.query(self.t0, self.t0, key='received')
+
+    def test_out_of_order_and_replace(self):
+        self.index.add('ivo://test.org/A#late',
+                       event_time=self.t0 + datetime.timedelta(seconds=90))
+        self.index.add('ivo://test.org/A#3',
+                       event_time=self.t0 + datetime.timedelta(hours=1))
+        self.assertEqual(
+            self.index.query(self.t0 + datetime.timedelta(minutes=1),
+                             self.t0 + datetime.timedelta(minutes=4),
+                             stream='test.org/A'),
+            ['ivo://test.org/A#1', 'ivo://test.org/A#late',
+             'ivo://test.org/A#2', 'ivo://test.org/A#4'])
+        # The replacement has no Who.Date:
+        self.assertNotIn('ivo://test.org/A#3', self.index.query(
+            self.t0, self.t0 + datetime.timedelta(hours=1), key='date'))
+
+    def test_remove_and_evict(self):
+        self.index.remove('ivo://test.org/A#5')
+        self.assertNotIn('ivo://test.org/A#5', self.index)
+        with pytest.raises(KeyError):
+            self.index.remove('ivo://test.org/A#5')
+        evicted = self.index.evict(self.t0 + datetime.timedelta(minutes=7))
+        self.assertEqual(sorted(evicted), sorted(
+            self.ivorns('test.org/A', [0, 1, 2, 3, 4, 6]) +
+            self.ivorns('test.org/B', range(7))))
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(
+            self.index.query(self.t0, self.t0 + datetime.timedelta(hours=1),
+                             key='date', stream='test.org/A'),
+            self.ivorns('test.org/A', [7, 8, 9]))
+
+    def test_add_packets(self):
+        packets = []
+        for path in (datapaths.swift_bat_grb_pos_v2,
+                     datapaths.moa_lensing_event_path):
+            with open(path, 'rb') as f:
+                packets.append(vp.load(f))
+        index = TimeIndex()
+        index.add_packets(packets)
+        event_time = vp.get_event_time_as_utc(packets[0])
+        self.assertEqual(index.query(event_time, event_time),
+                         [packets[0].attrib['ivorn']])
+        self.assertEqual(index.query('2015-07-10T14:48:31',
+                                     '2015-07-10T14:48:31', key='date',
+                                     stream='nasa.gsfc.gcn/MOA'),
+                         [packets[1].attrib['ivorn']])
+
+    def test_matches_brute_force(self):
+        rng = numpy.random.RandomState(42)
+        n = 20000
+        ivorns = ['ivo://test.org/{}#{}'.format('ABC'[i % 3], i)
+                  for i in range(n)]
+        # Roughly in order, as a live stream would be:
+        times = (numpy.datetime64('2020-01-01', 'us') +
+                 (numpy.arange(n) * 1e6 +
+                  rng.normal(0, 5e6, n)).astype('timedelta64[us]'))
+        dates = times + rng.uniform(0, 60e6, n).astype('timedelta64[us]')
+        index = TimeIndex()
+        for start in range(0, n, 500):
+            chunk = slice(start, start + 500)
+            index.add_many(ivorns[chunk], times[chunk], dates[chunk])
+        alive = numpy.ones(n, bool)
+        for i in range(0, n, 3):
+            index.remove(ivorns[i])
+            alive[i] = False
+        horizon = times[5000] + numpy.timedelta64(1, 's')
+        index.evict(horizon)
+        alive &= times >= horizon
+        self.assertEqual(len(index), alive.sum())
+        streams = numpy.array([ivorn.split('#')[0][6:] for ivorn in ivorns])
+        for _ in range(50):
+            t0, t1 = numpy.sort(rng.choice(times, 2))
+            for key, values in (('event', times), ('date', dates)):
+                for stream in (None, 'test.org/B'):
+                    selected = alive & (values >= t0) & (values <= t1)
+                    if stream is not None:
+                        selected &= streams == stream
+                    expected = numpy.array(ivorns, object)[selected][
+                        numpy.argsort(values[selected], kind='mergesort')]
+                    self.assertEqual(index.query(t0, t1, stream, key),
+                                     expected.tolist())
+
+
+class TestCoincidenceMatcher(TestCase):
+    def make_packet(self, stream, stream_id, obs_time, ra, dec, err):
+        v = vp.Voevent(stream=stream, stream_id=stream_id,
+                       role=vp.definitions.roles.test)
+        vp.add_where_when(
+            v, coords=vp.Position2D(ra=ra, dec=dec, err=err, units='deg',
+                                    system='UTC-FK5-GEO'),
+            obs_time=obs_time,
+            observatory_location=vp.definitions.observatory_location
+            .geosurface)
+        return v
+
+    def test_add(self):
+        t0 = datetime.datetime(2020, 1, 1, tzinfo=pytz.UTC)
+        minute = datetime.timedelta(minutes=1)
+        grb = self.make_packet('test.org/GRB', 1, t0, 10., 20., 2.)
+        optical = [
+            self.make_packet('test.org/OPT', 1, t0 + minute, 11., 20., 0.),
+            # Too far away:
+            self.make_packet('test.org/OPT', 2, t0 + minute, 15., 20., 0.),
+            # Same stream as the first; not matched to it by default:
+            self.make_packet('test.org/OPT', 3, t0 + minute, 11., 20., 0.),
+            # Too late:
+            self.make_packet('test.org/OPT', 4, t0 + 20 * minute, 10., 20.,
+                             0.),
+        ]
+        matcher = CoincidenceMatcher(dt=datetime.timedelta(minutes=10))
+        self.assertEqual(matcher.add(grb), [])
+        coincidences = matcher.add_packets(optical)
+        self.assertEqual(len(coincidences), 2)
+        for coincidence, v in zip(coincidences, optical[::2]):
+            self.assertIsInstance(coincidence, vp.Coincidence)
+            self.assertEqual(coincidence.ivorn, v.attrib['ivorn'])
+            self.assertEqual(coincidence.matched_ivorn, grb.attrib['ivorn'])
+            self.assertEqual(coincidence.dt, 60.)
+            self.assertAlmostEqual(coincidence.separation, 0.94, places=2)
+        # The others left the window on the arrival of the 20-minute event:
+        self.assertNotIn(grb.attrib['ivorn'], matcher)
+        self.assertEqual(len(matcher), 1)
+
+        matcher = CoincidenceMatcher(dt=600, same_stream=True)
+        matcher.add(optical[0])
+        self.assertEqual([c.matched_ivorn for c in matcher.add(optical[2])],
+                         [optical[0].attrib['ivorn']])
+        matcher.remove(optical[0].attrib['ivorn'])
+        self.assertEqual(len(matcher), 1)
+
+    def test_add_without_position(self):
+        t0 = datetime.datetime(2020, 1, 1, tzinfo=pytz.UTC)
+        grb = self.make_packet('test.org/GRB', 1, t0, 10., 20., 2.)
+        matcher = CoincidenceMatcher(dt=600)
+        matcher.add(grb)
+        # No WhereWhen at all:
+        bare = vp.Voevent(stream='test.org/OPT', stream_id=1,
+                          role=vp.definitions.roles.test)
+        self.assertEqual(matcher.add(bare), [])
+        # A time but no Position2D:
+        timed = self.make_packet('test.org/OPT', 2, t0, 10., 20., 2.)
+        coords = timed.WhereWhen.ObsDataLocation.ObservationLocation\
+            .AstroCoords
+        coords.remove(coords.Position2D)
+        self.assertEqual(matcher.add(timed), [])
+        self.assertEqual(len(matcher), 1)
+        self.assertNotIn(bare.attrib['ivorn'], matcher)
+        self.assertNotIn(timed.attrib['ivorn'], matcher)
+
+    def test_matches_brute_force(self):
+        rng = numpy.random.RandomState(42)
+        n = 3000
+        streams = rng.randint(0, 3, n)
+        ivorns = ['ivo://test.org/{}#{}'.format('ABC'[s], i)
+                  for i, s in enumerate(streams)]
+        seconds = numpy.sort(rng.uniform(0, 3600, n))
+        times = (numpy.datetime64('2020-01-01', 'us') +
+                 (seconds * 1e6).astype('timedelta64[us]'))
+        ra = rng.uniform(0, 30, n)
+        dec = rng.uniform(-10, 10, n)
+        err = numpy.where(streams == 0, rng.uniform(1, 5, n),
+                          rng.uniform(0, 0.1, n))
+        dt, radius = 120., 0.05
+        matcher = CoincidenceMatcher(dt=dt, radius=radius)
+        found = set()
+        for i in range(n):
+            position = vp.Position2D(ra=ra[i], dec=dec[i], err=err[i],
+                                     units='deg', system=None)
+            for c in matcher.add_event(ivorns[i], times[i], position):
+                self.assertLessEqual(abs(c.dt), dt)
+                found.add((c.ivorn, c.matched_ivorn))
+        expected = set()
+        for i in range(n):
+            j = numpy.flatnonzero((seconds[:i] >= seconds[i] - dt) &
+                                  (streams[:i] != streams[i]))
+            matched = brute_force_query(
+                numpy.asarray(ivorns)[j], ra[j], dec[j], err[j], ra[i],
+                dec[i], radius, err[i])
+            expected.update((ivorns[i], ivorn) for ivorn in matched)
+        self.assertTrue(expected)
+        self.assertEqual(found, expected)
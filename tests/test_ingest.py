@@ -0,0 +1,117 @@
+from __future__ import print_function
+
+import threading
+from unittest import TestCase
+
+from lxml import etree
+
+import voeventparse as vp
+from voeventparse.fixtures import datapaths
+
+V2_PATHS = [
+    datapaths.swift_bat_grb_pos_v2,
+    datapaths.moa_lensing_event_path,
+    datapaths.gaia_alert_16aac_direct,
+    datapaths.asassn_scraped_example,
+]
+
+
+def get_ivorn(v):
+    return v.attrib['ivorn']
+
+
+class TestLoadMany(TestCase):
+    def setUp(self):
+        self.ivorns = []
+        for path in V2_PATHS:
+            with open(path, 'rb') as f:
+                self.ivorns.append(vp.load(f).attrib['ivorn'])
+
+    def test_default_extract(self):
+        for workers in (1, 2):
+            results = list(vp.load_many(V2_PATHS, workers=workers))
+            self.assertEqual([path for path, _ in results], V2_PATHS)
+            for (path, header), ivorn in zip(results, self.ivorns):
+                self.assertIsInstance(header, vp.PacketHeader)
+                self.assertEqual(header.ivorn, ivorn)
+            with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+                self.assertEqual(results[0][1], vp.peek_header(f.read()))
+
+    def test_ordering(self):
+        paths = V2_PATHS * 5
+        ordered = list(vp.load_many(paths, workers=2, extract=get_ivorn,
+                                    chunksize=1))
+        self.assertEqual([ivorn for _, ivorn in ordered], self.ivorns * 5)
+        completed = list(vp.load_many(paths, workers=2, extract=get_ivorn,
+                                      ordered=False, chunksize=1))
+        self.assertEqual(sorted(completed), sorted(ordered))
+
+    def test_errors(self):
+        paths = [datapaths.swift_xrt_pos_v1] + V2_PATHS
+        for workers in (1, 2):
+            with self.assertRaises(ValueError):
+                list(vp.load_many(paths, workers=workers))
+            results = list(vp.load_many(paths, workers=workers,
+                                        errors='ignore', extract=get_ivorn))
+            self.assertEqual([ivorn for _, ivorn in results], self.ivorns)
+        # Unpicklable lxml errors are re-raised as the same type:
+        with self.assertRaises(etree.DocumentInvalid):
+            list(vp.load_many([datapaths.no_namespace_test_packet],
+                              workers=2, check_version=False,
+                              validate=True))
+        with self.assertRaises(ValueError):
+            list(vp.load_many(V2_PATHS, errors='bogus'))
+
+
+class TestThreadedIngestor(TestCase):
+    def setUp(self):
+        self.packets = []
+        for path in V2_PATHS:
+            with open(path, 'rb') as f:
+                self.packets.append(f.read())
+
+    def test_loads_many(self):
+        with vp.ThreadedIngestor(workers=3, validate=True) as ingestor:
+            packets = self.packets * 10
+            loaded = list(ingestor.loads_many(packets))
+            self.assertEqual(len(loaded), len(packets))
+            for v, raw in zip(loaded, packets):
+                self.assertEqual(v.tag, 'VOEvent')
+                self.assertEqual(v.attrib['ivorn'],
+                                 vp.peek_header(raw).ivorn)
+            completed = list(ingestor.loads_many(packets, ordered=False))
+            self.assertEqual(sorted(v.attrib['ivorn'] for v in completed),
+                             sorted(v.attrib['ivorn'] for v in loaded))
+
+    def test_load_many(self):
+        with vp.ThreadedIngestor(workers=2, extract=get_ivorn) as ingestor:
+            self.assertEqual(list(ingestor.load_many(V2_PATHS)),
+                             list(vp.load_many(V2_PATHS, extract=get_ivorn)))
+
+    def test_threads_are_reused(self):
+        def get_thread(v):
+            return threading.current_thread()
+
+        ingestor = vp.ThreadedIngestor(workers=2, extract=get_thread)
+        threads = set()
+        for _ in range(5):
+            threads.update(ingestor.loads_many(self.packets))
+        self.assertLessEqual(len(threads), 2)
+        ingestor.close()
+        for thread in threads:
+            self.assertFalse(thread.is_alive())
+        # Usable again after closing, with fresh threads:
+        self.assertEqual(len(list(ingestor.loads_many(self.packets))),
+                         len(self.packets))
+        ingestor.close()
+
+    def test_errors(self):
+        invalid = self.packets[0].replace(b'<Who>', b'<Who><BadChild/>')
+        packets = [invalid] + self.packets
+        with vp.ThreadedIngestor(workers=2, validate=True,
+                                 extract=get_ivorn) as ingestor:
+            with self.assertRaises(etree.DocumentInvalid):
+                list(ingestor.loads_many(packets))
+            self.assertEqual(
+                list(ingestor.loads_many(packets, errors='ignore')),
+                [vp.peek_header(raw).ivorn for raw in self.packets])
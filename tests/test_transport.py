@@ -0,0 +1,124 @@
+from __future__ import unicode_literals
+
+import datetime
+import socket
+import threading
+from unittest import TestCase
+
+import pytz
+
+import voeventparse as vp
+from voeventparse import transport
+from voeventparse.fixtures import datapaths
+
+
+class TestFraming(TestCase):
+    def setUp(self):
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            self.raw = f.read()
+        self.payloads = [self.raw, b'', transport.make_iamalive('ivo://a/b'),
+                         self.raw[:100]]
+        self.stream = b''.join(transport.encode_frame(p)
+                               for p in self.payloads)
+
+    def test_encode_frame(self):
+        frame = transport.encode_frame(self.raw)
+        self.assertEqual(len(frame), len(self.raw) + 4)
+        self.assertEqual(frame[:4], b'\x00\x00\x24\x90')
+        self.assertEqual(frame[:4], transport.frame_prefix(len(self.raw)))
+
+    def test_decoder(self):
+        for chunk_size in (1, 3, 4, 7, 1000, len(self.stream)):
+            decoder = transport.FrameDecoder()
+            frames = []
+            for i in range(0, len(self.stream), chunk_size):
+                chunk = self.stream[i:i + chunk_size]
+                if chunk_size == 7:
+                    chunk = bytearray(chunk)
+                frames.extend(decoder.feed(chunk))
+            self.assertEqual(frames, self.payloads)
+            self.assertEqual(decoder.buffered, 0)
+        decoder = transport.FrameDecoder()
+        self.assertEqual(decoder.feed(self.stream[:-1]), self.payloads[:-1])
+        self.assertEqual(decoder.buffered, 103)
+        self.assertEqual(decoder.feed(self.stream[-1:]), self.payloads[-1:])
+
+    def test_decoder_completes_buffered_frame(self):
+        # A chunk which completes a buffered frame and carries on into
+        # further frames (and part of a prefix):
+        for split in (2, 4, 100):
+            decoder = transport.FrameDecoder()
+            self.assertEqual(decoder.feed(self.stream[:split]), [])
+            self.assertEqual(decoder.buffered, split)
+            self.assertEqual(decoder.feed(bytearray(self.stream[split:-102])),
+                             self.payloads[:-1])
+            self.assertEqual(decoder.buffered, 2)
+            self.assertEqual(decoder.feed(self.stream[-102:]),
+                             self.payloads[-1:])
+            self.assertEqual(decoder.buffered, 0)
+
+    def test_decoder_max_frame_size(self):
+        decoder = transport.FrameDecoder(max_frame_size=1000)
+        with self.assertRaises(ValueError):
+            decoder.feed(self.stream)
+        decoder = transport.FrameDecoder(max_frame_size=1000)
+        decoder.feed(self.stream[:2])
+        with self.assertRaises(ValueError):
+            decoder.feed(self.stream[2:])
+        decoder = transport.FrameDecoder(max_frame_size=None)
+        self.assertEqual(decoder.feed(self.stream), self.payloads)
+
+    def test_socket(self):
+        server, client = socket.socketpair()
+        try:
+            def send():
+                for i in range(0, len(self.stream), 500):
+                    server.sendall(self.stream[i:i + 500])
+                server.close()
+            t = threading.Thread(target=send)
+            t.start()
+            frames = list(transport.iter_frames(client))
+            t.join()
+        finally:
+            client.close()
+        self.assertEqual(frames, self.payloads)
+
+    def test_socket_truncated(self):
+        server, client = socket.socketpair()
+        try:
+            server.sendall(self.stream[:50])
+            server.close()
+            with self.assertRaises(EOFError):
+                transport.read_frame(client)
+        finally:
+            client.close()
+
+
+class TestTransportMessages(TestCase):
+    def test_is_transport_message(self):
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            self.assertFalse(transport.is_transport_message(f.read()))
+        self.assertTrue(transport.is_transport_message(
+            transport.make_ack('ivo://a/b#1', 'ivo://c/d')))
+
+    def test_round_trip(self):
+        timestamp = datetime.datetime(2018, 1, 2, 3, 4, 5, tzinfo=pytz.utc)
+        message = transport.parse_transport_message(
+            transport.make_ack('ivo://a/b#1&2', 'ivo://c/d', timestamp))
+        self.assertEqual(message, transport.TransportMessage(
+            role='ack', origin='ivo://a/b#1&2', response='ivo://c/d',
+            timestamp='2018-01-02T03:04:05Z'))
+        message = transport.parse_transport_message(
+            transport.make_iamalive('ivo://broker/x'))
+        self.assertEqual(message.role, 'iamalive')
+        self.assertEqual(message.origin, 'ivo://broker/x')
+        self.assertIsNone(message.response)
+        reply = transport.parse_transport_message(
+            transport.make_iamalive('ivo://c/d', origin=message.origin))
+        self.assertEqual((reply.origin, reply.response),
+                         ('ivo://broker/x', 'ivo://c/d'))
+        self.assertEqual(transport.parse_transport_message(
+            transport.make_nak('ivo://a/b#1', 'ivo://c/d')).role, 'nak')
+        with self.assertRaises(ValueError):
+            transport.parse_transport_message(vp.dumps(vp.Voevent(
+                stream='a/b', stream_id=1, role='test')))
@@ -1,5 +1,10 @@
 import datetime
+import io
+import os
+import subprocess
+import sys
 import tempfile
+import threading
 from unittest import TestCase
 
 import pytz
@@ -32,6 +37,30 @@ class TestValidation(TestCase):
         v.tag = 'VOEvent'
         self.assertFalse(vp.voevent_v2_0_schema.validate(v))
 
+    def test_schema_compiled_lazily(self):
+        snippet = ("import voeventparse; "
+                   "print(voeventparse.voevent._v2_0_schema is None)")
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(vp.__file__))
+        output = subprocess.check_output([sys.executable, '-c', snippet],
+                                         env=env)
+        self.assertEqual(output.strip(), b'True')
+
+    def test_schema_accessor_caches(self):
+        schema = vp.get_v2_0_schema()
+        self.assertIsInstance(schema, etree.XMLSchema)
+        self.assertIs(schema, vp.get_v2_0_schema())
+
+    def test_validation_schema_per_thread(self):
+        from voeventparse.voevent import _thread_v2_0_schema
+        self.assertIs(_thread_v2_0_schema(), _thread_v2_0_schema())
+        other_thread_schema = []
+        t = threading.Thread(
+            target=lambda: other_thread_schema.append(_thread_v2_0_schema()))
+        t.start()
+        t.join()
+        self.assertIsNot(_thread_v2_0_schema(), other_thread_schema[0])
+
     def test_validation_routine(self):
         """
         Now we perform the same validation tests, but applied via the
@@ -45,6 +74,34 @@ class TestValidation(TestCase):
         del v.Who.BadChild
         self.assertTrue(vp.valid_as_v2_0(v))
 
+    def test_validate_while_parsing(self):
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            xml_str = f.read()
+        v = vp.loads(xml_str, validate=True)
+        self.assertEqual(v.tag, 'VOEvent')
+        self.assertEqual(objectify.dump(v), objectify.dump(vp.loads(xml_str)))
+
+        with self.assertRaises(etree.DocumentInvalid):
+            vp.loads(xml_str.replace(b'<Who>', b'<Who><BadChild/>'),
+                     validate=True)
+        with self.assertRaises(etree.DocumentInvalid):
+            with open(datapaths.no_namespace_test_packet, 'rb') as f:
+                vp.load(f, validate=True)
+        # Malformed XML is still reported as a syntax error:
+        with self.assertRaises(etree.XMLSyntaxError) as cm:
+            vp.loads(xml_str[:500], validate=True)
+        self.assertNotIsInstance(cm.exception, etree.DocumentInvalid)
+
+    def test_validation_does_not_modify_packet(self):
+        v = vp.Voevent(stream='voevent.soton.ac.uk/TEST',
+                       stream_id='001',
+                       role='test')
+        vp.set_who(v, datetime.datetime.utcnow())
+        before = etree.tostring(v)
+        self.assertTrue(vp.valid_as_v2_0(v))
+        vp.assert_valid_as_v2_0(v)
+        self.assertEqual(before, etree.tostring(v))
+
     def test_invalid_error_reporting(self):
         with self.assertRaises(etree.DocumentInvalid):
             v = vp.Voevent(stream='voevent.soton.ac.uk/TEST',
@@ -67,6 +124,151 @@ class TestIO(TestCase):
         self.assertEqual(vfs.attrib['ivorn'],
                          'ivo://nasa.gsfc.gcn/SWIFT#BAT_GRB_Pos_532871-729')
 
+    def test_parser_object(self):
+        parser = vp.VOEventParser(collect_ids=False, huge_tree=True)
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            vff = parser.load(f)
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            vfs = vp.loads(f.read())
+        self.assertEqual(objectify.dump(vff), objectify.dump(vfs))
+        self.assertEqual(vff.tag, 'VOEvent')
+        self.assertTrue(vp.valid_as_v2_0(vff))
+        with self.assertRaises(ValueError):
+            with open(datapaths.swift_xrt_pos_v1, 'rb') as f:
+                parser.load(f)
+
+    def test_parser_track_changes(self):
+        from voeventparse.voevent import _TrackedElement
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            raw = f.read()
+        # Plain objectify elements unless asked, as they're faster to use:
+        self.assertNotIsInstance(vp.loads(raw), _TrackedElement)
+        self.assertNotIsInstance(next(vp.iter_load(io.BytesIO(raw))),
+                                 _TrackedElement)
+        for parser in (vp.VOEventParser(track_changes=True),
+                       vp.VOEventParser(keep_source=True)):
+            self.assertIsInstance(parser.loads(raw), _TrackedElement)
+        with self.assertRaises(ValueError):
+            vp.VOEventParser(track_changes=True,
+                             lookup=objectify.ObjectifyElementClassLookup())
+
+    def test_parser_object_per_thread(self):
+        parser = vp.VOEventParser()
+        self.assertIs(parser.parser, parser.parser)
+        other_thread_parser = []
+        t = threading.Thread(
+            target=lambda: other_thread_parser.append(parser.parser))
+        t.start()
+        t.join()
+        self.assertIsNot(parser.parser, other_thread_parser[0])
+
+    def test_iter_load(self):
+        paths = [datapaths.swift_bat_grb_pos_v2,
+                 datapaths.moa_lensing_event_path,
+                 datapaths.gaia_alert_16aac_direct,
+                 datapaths.asassn_scraped_example]
+        packets = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                packets.append(f.read())
+        expected = [objectify.dump(vp.loads(p)) for p in packets]
+        concatenated = b'\n'.join(packets)
+        wrapped = b''.join([b'<?xml version="1.0" encoding="UTF-8"?>\n',
+                            b'<archive><batch>'] +
+                           [p.split(b'?>', 1)[1] for p in packets] +
+                           [b'</batch></archive>'])
+        for stream in (concatenated, wrapped):
+            # Small chunks, to exercise declarations split across reads:
+            for chunk_size in (7, 100, 65536):
+                with tempfile.TemporaryFile(mode='w+b') as f:
+                    f.write(stream)
+                    f.seek(0)
+                    loaded = list(vp.iter_load(f, chunk_size=chunk_size))
+                self.assertEqual([objectify.dump(v) for v in loaded],
+                                 expected)
+                self.assertEqual(loaded[0].tag, 'VOEvent')
+                self.assertTrue(vp.valid_as_v2_0(loaded[-1]))
+
+    def test_iter_load_keeps_declarations_in_comments_and_cdata(self):
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            packet = f.read()
+        decl = b'<?xml version="1.0" ?>'
+        # (Plus '/>' in an attribute and in text, which aren't tag ends.)
+        packet = packet.replace(
+            b'<Who>', b'<!-- ' + decl + b' --><Who><X a="/>">b/></X>').replace(
+            b'</Description>', b'<![CDATA[a/> ' + decl + b']]></Description>',
+            1)
+        self.assertEqual(packet.count(decl), 3)
+        stream = b'\n'.join([packet, b'<!-- ' + decl + b' -->', packet])
+        expected = objectify.dump(vp.loads(packet))
+        for chunk_size in (7, 100, 65536):
+            with tempfile.TemporaryFile(mode='w+b') as f:
+                f.write(stream)
+                f.seek(0)
+                loaded = list(vp.iter_load(f, chunk_size=chunk_size))
+            self.assertEqual([objectify.dump(v) for v in loaded],
+                             [expected, expected])
+            self.assertIn(b'<!-- ' + decl + b' -->', vp.dumps(loaded[0]))
+            self.assertIn(decl.decode(), loaded[1].Who.Description.text)
+
+    def test_iter_load_clears_wrapper_elements(self):
+        from voeventparse.voevent import _detach_voevents
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            packet = f.read().split(b'?>', 1)[1]
+        entry = b'<entry><title>GRB</title>' + packet + b'</entry>'
+        parser = etree.XMLPullParser(events=('end',), tag='{*}VOEvent')
+        parser.set_element_class_lookup(
+            objectify.ObjectifyElementClassLookup())
+        parser.feed(b'<feed>')
+        n_loaded = 0
+        for _ in range(20):
+            parser.feed(entry)
+            n_loaded += len(list(_detach_voevents(parser, True)))
+        parser.feed(b'</feed>')
+        feed = parser.close()
+        self.assertEqual(n_loaded, 20)
+        # Just the last (emptied) entry remains.
+        self.assertEqual(len(feed), 1)
+        self.assertEqual(len(list(feed.iter())), 3)
+
+    def test_peek_header(self):
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            raw = f.read()
+        header = vp.peek_header(raw)
+        self.assertEqual(
+            header,
+            vp.PacketHeader(
+                ivorn='ivo://nasa.gsfc.gcn/SWIFT#BAT_GRB_Pos_532871-729',
+                role='observation', version='2.0',
+                author_ivorn='ivo://nasa.gsfc.tan/gcn',
+                date='2012-09-07T00:24:36'))
+        for path in (datapaths.moa_lensing_event_path,
+                     datapaths.gaia_alert_16aac_direct,
+                     datapaths.asassn_scraped_example):
+            with open(path, 'rb') as f:
+                raw = f.read()
+            v = vp.loads(raw)
+            self.assertEqual(
+                vp.peek_header(raw),
+                (v.attrib['ivorn'], v.attrib['role'], v.attrib['version'],
+                 v.Who.AuthorIVORN.text, v.Who.Date.text))
+        # Whatever follows Who is not parsed:
+        self.assertEqual(vp.peek_header(raw[:raw.index(b'</Who>') + 6]),
+                         vp.peek_header(raw))
+
+    def test_peek_header_without_who(self):
+        v = vp.Voevent(stream='voevent.soton.ac.uk/TEST', stream_id=1,
+                       role=vp.definitions.roles.test)
+        header = vp.peek_header(vp.dumps(v))
+        self.assertEqual(header.ivorn, 'ivo://voevent.soton.ac.uk/TEST#1')
+        self.assertEqual(header.role, 'test')
+        self.assertIsNone(header.author_ivorn)
+        self.assertIsNone(header.date)
+        # A '</Who>' which is not the end of the Who element:
+        raw = vp.dumps(v).replace(b'</voe:VOEvent>',
+                                  b'<!-- </Who> --></voe:VOEvent>')
+        self.assertEqual(vp.peek_header(raw), header)
+
     def test_load_of_voe_v1(self):
         with self.assertRaises(ValueError):
             with open(datapaths.swift_xrt_pos_v1, 'rb') as f:
@@ -115,6 +317,78 @@ class TestIO(TestCase):
         processed = vp.dumps(swift_grb_v2_voeparsed)
         self.assertEqual(raw, processed)
 
+    def test_dumps_matches_copying_serializer(self):
+        """
+        dumps avoids copying packets where it can; check that the output is
+        identical to that from serializing a cleaned-up copy.
+        """
+        from voeventparse.voevent import _standard_xml_copy
+        paths = [datapaths.swift_bat_grb_pos_v2,
+                 datapaths.moa_lensing_event_path,
+                 datapaths.gaia_alert_16aac_direct,
+                 datapaths.asassn_scraped_example,
+                 datapaths.no_namespace_test_packet]
+        for path in paths:
+            with open(path, 'rb') as f:
+                v = vp.load(f)
+            for pretty_print in (False, True):
+                for xml_declaration in (False, True):
+                    expected = etree.tostring(_standard_xml_copy(v),
+                                              pretty_print=pretty_print,
+                                              xml_declaration=xml_declaration,
+                                              encoding='UTF-8')
+                    self.assertEqual(
+                        vp.dumps(v, pretty_print, xml_declaration), expected)
+            before = etree.tostring(v)
+            vp.dumps(v)
+            self.assertEqual(before, etree.tostring(v))
+
+    def test_dumps_matches_copying_serializer_for_unusual_layouts(self):
+        from voeventparse.voevent import _standard_xml_copy
+        ns = b'http://www.ivoa.net/xml/VOEvent/v2.0'
+        attrs = b' version="2.0" role="test" ivorn="ivo://example/test#1"'
+        body = b'<Who><Date>2012-09-07T00:24:36</Date></Who>'
+        packets = [
+            # Default namespace, rather than a prefix.
+            b'<VOEvent xmlns="' + ns + b'"' + attrs + b'>' + body +
+            b'</VOEvent>',
+            # Extra namespace declarations: used on the root, used below it,
+            # and unused.
+            b'<voe:VOEvent xmlns:voe="' + ns + b'" xmlns:a="urn:a"'
+            b' xmlns:b="urn:b" xmlns:c="urn:c" a:x="1"' + attrs + b'>' +
+            body + b'<b:Extra/></voe:VOEvent>',
+            b'<voe:VOEvent xmlns:voe="' + ns + b'" xmlns:a="urn:a"' +
+            attrs + b'>' + body + b'</voe:VOEvent>',
+            # Comments and PIs around the root, mimicking its tags.
+            b'<?xml-stylesheet href="voevent.xsl"?><!-- <VOEvent> -->'
+            b'<voe:VOEvent xmlns:voe="' + ns + b'"' + attrs + b'>' + body +
+            b'</voe:VOEvent><!-- </VOEvent> -->',
+            # A comment inside the root mimicking the prefix element.
+            b'<voe:VOEvent xmlns:voe="' + ns + b'"' + attrs + b'>' + body +
+            b'<!--<original_prefix xmlns:py="http://codespeak.net/lxml/'
+            b'objectify/pytype" py:pytype="str">voe</original_prefix>-->'
+            b'</voe:VOEvent>',
+        ]
+        for raw in packets:
+            v = vp.loads(raw)
+            for pretty_print in (False, True):
+                for xml_declaration in (False, True):
+                    expected = etree.tostring(_standard_xml_copy(v),
+                                              pretty_print=pretty_print,
+                                              xml_declaration=xml_declaration,
+                                              encoding='UTF-8')
+                    self.assertEqual(
+                        vp.dumps(v, pretty_print, xml_declaration), expected)
+
+    def test_dumps_of_modified_packet(self):
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            v = vp.load(f)
+        v.Who.Date = '2012-09-07T00:24:37'
+        s = vp.dumps(v)
+        self.assertIn(b'<Date>2012-09-07T00:24:37</Date>', s)
+        self.assertNotIn(b'pytype', s)
+        self.assertTrue(vp.valid_as_v2_0(vp.loads(s)))
+
     def test_dump(self):
         """Check that writing to a file actually works as expected"""
         with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
@@ -124,6 +398,77 @@ class TestIO(TestCase):
             vp.dump(packet, f)
 
 
+class TestKeepSource(TestCase):
+    def setUp(self):
+        with open(datapaths.swift_bat_grb_pos_v2, 'rb') as f:
+            self.raw = f.read()
+
+    def test_dumps_passthrough(self):
+        v = vp.loads(self.raw, keep_source=True)
+        self.assertIs(vp.dumps(v), self.raw)
+        # Options incompatible with the original bytes:
+        self.assertNotEqual(vp.dumps(v, pretty_print=True), self.raw)
+        self.assertNotEqual(vp.dumps(v, xml_declaration=False), self.raw)
+        self.assertNotEqual(vp.dumps(v, encoding='ISO-8859-1'), self.raw)
+        # And packets loaded without the option are always re-serialized:
+        self.assertNotEqual(vp.dumps(vp.loads(self.raw)), self.raw)
+
+    def test_modification_via_objectify_is_detected(self):
+        v = vp.loads(self.raw, keep_source=True)
+        v.Who.Date = '2012-09-07T00:24:37'
+        s = vp.dumps(v)
+        self.assertNotEqual(s, self.raw)
+        self.assertIn(b'<Date>2012-09-07T00:24:37</Date>', s)
+
+        v = vp.loads(self.raw, keep_source=True)
+        v.What.append(vp.Param(name='foo', value=1))
+        self.assertIn(b'name="foo"', vp.dumps(v))
+
+    def test_authoring_routines_mark_modified(self):
+        v = vp.loads(self.raw, keep_source=True)
+        vp.set_who(v, author_ivorn='voevent.soton.ac.uk/TEST')
+        self.assertIn(b'voevent.soton.ac.uk/TEST', vp.dumps(v))
+
+    def test_explicit_mark_modified(self):
+        v = vp.loads(self.raw, keep_source=True)
+        v.attrib['role'] = 'test'
+        self.assertIs(vp.dumps(v), self.raw)  # Not detected...
+        vp.mark_modified(v.Who)
+        self.assertIn(b'role="test"', vp.dumps(v))
+
+    def test_mark_modified_on_leaf_element(self):
+        v = vp.loads(self.raw, keep_source=True)
+        p = v.What.Param[0]
+        p.set('value', '12345')
+        self.assertIs(vp.dumps(v), self.raw)  # Not detected...
+        vp.mark_modified(p)
+        self.assertIn(b'value="12345"', vp.dumps(v))
+
+    def test_validation_result_tracks_modification(self):
+        v = vp.loads(self.raw, validate=True, keep_source=True)
+        self.assertTrue(vp.valid_as_v2_0(v))
+        vp.assert_valid_as_v2_0(v)
+        v.Who.BadChild = 42
+        self.assertFalse(vp.valid_as_v2_0(v))
+        with self.assertRaises(etree.DocumentInvalid):
+            vp.assert_valid_as_v2_0(v)
+
+        v = vp.loads(self.raw, keep_source=True)
+        self.assertTrue(vp.valid_as_v2_0(v))
+        self.assertTrue(vp.valid_as_v2_0(v))
+
+        parser = vp.VOEventParser(validate=True, track_changes=True)
+        v = parser.loads(self.raw)
+        self.assertEqual(v.__dict__['_cache'], {'valid': True})
+        v.Who.BadChild = 42
+        self.assertNotIn('_cache', v.__dict__)
+        self.assertFalse(vp.valid_as_v2_0(v))
+        self.assertEqual(v.__dict__['_cache'], {'valid': False})
+        del v.Who.BadChild
+        vp.assert_valid_as_v2_0(v)
+        self.assertEqual(v.__dict__['_cache'], {'valid': True})
+
+
 class TestMinimalVOEvent(TestCase):
     def test_make_minimal_voevent(self):
         v1 = vp.Voevent(stream='voevent.soton.ac.uk/TEST',